@@ -21,11 +21,13 @@ from src.utils.dataset import (BagOfWordsDataset, TimeBasedBagOfWordsDataset, Tr
                                TransformersDistilrobertaFinedtunedDataset, SequentialConversationDistilrobertaFinetunedDataset,
                                NAuthorTransformersDistilrobertaMoreTrainedDataset)
 from src.utils.loss_functions import WeightedBinaryCrossEntropy, DynamicSuperLoss
+from src.utils.tokenizers import NLTKTokenizer, RegexTokenizer
 from src.models import ANNModule, EbrahimiCNN, BaseRnnModule, LSTMModule, GRUModule, SuperDynamicLossANN, DistilrobertaFinetuningClassifier, BaseSingleVectorMachine
 from src.mappings import register_mappings, register_mappings_torch, register_command, COMMANDS
 import settings
 from src.scripts import (CreateConversations, BalanceDatasetsForVersionTwo, CreateConversationToySet,
-                            BalanceSequentialDatasetsForVersionTwo, PrintMappings, XML2CSV, finetune_tranformer_per_message)
+                            BalanceSequentialDatasetsForVersionTwo, PrintMappings, XML2CSV, IngestXML, DeduplicateConversations, GenerateStats, CompareTokenizers, CollectArtifactGarbage,
+                            finetune_tranformer_per_message)
 from src.utils.dataset import SequentialConversationDataset
 
 
@@ -87,6 +89,11 @@ if __name__ == "__main__":
     register_command(CreateConversationToySet)
     register_command(BalanceSequentialDatasetsForVersionTwo)
     register_command(XML2CSV)
+    register_command(IngestXML)
+    register_command(DeduplicateConversations)
+    register_command(GenerateStats)
+    register_command(CompareTokenizers)
+    register_command(CollectArtifactGarbage)
 
     register_mappings_torch()
 
@@ -140,6 +147,9 @@ if __name__ == "__main__":
 
     register_mappings(WeightedBinaryCrossEntropy)
 
+    register_mappings(NLTKTokenizer)
+    register_mappings(RegexTokenizer)
+
     register_mappings(ANNModule)
     register_mappings(EbrahimiCNN)
     register_mappings(BaseRnnModule)
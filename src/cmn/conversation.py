@@ -1,70 +1,60 @@
-import csv
-
 from cmn.message import Message
+from cmn.store import ConversationStore
 
 
 class Conversation:
-    def __init__(self, id):
-        self.id = id
-        self.messages = []
-        self.participants = set()
-        self.conv_size = 0
+    """
+    a view over the conversation at `position` of a `ConversationStore`; its messages are created on demand.
+    """
+    __slots__ = ("store", "position")
+
+    def __init__(self, store: ConversationStore, position: int):
+        self.store = store
+        self.position = position
 
     @staticmethod
     def loader(path):
         if path.endswith(".csv"):
             return Conversation.csv_loader(path)
-
-    def add_message(self, message_content, author_involved, size):
-        self.messages.append(message_content)
-        self.participants.add(author_involved)
-        self.conv_size = size
+        if path.endswith(".npz"):
+            return ConversationStore.load(path)
 
     @staticmethod
     def csv_loader(filepath):
-        convs = {}
-
-        with open(filepath, mode="r", newline="", encoding="utf-8") as csvfile:
-            csv_reader = csv.DictReader(csvfile)
-            # conversation = Conversation()
-            for row in csv_reader:
-                # In the future, if we are having data which needs to be tweaked
-                # before we import, could be taken care here.
-                try:
-                    # Assign the conversation id to Conversation Object
+        # maps conversation ids to conversations, the same as a dict of conversations
+        return ConversationStore.from_csv(filepath)
 
-                    message = Message(
-                        row["msg_line"],
-                        row["author_id"],
-                        row["time"],
-                        row["msg_char_count"],
-                        row["msg_word_count"],
-                        row["text"],
-                        row["tagged_predator"],
-                    )
+    @property
+    def id(self) -> str:
+        return self.store.conv_ids[self.position]
 
-                    conv_id = row["conv_id"]
-                    author_involved = row["author_id"]
-                    conversation_size = row["conv_size"]
+    @property
+    def conv_size(self) -> int:
+        return int(self.store.conv_sizes[self.position])
 
-                    if conv_id not in convs:
-                        convs[conv_id] = Conversation(conv_id)
+    @property
+    def message_range(self) -> range:
+        return range(self.store.conv_starts[self.position], self.store.conv_starts[self.position+1])
 
-                    convs[conv_id].add_message(
-                        message, author_involved, conversation_size
-                    )
+    @property
+    def messages(self) -> list[Message]:
+        return [Message(self.store, i) for i in self.message_range]
 
-                except KeyError as e:
-                    print(f"Import Error: {e}")
+    @property
+    def participants(self) -> set[str]:
+        codes = self.store.author_codes[self.store.conv_starts[self.position]:self.store.conv_starts[self.position+1]]
+        return {self.store.authors[code] for code in set(codes.tolist())}
 
-        return convs
+    def __len__(self):
+        return len(self.message_range)
 
     def __repr__(self):
-        authors_list = "\n".join(self.participants)
+        participants = self.participants
+        authors_list = "\n".join(participants)
 
-        repr_string = f"Conversation ID: {self.id}\nConversation Size: {self.conv_size}\nAuthors Involved: {len(list(self.participants))}\n{authors_list}\n"
+        repr_string = f"Conversation ID: {self.id}\nConversation Size: {self.conv_size}\nAuthors Involved: {len(participants)}\n{authors_list}\n"
 
-        if not self.messages:
+        if len(self) == 0:
             repr_string += "No messages found for this conversation.\n"
         else:
             for message in self.messages:
@@ -1,22 +1,40 @@
 class Message:
-    def __init__(
-        self,
-        idx: str,
-        author_id: str,
-        time: str,
-        n_chars: str,
-        n_words: str,
-        text: str,
-        tagged_predator: str,  # is this predatory message label or the author is predator?
-    ):
-
-        self.idx = idx
-        self.author_id = author_id
-        self.time = time
-        self.n_chars = n_chars
-        self.n_words = n_words
-        self.text = text
-        self.tagged_predator = tagged_predator
+    """
+    a view over the message at `index` of a `ConversationStore`; fields are read from the store when accessed.
+    """
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def idx(self) -> int:
+        return int(self.store.msg_line[self.index])
+
+    @property
+    def author_id(self) -> str:
+        return self.store.author(self.index)
+
+    @property
+    def time(self) -> float:
+        return float(self.store.time[self.index])
+
+    @property
+    def n_chars(self) -> int:
+        return int(self.store.n_chars[self.index])
+
+    @property
+    def n_words(self) -> int:
+        return int(self.store.n_words[self.index])
+
+    @property
+    def text(self) -> str:
+        return self.store.text(self.index)
+
+    @property
+    def tagged_predator(self) -> float:  # is this predatory message label or the author is predator?
+        return float(self.store.tagged_predator[self.index])
 
     def __repr__(self):
         return (
@@ -0,0 +1,113 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+
+class ConversationStore(Mapping):
+    """
+    columnar storage of a message csv. Messages are kept in typed numpy columns ordered by conversation, texts in one
+    utf-8 buffer with offsets, and each conversation is the range `conv_starts[i]:conv_starts[i+1]` of messages.
+    It maps conversation ids to `Conversation` views which are created on demand.
+    """
+
+    def __init__(self, conv_ids, conv_starts, conv_sizes, authors, msg_line, author_codes, time, n_chars, n_words,
+                 tagged_predator, text_buffer, text_offsets):
+        self.conv_ids = conv_ids
+        self.conv_starts = conv_starts
+        self.conv_sizes = conv_sizes
+        self.authors = authors
+        self.msg_line = msg_line
+        self.author_codes = author_codes
+        self.time = time
+        self.n_chars = n_chars
+        self.n_words = n_words
+        self.tagged_predator = tagged_predator
+        self.text_buffer = text_buffer
+        self.text_offsets = text_offsets
+
+        self.__positions__ = None
+
+    @classmethod
+    def from_csv(cls, filepath):
+        df = pd.read_csv(filepath, usecols=["conv_id", "msg_line", "author_id", "time", "msg_char_count", "msg_word_count",
+                                            "conv_size", "text", "tagged_predator"],
+                         dtype={"conv_id": str, "author_id": str, "text": str}, keep_default_na=False)
+        return cls.from_dataframe(df)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        # conversations keep the order of their first message in the file and messages keep their order within conversations
+        conv_codes, conv_ids = pd.factorize(df["conv_id"])
+        order = np.argsort(conv_codes, kind="stable")
+        counts = np.bincount(conv_codes, minlength=len(conv_ids))
+        conv_starts = np.zeros(len(conv_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=conv_starts[1:])
+
+        author_codes, authors = pd.factorize(df["author_id"].to_numpy()[order])
+
+        texts = df["text"].to_numpy()[order]
+        encoded = [t.encode("utf-8") for t in texts]
+        text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in encoded], out=text_offsets[1:])
+
+        # the size of a conversation is the one of its last message, as `Conversation.add_message` used to keep it
+        conv_sizes = df["conv_size"].to_numpy()[order][conv_starts[1:] - 1] if len(order) > 0 else np.zeros(0)
+
+        return cls(
+            conv_ids=np.asarray(conv_ids, dtype=object),
+            conv_starts=conv_starts,
+            conv_sizes=conv_sizes.astype(np.int32),
+            authors=np.asarray(authors, dtype=object),
+            msg_line=df["msg_line"].to_numpy()[order].astype(np.int32),
+            author_codes=author_codes.astype(np.int32),
+            time=df["time"].to_numpy()[order].astype(np.float64),
+            n_chars=df["msg_char_count"].to_numpy()[order].astype(np.int32),
+            n_words=df["msg_word_count"].to_numpy()[order].astype(np.int32),
+            tagged_predator=df["tagged_predator"].to_numpy()[order].astype(np.float32),
+            text_buffer=b"".join(encoded),
+            text_offsets=text_offsets,
+        )
+
+    def save(self, path):
+        np.savez(path, conv_ids=self.conv_ids.astype(str), conv_starts=self.conv_starts, conv_sizes=self.conv_sizes,
+                 authors=self.authors.astype(str), msg_line=self.msg_line, author_codes=self.author_codes, time=self.time,
+                 n_chars=self.n_chars, n_words=self.n_words, tagged_predator=self.tagged_predator,
+                 text_buffer=np.frombuffer(self.text_buffer, dtype=np.uint8), text_offsets=self.text_offsets)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            fields = {k: arrays[k] for k in arrays.files}
+        fields["conv_ids"] = fields["conv_ids"].astype(object)
+        fields["authors"] = fields["authors"].astype(object)
+        fields["text_buffer"] = fields["text_buffer"].tobytes()
+        return cls(**fields)
+
+    def text(self, message_index):
+        return self.text_buffer[self.text_offsets[message_index]:self.text_offsets[message_index+1]].decode("utf-8")
+
+    def author(self, message_index):
+        return self.authors[self.author_codes[message_index]]
+
+    def position(self, conv_id):
+        if self.__positions__ is None:
+            self.__positions__ = {conv_id: i for i, conv_id in enumerate(self.conv_ids)}
+        return self.__positions__[conv_id]
+
+    def conversation(self, position):
+        from cmn.conversation import Conversation
+        return Conversation(self, position)
+
+    def __getitem__(self, conv_id):
+        return self.conversation(self.position(conv_id))
+
+    def __iter__(self):
+        return iter(self.conv_ids)
+
+    def __len__(self):
+        return len(self.conv_ids)
+
+    @property
+    def number_of_messages(self):
+        return len(self.msg_line)
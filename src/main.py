@@ -48,8 +48,15 @@ def initiate_datasets(datasets_maps, device):
             except Exception as e:
                 raise Exception(f"preprocessing `{pp}` either not implemented or not registered") from e
         
-        train_dataset = dataset_class(**{**train_configs, "preprocessings": [pp() for pp in preprocessings], "device": device})
-        test_dataset = dataset_class(**{**test_configs, "parent_dataset": train_dataset, "preprocessings": [pp() for pp in preprocessings], "device": device, "apply_record_filter": False})
+        tokenizer = dict()
+        if train_configs.get("tokenizer", None) is not None:
+            try:
+                tokenizer["tokenizer"] = mappings.TOKENIZERS[train_configs["tokenizer"]]()
+            except Exception as e:
+                raise Exception(f"tokenizer `{train_configs['tokenizer']}` either not implemented or not registered") from e
+
+        train_dataset = dataset_class(**{**train_configs, "preprocessings": [pp() for pp in preprocessings], "device": device, **tokenizer})
+        test_dataset = dataset_class(**{**test_configs, "parent_dataset": train_dataset, "preprocessings": [pp() for pp in preprocessings], "device": device, "apply_record_filter": False, **tokenizer})
         logger.info(f"train dataset `{dataset_name}`, shortname: `{short_name}` kwargs -> {train_configs}")
         logger.info(f"test dataset `{dataset_name}`, shortname: `{short_name}` kwargs -> {test_configs}")
         datasets[dataset_name] = (train_dataset, test_dataset)
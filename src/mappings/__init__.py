@@ -1,4 +1,4 @@
-from .mappings import register_mappings, register_mappings_torch, register_command, PREPROCESSINGS, ACTIVATIONS, DATASETS, MODELS, LOSS_FUNCTIONS, COMMANDS
+from .mappings import register_mappings, register_mappings_torch, register_command, PREPROCESSINGS, ACTIVATIONS, DATASETS, MODELS, LOSS_FUNCTIONS, COMMANDS, TOKENIZERS
 
 __all__ = [
     "register_mappings",
@@ -10,4 +10,5 @@ __all__ = [
     "MODELS",
     "LOSS_FUNCTIONS",
     "COMMANDS",
+    "TOKENIZERS",
 ]
\ No newline at end of file
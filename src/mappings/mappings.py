@@ -3,6 +3,7 @@ from src.utils.dataset import BaseDataset
 from src.models.baseline import Baseline
 from src.utils.commons import RegisterableObject, CommandObject
 from src.utils.loss_functions import BaseLossCalculator
+from src.utils.tokenizers import BaseTokenizer
 
 from torch.nn import ReLU, CrossEntropyLoss, BCEWithLogitsLoss, BCELoss
 
@@ -18,6 +19,8 @@ LOSS_FUNCTIONS = dict()
 
 COMMANDS = dict()
 
+TOKENIZERS = dict()
+
 def register_mappings(obj: RegisterableObject):
     
     if issubclass(obj, BasePreprocessing):
@@ -40,6 +43,11 @@ def register_mappings(obj: RegisterableObject):
             raise Exception(f"a class of the same shortname `{obj.short_name()}` already registered")
         LOSS_FUNCTIONS[obj.short_name()] = obj
 
+    if issubclass(obj, BaseTokenizer):
+        if TOKENIZERS.get(obj.short_name(), None) is not None:
+            raise Exception(f"a class of the same shortname `{obj.short_name()}` already registered")
+        TOKENIZERS[obj.short_name()] = obj
+
 # it shouldn't be really like this, but to override torch classes and make them inherit RegisterableObject
 def register_mappings_torch():
     ACTIVATIONS["relu"] = ReLU
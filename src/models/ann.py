@@ -7,6 +7,7 @@ from torch.optim.lr_scheduler import ReduceLROnPlateau
 
 from src.models.baseline import Baseline
 from src.utils.commons import force_open, calculate_metrics_extended
+from src.utils.batching import batch_loader
 from src.utils.loss_functions import DynamicSuperLoss
 import settings
 from settings import OUTPUT_LAYER_NODES
@@ -48,12 +49,9 @@ class AbstractFeedForward(Baseline, torch.nn.Module):
         return kwargs.get("f2score", 0.0) >= 0.95 and self.early_stop
     
     def get_dataloaders(self, dataset, train_ids, validation_ids, batch_size):
-        train_subsampler = SubsetRandomSampler(train_ids)
-        validation_subsampler = SubsetRandomSampler(validation_ids)
-        train_loader = DataLoader(dataset, batch_size=batch_size,
-                                                    sampler=train_subsampler)
-        validation_loader = DataLoader(dataset, batch_size=(256 if len(validation_ids) > 1024 else len(validation_ids)),
-                                       sampler=validation_subsampler)
+        # batches of packed datasets are gathered at once, see `batch_loader`
+        train_loader = batch_loader(dataset, train_ids, batch_size)
+        validation_loader = batch_loader(dataset, validation_ids, (256 if len(validation_ids) > 1024 else len(validation_ids)))
         
         return train_loader, validation_loader
 
@@ -186,7 +184,7 @@ class AbstractFeedForward(Baseline, torch.nn.Module):
             all_preds = []
             all_targets = []
             test_dataset.to(self.device)
-            test_dataloader = DataLoader(test_dataset, batch_size=64)
+            test_dataloader = batch_loader(test_dataset, range(len(test_dataset)), 64, shuffle=False)
             self.eval()
             with torch.no_grad():
                 for X, y in test_dataloader:
@@ -289,12 +287,7 @@ class SuperDynamicLossANN(ANNModule):
             self.scheduler = ReduceLROnPlateau(self.optimizer, **scheduler_args)
             logger.debug(f"scheduler settings: {scheduler_args}")
             logger.info(f'fetching data for fold #{fold}')
-            train_subsampler = torch.utils.data.SubsetRandomSampler(train_ids)
-            validation_subsampler = torch.utils.data.SubsetRandomSampler(validation_ids)
-            train_loader = torch.utils.data.DataLoader(train_dataset, batch_size=batch_size,
-                                                       sampler=train_subsampler)
-            validation_loader = torch.utils.data.DataLoader(train_dataset, batch_size=(256 if len(validation_ids) > 1024 else len(validation_ids)),
-                                                            sampler=validation_subsampler)
+            train_loader, validation_loader = self.get_dataloaders(train_dataset, train_ids, validation_ids, batch_size)
             # Train phase
             total_loss = []
             total_validation_loss = []
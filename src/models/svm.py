@@ -5,6 +5,7 @@ import re
 
 from src.models.baseline import Baseline
 from src.utils.commons import force_open, calculate_metrics_extended
+from src.utils.batching import batch_loader
 import settings
 
 from sklearn.svm import SVC
@@ -57,7 +58,7 @@ class BaseSingleVectorMachine(Baseline):
         for path in weights_checkpoint_path:
             logger.info(f"testing checkpoint at: {path}")
             self.load_params(path)
-            test_dataloader = DataLoader(test_dataset, batch_size=128)
+            test_dataloader = batch_loader(test_dataset, range(len(test_dataset)), 128, shuffle=False)
             all_preds = []
             all_targets = []
             
@@ -79,12 +80,8 @@ class BaseSingleVectorMachine(Baseline):
                 logger.info(f'targets are saved at: {file.name}')
 
     def get_dataloaders(self, dataset, train_ids, validation_ids, batch_size):
-        train_subsampler = SubsetRandomSampler(train_ids)
-        validation_subsampler = SubsetRandomSampler(validation_ids)
-        train_loader = DataLoader(dataset, batch_size=len(train_ids),
-            drop_last=False, sampler=train_subsampler)
-        validation_loader = DataLoader(dataset, batch_size=len(validation_ids),
-            drop_last=False, sampler=validation_subsampler)
+        train_loader = batch_loader(dataset, train_ids, len(train_ids))
+        validation_loader = batch_loader(dataset, validation_ids, len(validation_ids))
         return train_loader, validation_loader
 
     def get_session_path(self, *args):
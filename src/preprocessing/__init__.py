@@ -3,6 +3,7 @@ from .repetitions import RepetitionRemoving
 from .stopwords import NLTKStopWordRemoving
 from .author_id_remover import AuthorIDReplacer, AuthorIDReplacerBert
 from .base import BasePreprocessing
+from .fused import FusedPreprocessing
 
 __all__ = [
     "NLTKStopWordRemoving",
@@ -10,4 +11,5 @@ __all__ = [
     "PunctuationRemoving",
     "AuthorIDReplacer",
     "AuthorIDReplacerBert",
+    "FusedPreprocessing",
 ]
\ No newline at end of file
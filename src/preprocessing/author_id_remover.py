@@ -4,15 +4,11 @@ from src.preprocessing.base import BasePreprocessing
 class AuthorIDReplacer(BasePreprocessing):
     AUTHOR_ID_TOKEN = "userID"
 
-    def opt(self, input: list[list[str]]) -> list[str]:
-        for record in input:
-            result = []
-            for token in record:
-                if (len(token) == 32 and
-                    len(set(token)) > 9): # a bit of conservativity is good.
-                    token = self.AUTHOR_ID_TOKEN
-                result.append(token)
-            yield result
+    def opt_token(self, token):
+        if (len(token) == 32 and
+            len(set(token)) > 9): # a bit of conservativity is good.
+            token = self.AUTHOR_ID_TOKEN
+        return token
 
     @classmethod
     def short_name(cls) -> str:
@@ -3,8 +3,20 @@ from src.utils.commons import RegisterableObject
 class BasePreprocessing(RegisterableObject):
 
     def opt(self, input):
-        pass
+        # preprocessings that work token by token only implement `opt_token`
+        transform = self.opt_token
+        for record in input:
+            result = []
+            for token in record:
+                token = transform(token)
+                if token is not None:
+                    result.append(token)
+            yield result
+
+    def opt_token(self, token):
+        # returns the transformed token, or None if the token should be dropped
+        raise NotImplementedError()
 
     def name(self) -> str:
         raise NotImplementedError()
-    
\ No newline at end of file
+    
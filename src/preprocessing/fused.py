@@ -0,0 +1,103 @@
+from functools import lru_cache
+
+from src.preprocessing.base import BasePreprocessing
+from src.utils.token_store import TokenStore
+
+
+class FusedPreprocessing(BasePreprocessing):
+    """
+    runs a list of preprocessings in one pass over the records. Consecutive preprocessings which work token by token
+    are fused into a single transform per token, and the others are chained as generators, so the output is the same
+    as applying them one after the other. The fused transforms memoize their results, including dropped tokens, in an
+    lru cache of `cache_size` raw tokens; 0 disables it.
+    """
+
+    def __init__(self, preprocessings, cache_size=2**16) -> None:
+        super().__init__()
+        self.preprocessings = list(preprocessings)
+        self.cache_size = cache_size
+        self.__caches__ = []
+        self.__stages__ = None
+
+    @staticmethod
+    def is_token_level(preprocessing):
+        cls = type(preprocessing)
+        return cls.opt is BasePreprocessing.opt and cls.opt_token is not BasePreprocessing.opt_token
+
+    def __fuse__(self, preprocessings):
+        transforms = [preprocessing.opt_token for preprocessing in preprocessings]
+
+        def transform(token):
+            for t in transforms:
+                token = t(token)
+                if token is None:
+                    return None
+            return token
+        if self.cache_size:
+            transform = lru_cache(maxsize=self.cache_size)(transform)
+            self.__caches__.append(transform)
+
+        def opt(input):
+            for record in input:
+                result = []
+                for token in record:
+                    token = transform(token)
+                    if token is not None:
+                        result.append(token)
+                yield result
+
+        return opt
+
+    def stages(self):
+        if self.__stages__ is not None:
+            return self.__stages__
+        stages, run = [], []
+        for preprocessing in self.preprocessings:
+            if self.is_token_level(preprocessing):
+                run.append(preprocessing)
+                continue
+            if len(run) > 0:
+                stages.append(self.__fuse__(run))
+                run = []
+            stages.append(preprocessing.opt)
+        if len(run) > 0:
+            stages.append(self.__fuse__(run))
+        self.__stages__ = stages
+        return stages
+
+    def cache_info(self):
+        infos = [cache.cache_info() for cache in self.__caches__]
+        return {"hits": sum(info.hits for info in infos), "misses": sum(info.misses for info in infos),
+                "size": sum(info.currsize for info in infos)}
+
+    def opt(self, input):
+        for stage in self.stages():
+            input = stage(input)
+        yield from input
+
+    def opt_store(self, store):
+        # with only token level preprocessings the transform runs once per vocabulary entry of the store
+        if all(self.is_token_level(preprocessing) for preprocessing in self.preprocessings):
+            return store.map_vocabulary(self.opt_token)
+        records = store.to_records()
+        if store.contexts is not None:
+            records = [(context, tuple(self.opt(sequence))) for context, sequence in records]
+        elif store.depth > 1:
+            records = [[*self.opt(sequence)] for sequence in records]
+        else:
+            records = [*self.opt(records)]
+        return TokenStore.from_records(records, depth=store.depth, with_context=store.contexts is not None)
+
+    def opt_token(self, token):
+        for preprocessing in self.preprocessings:
+            token = preprocessing.opt_token(token)
+            if token is None:
+                return None
+        return token
+
+    def name(self) -> str:
+        return " + ".join(preprocessing.name() for preprocessing in self.preprocessings)
+
+    @classmethod
+    def short_name(cls) -> str:
+        return "fused"
@@ -4,18 +4,14 @@ from src.preprocessing.base import BasePreprocessing
 
 
 class PunctuationRemoving(BasePreprocessing):
+    PATTERN = re.compile(r"[^A-Za-z0-9\s]+")
 
     def __init__(self) -> None:
         super().__init__()
     
-    def opt(self, input: list[list[str]]) -> list[str]:
-        for record in input:
-            result = []
-            for token in record:
-                t = re.sub(r"[^A-Za-z0-9\s]+", '', token)
-                if t:
-                    result.append(t)
-            yield result
+    def opt_token(self, token):
+        t = self.PATTERN.sub('', token)
+        return t if t else None
 
     def name(self) -> str:
         return "punctuation remover"
@@ -23,4 +19,4 @@ class PunctuationRemoving(BasePreprocessing):
     @classmethod
     def short_name(cls) -> str:
         return "pr"
-    
\ No newline at end of file
+    
@@ -2,15 +2,12 @@ import re
 from src.preprocessing.base import BasePreprocessing
 
 class RepetitionRemoving(BasePreprocessing):
+    PATTERN = re.compile(r'((\w)\2{2,})')
 
-    def opt(self, input):
-        for record in input:
-            result = []
-            for token in record:
-                for instance, letter in re.findall(r'((\w)\2{2,})', token):
-                    token = token.replace(instance, letter)
-                result.append(token)
-            yield result
+    def opt_token(self, token):
+        for instance, letter in self.PATTERN.findall(token):
+            token = token.replace(instance, letter)
+        return token
     
     def name(self) -> str:
         return "repetition remover"
@@ -18,4 +15,4 @@ class RepetitionRemoving(BasePreprocessing):
     @classmethod
     def short_name(cls) -> str:
         return "rr"
-    
\ No newline at end of file
+    
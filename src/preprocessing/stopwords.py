@@ -8,17 +8,21 @@ from src.preprocessing.base import BasePreprocessing
 
 class NLTKStopWordRemoving(BasePreprocessing):
     
+    __stopwords__ = None
+    
     def __init__(self) -> None:
         super(NLTKStopWordRemoving).__init__()
-        
-    def opt(self, input: list[list[str]]) -> list[str]:
-        sw_set = set(stopwords.words())
-        for record in input:
-            result = []
-            for token in record:
-                if token not in sw_set:
-                    result.append(token)
-            yield result
+
+    @classmethod
+    def stopwords(cls):
+        # the stopwords of all languages are loaded once and shared by all instances
+        if cls.__stopwords__ is None:
+            cls.__stopwords__ = frozenset(stopwords.words())
+        return cls.__stopwords__
+
+
+    def opt_token(self, token):
+        return None if token in (self.__stopwords__ or self.stopwords()) else token
 
     def name(self) -> str:
         return "nltk stopwords remover"
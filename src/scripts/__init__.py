@@ -1,8 +1,10 @@
 from .dataset_creation import (CreateConversations, BalanceDatasetsForVersionTwo, CreateConversationToySet,
-    BalanceSequentialDatasetsForVersionTwo, XML2CSV)
+    BalanceSequentialDatasetsForVersionTwo, XML2CSV, IngestXML, DeduplicateConversations)
 from .data_stats import GenerateStats
 from .fine_tuning import finetune_tranformer_per_message
 from .core import PrintMappings
+from .tokenization import CompareTokenizers
+from .artifacts import CollectArtifactGarbage
 
 __all__ = [
     'CreateConversations',
@@ -13,4 +15,8 @@ __all__ = [
     "finetune_tranformer_per_message",
     "PrintMappings",
     "XML2CSV",
+    "IngestXML",
+    "DeduplicateConversations",
+    "CompareTokenizers",
+    "CollectArtifactGarbage",
 ]
\ No newline at end of file
@@ -0,0 +1,61 @@
+import logging
+import os
+
+import settings
+from src.utils.commons import CommandObject
+from src.utils.artifact_store import ArtifactStore
+
+logger = logging.getLogger()
+
+
+class CollectArtifactGarbage(CommandObject):
+
+    def get_actions_and_args(self):
+
+        def collect(artifact_paths=None, dry_run=False, grace_hours=24.0):
+            if not artifact_paths:
+                # the stores of all datasets in the settings file
+                artifact_paths = sorted({os.path.join(os.path.dirname(configs["output_path"]), "artifacts")
+                                         for _, *dataset_configs in settings.datasets.values() for configs in dataset_configs})
+            total = 0
+            for path in artifact_paths:
+                if not os.path.isdir(path):
+                    logger.info(f"no artifact store at '{path}'")
+                    continue
+                store = ArtifactStore(path)
+                removed, size = store.collect_garbage(dry_run=dry_run, grace_seconds=grace_hours * 3600)
+                for stage, key in removed:
+                    print(f"{'would remove' if dry_run else 'removed'} {stage} artifact {key}")
+                print(f"{path}: {len(store.refs())} refs, {len(removed)} unreferenced artifacts, {size / 2**20:.1f} MiB "
+                      f"{'can be freed' if dry_run else 'freed'}")
+                total += size
+            print(f"total: {total / 2**20:.1f} MiB")
+
+        return (collect, [{
+                "flags": "--artifacts-path",
+                "dest": "artifact_paths",
+                "nargs": "+",
+                "type": str,
+                "default": None,
+                "help": "artifact store directories; by default the ones of all datasets in the settings file",
+            }, {
+                "flags": "--dry-run",
+                "dest": "dry_run",
+                "action": "store_true",
+                "default": False,
+                "help": "only lists the artifacts that would be removed",
+            }, {
+                "flags": "--grace-hours",
+                "dest": "grace_hours",
+                "type": float,
+                "default": 24.0,
+                "help": "incomplete artifacts younger than this are kept, as another session may still be writing them",
+            },
+        ])
+
+    @classmethod
+    def command(cls) -> str:
+        return "artifacts-gc"
+
+    def help(self) -> str:
+        return "removes the prepared dataset artifacts (tokens, encoders, vectors) that no dataset refers to anymore"
@@ -1,5 +1,5 @@
 from src.utils.commons import CommandObject
-from src.mappings import PREPROCESSINGS, ACTIVATIONS, DATASETS, MODELS, LOSS_FUNCTIONS
+from src.mappings import PREPROCESSINGS, ACTIVATIONS, DATASETS, MODELS, LOSS_FUNCTIONS, TOKENIZERS
 
 TABS = 4
 NEST_TAB = 4
@@ -28,6 +28,7 @@ class PrintMappings(CommandObject):
             __print_mapping__(DATASETS, "datasets")
             __print_mapping__(MODELS, "models")
             __print_mapping__(LOSS_FUNCTIONS, "loss functions")
+            __print_mapping__(TOKENIZERS, "tokenizers")
         
         return callback, []
     
@@ -1,6 +1,10 @@
+import logging
+
 import pandas as pd
 
-from src.utils.commons import get_stats_v2, CommandObject
+from src.utils.commons import get_stats_v2, get_stats_v2_chunked, memory_report, read_dataframe, CommandObject
+
+logger = logging.getLogger()
 
 
 def _flatten_stat_dict(stats):
@@ -22,13 +26,14 @@ class GenerateStats(CommandObject):
 
     def get_actions_and_args(self):
         
-        def action():
-            train = pd.read_csv("data/dataset-v2/train.csv")
-            train_stats = get_stats_v2(train)
+        def action(train_path, test_path, memory_report_path, chunk_size):
+            if chunk_size > 0:
+                train_stats = get_stats_v2_chunked(train_path, chunk_size)
+                test_stats = get_stats_v2_chunked(test_path, chunk_size)
+            else:
+                train_stats = get_stats_v2(read_dataframe(train_path))
+                test_stats = get_stats_v2(read_dataframe(test_path))
             train_stats = _flatten_stat_dict(train_stats)
-
-            test  = pd.read_csv("data/dataset-v2/test.csv")
-            test_stats = get_stats_v2(test)
             test_stats = _flatten_stat_dict(test_stats)
             result = ["|Stat	| Train | Test|Test ∪ Train\n","|-----|------|------|------|\n"]
             keys = list(train_stats.keys())
@@ -37,8 +42,45 @@ class GenerateStats(CommandObject):
                 result.append(f"|{k}|{(train_stats[k]):>0.3f}|{(test_stats[k]):>0.3f}|{(train_stats[k]+test_stats[k]):>0.3f}|\n")
             with open("stats_as_readme_table.txt", mode="w+") as f:
                 f.writelines(result)
+
+            if memory_report_path is not None:
+                reports = pd.concat({"train": memory_report(read_dataframe(train_path)), "test": memory_report(read_dataframe(test_path))})
+                for name in ("train", "test"):
+                    total = reports.loc[(name, "total")]
+                    logger.info(f"{name}: {total['bytes']/2**20:.2f}MB -> {total['compact_bytes']/2**20:.2f}MB with the compact schema")
+                reports.to_csv(memory_report_path)
         
-        return (action, dict())
+        args = [
+            {
+                "dest": "train_path",
+                "type": str,
+                "default": "data/dataset-v2/train.csv",
+                "help": "path to the train messages csv or parquet file",
+                "flags": "--train-path"
+            },
+            {
+                "dest": "test_path",
+                "type": str,
+                "default": "data/dataset-v2/test.csv",
+                "help": "path to the test messages csv or parquet file",
+                "flags": "--test-path"
+            },
+            {
+                "dest": "memory_report_path",
+                "type": str,
+                "default": None,
+                "help": "if set, writes the per column memory usage of the loaded and the compact schema frames to this csv file",
+                "flags": "--memory-report"
+            },
+            {
+                "dest": "chunk_size",
+                "type": int,
+                "default": 0,
+                "help": "if above 0, the files are read in chunks of this many rows so they do not need to fit in memory",
+                "flags": "--chunk-size"
+            },
+        ]
+        return (action, args)
 
     @classmethod
     def command(cls) -> str:
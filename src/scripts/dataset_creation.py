@@ -1,17 +1,56 @@
+import os
 import re
 
-import pandas as pd
+from src.utils.commons import (message_csv2conversation_csv, message_csv2conversation_csv_chunked, balance_dataset, create_toy_dataset, pan12_xml2csv,
+                               pan12_xml2csv_streaming, pan12_xml2csv_parallel, pan12_ingest, read_dataframe, save_dataframe, with_format, CommandObject)
+from src.utils.sampling import balance_dataset_streaming, create_toy_dataset_streaming
+from src.utils.dedup import find_duplicates, conversations_of
 
-from src.utils.commons import message_csv2conversation_csv, force_open, balance_dataset, create_toy_dataset, pan12_xml2csv, CommandObject
+
+FILE_FORMAT_CHOICES = ("csv", "parquet")
+
+def __sampling_args__():
+    # a new list on every call since the parser pops the flags of each argument
+    return [{
+                "flags": "--seed",
+                "dest": "seed",
+                "type": int,
+                "default": 0,
+                "help": "seed of the random sampling",
+            }, {
+                "flags": "--streaming",
+                "dest": "streaming",
+                "action": "store_true",
+                "help": "sample in one pass over the input with a reservoir per label instead of loading the whole file",
+            }, {
+                "flags": "--by-conversation",
+                "dest": "by_conversation",
+                "action": "store_true",
+                "help": "sample whole conversations of a message file instead of single records. Implies `--streaming`. "
+                        "Messages of a conversation should be contiguous in the input",
+            }, {
+                "flags": "--chunk-size",
+                "dest": "chunk_size",
+                "type": int,
+                "default": 100000,
+                "help": "number of rows read at once in streaming mode",
+            },
+    ]
 
 
 class XML2CSV(CommandObject):
     
     def get_actions_and_args(self):
 
-        def callback(xmlfile, predatorsfile, output):
+        def callback(xmlfile, predatorsfile, output, streaming=False, chunk_size=10000, workers=1, shard_size=256):
+            if workers > 1:
+                pan12_xml2csv_parallel(xmlfile, predatorsfile, output, workers, shard_size=shard_size)
+                return
+            if streaming:
+                pan12_xml2csv_streaming(xmlfile, predatorsfile, output, chunk_size=chunk_size)
+                return
             df = pan12_xml2csv(xmlfile, predatorsfile)
-            df.to_csv(output, sep=",")
+            save_dataframe(df, output)
 
         return callback, [{
                 "flags": "--xml-file",
@@ -29,7 +68,35 @@ class XML2CSV(CommandObject):
                 "flags": "--output-file",
                 "dest": "output",
                 "type": str,
-                "help": "path where the generated csv will be saved",
+                "help": "path where the generated csv will be saved. If it ends with `.parquet` the output is written as parquet",
+            },
+            {
+                "flags": "--streaming",
+                "dest": "streaming",
+                "action": "store_true",
+                "default": False,
+                "help": "parse the xml file conversation by conversation and write the rows in chunks, so memory usage does not grow with the size of the input",
+            },
+            {
+                "flags": "--chunk-size",
+                "dest": "chunk_size",
+                "type": int,
+                "default": 10000,
+                "help": "number of message rows written to the output at once in streaming mode",
+            },
+            {
+                "flags": "--workers",
+                "dest": "workers",
+                "type": int,
+                "default": 1,
+                "help": "number of processes converting conversations in parallel. values above 1 imply streaming output with the same row order as the serial conversion",
+            },
+            {
+                "flags": "--shard-size",
+                "dest": "shard_size",
+                "type": int,
+                "default": 256,
+                "help": "number of conversations sent to a worker process at once when `--workers` is above 1",
             },
         ]
     
@@ -38,24 +105,89 @@ class XML2CSV(CommandObject):
         return "xml2csv"
     
     def help(self) -> str:
-        return "turns the pan12 xml file to csv which can be used by other scripts and commands."
+        return "turns the pan12 xml file (optionally gzip or bz2 compressed) to csv which can be used by other scripts and commands."
+
+
+class IngestXML(CommandObject):
+
+    def get_actions_and_args(self):
+
+        def ingest(xmlfiles, predatorsfile, messages_path, conversations_path, index_path=None, on_duplicate="skip", chunk_size=100000):
+            if index_path is None:
+                index_path = messages_path + ".index.pkl"
+            summary = pan12_ingest(xmlfiles, predatorsfile, messages_path, conversations_path, index_path,
+                                   update=on_duplicate == "update", chunk_size=chunk_size)
+            print(f"new conversations: {summary['new']} | updated: {summary['updated']} | skipped duplicates: {summary['skipped']} | appended messages: {summary['messages']}")
+
+        return ingest, [{
+                "flags": "--xml-files",
+                "dest": "xmlfiles",
+                "nargs": "+",
+                "type": str,
+                "help": "path to the new xml files of conversations (optionally gzip or bz2 compressed)",
+            }, {
+                "flags": "--predators-file",
+                "dest": "predatorsfile",
+                "type": str,
+                "help": "path to file of predators id",
+            }, {
+                "flags": "--messages-file",
+                "dest": "messages_path",
+                "type": str,
+                "help": "path to the csv file of messages which new records are appended to. It is created if it does not exist",
+            }, {
+                "flags": "--conversations-file",
+                "dest": "conversations_path",
+                "type": str,
+                "help": "path to the csv file of conversations which new records are appended to. It is created if it does not exist",
+            }, {
+                "flags": "--index-file",
+                "dest": "index_path",
+                "type": str,
+                "default": None,
+                "help": "path to the index of already ingested conversation ids. Defaults to '{--messages-file}.index.pkl'",
+            }, {
+                "flags": "--on-duplicate",
+                "dest": "on_duplicate",
+                "choices": ("skip", "update"),
+                "default": "skip",
+                "help": "what to do with conversations that are already ingested. `update` replaces their records",
+            }, {
+                "flags": "--chunk-size",
+                "dest": "chunk_size",
+                "type": int,
+                "default": 100000,
+                "help": "number of rows read at once when the existing files have to be scanned or rewritten",
+            },
+        ]
+
+    @classmethod
+    def command(cls) -> str:
+        return "ingest"
+
+    def help(self) -> str:
+        return "appends new pan12 xml dumps to existing message and conversation csv files without reprocessing the whole corpus."
 
 
 class CreateConversations(CommandObject):
 
     def get_actions_and_args(self):
         
-        def create_conversations(datasets_path, output_path):
-            df = pd.read_csv(f"{datasets_path}train.csv")
+        def create_conversations(datasets_path, output_path, input_format="csv", output_format="csv", chunk_size=0):
+            if chunk_size > 0:
+                os.makedirs(output_path, exist_ok=True)
+                for split in ("train", "test"):
+                    message_csv2conversation_csv_chunked(f"{datasets_path}{split}.{input_format}", f"{output_path}{split}.{output_format}", chunk_size=chunk_size)
+                return
+            columns = ("conv_id", "msg_line", "author_id", "text", "predatory_conv")
+            df = read_dataframe(f"{datasets_path}train.{input_format}", columns=columns)
             df = message_csv2conversation_csv(df)
-            with force_open(f"{output_path}train.csv", mode="wb") as f:
-                df.to_csv(f)
-                del df
+            save_dataframe(df, f"{output_path}train.{output_format}")
+            del df
             
-            df = pd.read_csv(f"{datasets_path}test.csv")
+            df = read_dataframe(f"{datasets_path}test.{input_format}", columns=columns)
             df = message_csv2conversation_csv(df)
-            with force_open(f"{output_path}test.csv", mode="wb") as f:
-                df.to_csv(f)
+            save_dataframe(df, f"{output_path}test.{output_format}")
         
         return (create_conversations, [{
                 "flags": "--datasets-path",
@@ -69,6 +201,26 @@ class CreateConversations(CommandObject):
                 "type": str,
                 "default": "data/dataset-v2/conversation/",
                 "help": "path to directory where the resulting conversation dataframe will be saved as CSV",
+            }, {
+                "flags": "--input-format",
+                "dest": "input_format",
+                "choices": FILE_FORMAT_CHOICES,
+                "default": "csv",
+                "help": "format of the train and test files under `--datasets-path`",
+            }, {
+                "flags": "--output-format",
+                "dest": "output_format",
+                "choices": FILE_FORMAT_CHOICES,
+                "default": "csv",
+                "help": "format of the resulting train and test files",
+            }, {
+                "flags": "--chunk-size",
+                "dest": "chunk_size",
+                "type": int,
+                "default": 0,
+                "help": "if positive, the message files are read in chunks of this many rows instead of loading them at once. "
+                        "Messages of a conversation should be contiguous in the input files, as xml2csv writes them; "
+                        "the output is sorted by conv_id like the in-memory conversion",
             },
         ])
     
@@ -80,21 +232,98 @@ class CreateConversations(CommandObject):
         return "creates conversations from csv file of messages"
 
 
+class DeduplicateConversations(CommandObject):
+
+    def get_actions_and_args(self):
+
+        def deduplicate(train, test, report_path, threshold=0.8, num_perm=128, shingle_size=3, drop=False):
+            splits = {"train": read_dataframe(train), "test": read_dataframe(test)}
+            columns = ("conv_id", "msg_line", "author_id", "text", "predatory_conv")
+            report = find_duplicates({name: conversations_of(df[[c for c in columns if c in df.columns]]) for name, df in splits.items()},
+                                     threshold=threshold, num_perm=num_perm, shingle_size=shingle_size)
+            save_dataframe(report, report_path)
+            print(f"duplicates in train: {report[report['split'] == 'train']['duplicate'].sum()} | "
+                  f"duplicates in test: {report[report['split'] == 'test']['duplicate'].sum()} | "
+                  f"train conversations with a near duplicate in test: {report[(report['split'] == 'train') & report['cross_split']].shape[0]}")
+            if not drop:
+                return
+            for (name, df), path in zip(splits.items(), (train, test)):
+                excluded = set(report[(report["split"] == name) & report["exclude"]]["conv_id"])
+                temp = re.split(r"(/|\\)", path)
+                save_dataframe(df[~df["conv_id"].astype(str).isin(excluded)], "".join(temp[:-1] + ["dedup-" + temp[-1]]))
+
+        return (deduplicate, [{
+                "flags": "--train-path",
+                "dest": "train",
+                "type": str,
+                "default": "data/dataset-v2/conversation/train.csv",
+                "help": "path to the train set of conversations or messages",
+            }, {
+                "flags": "--test-path",
+                "dest": "test",
+                "type": str,
+                "default": "data/dataset-v2/conversation/test.csv",
+                "help": "path to the test set of conversations or messages",
+            }, {
+                "flags": "--report-file",
+                "dest": "report_path",
+                "type": str,
+                "default": "data/dataset-v2/duplicates.csv",
+                "help": "path where the report of near-duplicate clusters is saved. It can be passed to datasets as `exclusion_path`",
+            }, {
+                "flags": "--threshold",
+                "dest": "threshold",
+                "type": float,
+                "default": 0.8,
+                "help": "minimum estimated jaccard similarity of the shingles of two conversations to count them as duplicates",
+            }, {
+                "flags": "--num-perm",
+                "dest": "num_perm",
+                "type": int,
+                "default": 128,
+                "help": "number of hash functions of the minhash signatures",
+            }, {
+                "flags": "--shingle-size",
+                "dest": "shingle_size",
+                "type": int,
+                "default": 3,
+                "help": "number of words in each shingle",
+            }, {
+                "flags": "--drop",
+                "dest": "drop",
+                "action": "store_true",
+                "help": "also save the sets without the excluded conversations with a 'dedup-' prefix added to the file names",
+            },
+        ])
+
+    @classmethod
+    def command(cls) -> str:
+        return "dedup"
+
+    def help(self) -> str:
+        return "finds near-duplicate conversations with minhash and lsh, within the train and test sets and across them."
+
+
+def __balance__(path, ratio, seed=0, streaming=False, by_conversation=False, chunk_size=100000):
+    if streaming or by_conversation:
+        return balance_dataset_streaming(path, ratio, seed=seed, chunk_size=chunk_size, by_conversation=by_conversation)
+    return balance_dataset(read_dataframe(path), ratio=ratio, seed=seed)
+
+
 class BalanceDatasetsForVersionTwo(CommandObject):
 
     def get_actions_and_args(self):
 
-        def balance_datasets_for_version_two(datasets_path, output_path, ratio=0.3):
-            train = f"{datasets_path}train-v2.csv" # TODO
-            test  = f"{datasets_path}test-v2.csv"  # TODO
+        def balance_datasets_for_version_two(datasets_path, output_path, ratio=0.3, input_format="csv", output_format="csv",
+                                             seed=0, streaming=False, by_conversation=False, chunk_size=100000):
+            train = f"{datasets_path}train-v2.{input_format}" # TODO
+            test  = f"{datasets_path}test-v2.{input_format}"  # TODO
             
-            df = pd.read_csv(train)
-            train = balance_dataset(df, ratio=ratio)
-            train.to_csv(f"data/dataset-v2/conversation/balanced-train-v2-{str(ratio).replace('.', '')}.csv")
+            train = __balance__(train, ratio, seed, streaming, by_conversation, chunk_size)
+            save_dataframe(train, f"data/dataset-v2/conversation/balanced-train-v2-{str(ratio).replace('.', '')}.{output_format}")
 
-            df = pd.read_csv(test)
-            test = balance_dataset(df, ratio=ratio)
-            test.to_csv(f"data/dataset-v2/conversation/balanced-test-v2-{str(ratio).replace('.', '')}.csv")
+            test = __balance__(test, ratio, seed, streaming, by_conversation, chunk_size)
+            save_dataframe(test, f"data/dataset-v2/conversation/balanced-test-v2-{str(ratio).replace('.', '')}.{output_format}")
         
         return (balance_datasets_for_version_two, [{
                 "flags": "--ratio",
@@ -114,7 +343,20 @@ class BalanceDatasetsForVersionTwo(CommandObject):
                 "type": str,
                 "default": "data/dataset-v2/conversation/",
                 "help": "path to directory where the resulting conversation dataframe will be saved as CSV with the name 'balanced-{test/test}-v2-{ratio}.csv'",
+            }, {
+                "flags": "--input-format",
+                "dest": "input_format",
+                "choices": FILE_FORMAT_CHOICES,
+                "default": "csv",
+                "help": "format of the train-v2 and test-v2 files under `--datasets-path`",
+            }, {
+                "flags": "--output-format",
+                "dest": "output_format",
+                "choices": FILE_FORMAT_CHOICES,
+                "default": "csv",
+                "help": "format of the balanced train and test files",
             },
+            *__sampling_args__(),
         ])
     
     @classmethod
@@ -129,15 +371,14 @@ class BalanceSequentialDatasetsForVersionTwo(CommandObject):
     
     def get_actions_and_args(self):
         
-        def balance_sequential_datasets_for_version_two(trainset, testset, output_path, ratio=0.3):
+        def balance_sequential_datasets_for_version_two(trainset, testset, output_path, ratio=0.3, output_format="csv",
+                                                        seed=0, streaming=False, by_conversation=False, chunk_size=100000):
 
-            df = pd.read_csv(trainset)
-            train = balance_dataset(df, ratio=ratio)
-            train.to_csv(f"{output_path}train-{str(ratio).replace('.', '')}.csv")
+            train = __balance__(trainset, ratio, seed, streaming, by_conversation, chunk_size)
+            save_dataframe(train, f"{output_path}train-{str(ratio).replace('.', '')}.{output_format}")
 
-            df = pd.read_csv(testset)
-            test = balance_dataset(df, ratio=ratio)
-            test.to_csv(f"{output_path}test-{str(ratio).replace('.', '')}.csv")
+            test = __balance__(testset, ratio, seed, streaming, by_conversation, chunk_size)
+            save_dataframe(test, f"{output_path}test-{str(ratio).replace('.', '')}.{output_format}")
         
         return (balance_sequential_datasets_for_version_two, [{
                 "flags": "--ratio",
@@ -163,7 +404,14 @@ class BalanceSequentialDatasetsForVersionTwo(CommandObject):
                 "type": str,
                 "default": "data/dataset-v2/",
                 "help": "path to directory where the resulting dataframe will be saved as CSV with the name '{test/test}-{ratio}.csv'",
+            }, {
+                "flags": "--output-format",
+                "dest": "output_format",
+                "choices": FILE_FORMAT_CHOICES,
+                "default": "csv",
+                "help": "format of the balanced train and test files",
             },
+            *__sampling_args__(),
         ])
     
     @classmethod
@@ -178,18 +426,21 @@ class CreateConversationToySet(CommandObject):
 
     def get_actions_and_args(self):
         
-        def create_conversation_toy_set(train, test, ratio):
-            df = pd.read_csv(train)
-            df = create_toy_dataset(df, ratio)
+        def create_conversation_toy_set(train, test, ratio, output_format=None, seed=0, streaming=False, by_conversation=False, chunk_size=100000):
+            def create_toy(path):
+                if streaming or by_conversation:
+                    return create_toy_dataset_streaming(path, ratio, seed=seed, chunk_size=chunk_size, by_conversation=by_conversation)
+                return create_toy_dataset(read_dataframe(path), ratio, seed=seed)
+
+            df = create_toy(train)
             temp = re.split(r"(/|\\)", train)
             new_path = "".join(temp[:-1] + ["toy-" + temp[-1]])
-            df.to_csv(new_path)
+            save_dataframe(df, new_path if output_format is None else with_format(new_path, output_format))
             
             temp = re.split(r"(/|\\)", test)
             new_path = "".join(temp[:-1] + ["toy-" + temp[-1]])
-            df = pd.read_csv(test)
-            df = create_toy_dataset(df, ratio)
-            df.to_csv(new_path)
+            df = create_toy(test)
+            save_dataframe(df, new_path if output_format is None else with_format(new_path, output_format))
         
         return (create_conversation_toy_set, [{
                 "flags": "--train-path",
@@ -209,7 +460,14 @@ class CreateConversationToySet(CommandObject):
                 "type": float,
                 "default": 0.1,
                 "help": "value of size(toy_set)/size(input_set)",
-            }
+            }, {
+                "flags": "--output-format",
+                "dest": "output_format",
+                "choices": FILE_FORMAT_CHOICES,
+                "default": None,
+                "help": "format of the toy sets. By default the same as the input files",
+            },
+            *__sampling_args__(),
         ])
 
     @classmethod
@@ -0,0 +1,95 @@
+import json
+import logging
+
+import pandas as pd
+
+from src.mappings import TOKENIZERS
+from src.utils.commons import read_dataframe, CommandObject
+from src.utils.tokenizers import compare_tokenizers, benchmark_tokenizer
+
+logger = logging.getLogger()
+
+
+class CompareTokenizers(CommandObject):
+
+    def get_actions_and_args(self):
+
+        def compare(data_paths, tokenizer, reference, sample=0, repeat=3, seed=0, report_path=None):
+            texts = pd.concat([read_dataframe(path, columns=["text"])["text"] for path in data_paths], ignore_index=True)
+            if 0 < sample < len(texts):
+                texts = texts.sample(n=sample, random_state=seed)
+            texts = texts.tolist()
+            try:
+                tokenizer, reference = TOKENIZERS[tokenizer](), TOKENIZERS[reference]()
+            except KeyError as e:
+                raise Exception(f"tokenizer {e} either not implemented or not registered") from e
+
+            logger.info(f"comparing `{tokenizer.short_name()}` to `{reference.short_name()}` on {len(texts)} texts")
+            report = compare_tokenizers(texts, tokenizer, reference)
+            report["benchmark"] = {tokenizer.short_name(): benchmark_tokenizer(tokenizer, texts, repeat),
+                                   reference.short_name(): benchmark_tokenizer(reference, texts, repeat)}
+            speedup = report["benchmark"][reference.short_name()]["seconds"] / report["benchmark"][tokenizer.short_name()]["seconds"]
+
+            print(f"texts: {report['texts']} | exact match: {report['exact_match']:.4f} | token precision: {report['token_precision']:.4f} | "
+                  f"token recall: {report['token_recall']:.4f} | vocabulary jaccard: {report['vocabulary_jaccard']:.4f}")
+            for name, result in report["benchmark"].items():
+                print(f"{name}: {result['texts_per_second']:.0f} texts/s, {result['tokens_per_second']:.0f} tokens/s")
+            print(f"speedup: {speedup:.2f}x")
+            print(f"most missing tokens: {report['missing_tokens']}")
+            print(f"most extra tokens: {report['extra_tokens']}")
+            if report_path is not None:
+                with open(report_path, "w") as f:
+                    json.dump(report, f, indent=2)
+
+        return (compare, [{
+                "flags": "--data-path",
+                "dest": "data_paths",
+                "nargs": "+",
+                "type": str,
+                "default": ["data/dataset-v2/toy-train.csv", "data/dataset-v2/toy-test.csv"],
+                "help": "paths to csv or parquet files with a `text` column",
+            }, {
+                "flags": "--tokenizer",
+                "dest": "tokenizer",
+                "type": str,
+                "default": "regex",
+                "help": "short name of the tokenizer to evaluate",
+            }, {
+                "flags": "--reference",
+                "dest": "reference",
+                "type": str,
+                "default": "nltk",
+                "help": "short name of the tokenizer to compare to",
+            }, {
+                "flags": "--sample",
+                "dest": "sample",
+                "type": int,
+                "default": 0,
+                "help": "if above 0, only this many randomly sampled texts are used",
+            }, {
+                "flags": "--repeat",
+                "dest": "repeat",
+                "type": int,
+                "default": 3,
+                "help": "the throughput is the best of this many runs",
+            }, {
+                "flags": "--seed",
+                "dest": "seed",
+                "type": int,
+                "default": 0,
+                "help": "seed of the sampling of texts",
+            }, {
+                "flags": "--report-file",
+                "dest": "report_path",
+                "type": str,
+                "default": None,
+                "help": "if set, the full report is saved to this json file",
+            },
+        ])
+
+    @classmethod
+    def command(cls) -> str:
+        return "compare-tokenizers"
+
+    def help(self) -> str:
+        return "reports how closely a tokenizer matches another one, nltk's `word_tokenize` by default, and their throughput"
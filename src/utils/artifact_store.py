@@ -0,0 +1,180 @@
+import hashlib
+import inspect
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+from src.utils.commons import file_signature
+
+logger = logging.getLogger()
+
+# stages of a prepared dataset and the files they save
+ARTIFACT_STAGES = {"tokens": "tokens", "tokens.pkl": "tokens", "encoder.pkl": "encoder", "vectors": "vectors", "vectors.pkl": "vectors",
+                   "records": "vectors"}
+COMPLETE_MARKER = "artifact.json"
+
+__source_hashes__ = dict()
+
+
+def fingerprint(*parts):
+    return hashlib.sha1(json.dumps([str(part) for part in parts]).encode("utf-8")).hexdigest()
+
+def source_hash(obj):
+    # hash of the source code of a class or function, so artifacts made by older code are not reused
+    if obj not in __source_hashes__:
+        try:
+            source = inspect.getsource(obj)
+        except (OSError, TypeError):
+            source = getattr(obj, "__qualname__", repr(obj))
+        __source_hashes__[obj] = hashlib.sha1(source.encode("utf-8")).hexdigest()
+    return __source_hashes__[obj]
+
+def class_hash(cls):
+    # the classes of the repository `cls` inherits from count too, as they hold most of its code
+    return fingerprint(*[f"{c.__qualname__}:{source_hash(c)}" for c in cls.__mro__ if c.__module__.startswith("src.")])
+
+
+class ArtifactStore:
+    """
+    content addressed storage of the artifacts of prepared datasets. An artifact is the output of one stage, i.e.
+    tokens, encoder or vectors, saved under `objects/<stage>/<fingerprint>`, where the fingerprint covers everything
+    the output depends on: the contents of the input files, the preprocessing chain, the dataset class and its code,
+    the vector size and the encoder. An artifact is complete once its `artifact.json` is written, so one cut short
+    is never loaded. Datasets record the fingerprints they use in a ref under `refs/`, and `collect_garbage` removes
+    the artifacts no ref points to. The tokens of the `SharedTokenCache` are artifacts of the `token-cache` stage.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def artifact_path(self, stage, key):
+        return os.path.join(self.path, "objects", stage, key)
+
+    def is_complete(self, stage, key):
+        return os.path.exists(os.path.join(self.artifact_path(stage, key), COMPLETE_MARKER))
+
+    def begin(self, stage, key):
+        # leftovers of an artifact that was cut short are removed before writing it again
+        path = self.artifact_path(stage, key)
+        if os.path.exists(path) and not self.is_complete(stage, key):
+            shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def complete(self, stage, key, description=""):
+        self.__mark__(self.artifact_path(stage, key), stage, key, description)
+
+    def __mark__(self, path, stage, key, description):
+        temp_path = os.path.join(path, f"{COMPLETE_MARKER}.{uuid.uuid4().hex}.tmp")
+        with open(temp_path, "w") as f:
+            json.dump({"stage": stage, "fingerprint": key, "description": description, "created": time.time()}, f)
+        os.replace(temp_path, os.path.join(path, COMPLETE_MARKER))
+
+    def put(self, stage, key, write, description=""):
+        """
+        writes an artifact aside with `write`, which saves it in the directory it is given, and moves it in place
+        complete, so concurrent sessions never see a partial one. Returns False if another session stored it first.
+        """
+        path = self.artifact_path(stage, key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(temp_path)
+        try:
+            write(temp_path)
+            self.__mark__(temp_path, stage, key, description)
+            if os.path.exists(path) and not self.is_complete(stage, key):
+                shutil.rmtree(path, ignore_errors=True)
+            os.rename(temp_path, path)
+            return True
+        except OSError:
+            if not self.is_complete(stage, key):
+                raise
+            return False
+        finally:
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def file_hash(self, path):
+        """
+        sha1 of the contents of a file. Hashes are kept in `file-hashes.json` by the path, size and modification time
+        of the file, so a file is only read again after it changes.
+        """
+        if path is None:
+            return "none"
+        signature = file_signature(path)
+        hashes_path = os.path.join(self.path, "file-hashes.json")
+        hashes = dict()
+        if os.path.exists(hashes_path):
+            with open(hashes_path, "r") as f:
+                hashes = json.load(f)
+        if signature not in hashes:
+            logger.info(f"hashing the contents of '{path}'")
+            digest = hashlib.sha1()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+            hashes = {s: h for s, h in hashes.items() if s.rsplit(":", 2)[0] != signature.rsplit(":", 2)[0]}
+            hashes[signature] = digest.hexdigest()
+            os.makedirs(self.path, exist_ok=True)
+            temp_path = f"{hashes_path}.{uuid.uuid4().hex}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(hashes, f, indent=1)
+            os.replace(temp_path, hashes_path)
+        return hashes[signature]
+
+    def ref_path(self, name):
+        return os.path.join(self.path, "refs", f"{name}.json")
+
+    def update_ref(self, name, keys):
+        # `keys` maps stages to the fingerprint, or the list of fingerprints, of the artifacts `name` uses
+        path = self.ref_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(keys, f, indent=1)
+        os.replace(temp_path, path)
+
+    def ref(self, name):
+        path = self.ref_path(name)
+        if not os.path.exists(path):
+            return dict()
+        with open(path, "r") as f:
+            return json.load(f)
+
+    def refs(self):
+        refs = dict()
+        root = os.path.join(self.path, "refs")
+        for directory, _, files in os.walk(root):
+            for file in files:
+                if file.endswith(".json"):
+                    with open(os.path.join(directory, file), "r") as f:
+                        refs[os.path.relpath(os.path.join(directory, file), root)[:-len(".json")]] = json.load(f)
+        return refs
+
+    def artifacts(self):
+        root = os.path.join(self.path, "objects")
+        if not os.path.isdir(root):
+            return []
+        return [(stage, key) for stage in sorted(os.listdir(root)) for key in sorted(os.listdir(os.path.join(root, stage)))]
+
+    def collect_garbage(self, dry_run=False, grace_seconds=24*3600):
+        """
+        removes the artifacts that no ref points to. Incomplete artifacts are only removed once they are older than
+        `grace_seconds`, as another session may still be writing them. Returns the removed artifacts and their size.
+        """
+        referenced = {(stage, key) for keys in self.refs().values() for stage, stage_keys in keys.items()
+                      for key in (stage_keys if isinstance(stage_keys, list) else [stage_keys])}
+        removed, size = [], 0
+        for stage, key in self.artifacts():
+            path = self.artifact_path(stage, key)
+            if (stage, key) in referenced:
+                continue
+            if not self.is_complete(stage, key) and time.time() - os.path.getmtime(path) < grace_seconds:
+                continue
+            artifact_size = sum(os.path.getsize(os.path.join(directory, file)) for directory, _, files in os.walk(path) for file in files)
+            removed.append((stage, key))
+            size += artifact_size
+            if not dry_run:
+                shutil.rmtree(path, ignore_errors=True)
+        return removed, size
@@ -0,0 +1,38 @@
+import torch
+from torch.utils.data import DataLoader, Sampler, SubsetRandomSampler
+
+
+class IndexBatchSampler(Sampler):
+    """
+    yields the record ids of each batch as one index tensor, so a packed dataset builds the whole batch with a single
+    gather, `dataset[ids]`, instead of one `__getitem__` and a collate per record. Used as the `sampler` of a
+    `DataLoader` with `batch_size=None`.
+    """
+
+    def __init__(self, ids, batch_size, shuffle=True, drop_last=False, generator=None):
+        self.ids = torch.as_tensor(ids, dtype=torch.long)
+        self.batch_size = batch_size if batch_size > 0 else max(len(self.ids), 1)
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.generator = generator
+
+    def __iter__(self):
+        ids = self.ids[torch.randperm(len(self.ids), generator=self.generator)] if self.shuffle else self.ids
+        end = len(ids) - len(ids) % self.batch_size if self.drop_last else len(ids)
+        for start in range(0, end, self.batch_size):
+            yield ids[start:start+self.batch_size]
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.ids) // self.batch_size
+        return (len(self.ids) + self.batch_size - 1) // self.batch_size
+
+
+def batch_loader(dataset, ids, batch_size, shuffle=True, **kwargs):
+    """
+    a `DataLoader` of the records `ids` of `dataset` in batches of `batch_size`: gathered at once by `IndexBatchSampler`
+    if the dataset is `packed`, item by item otherwise
+    """
+    if getattr(dataset, "packed", False):
+        return DataLoader(dataset, batch_size=None, sampler=IndexBatchSampler(ids, batch_size, shuffle=shuffle), **kwargs)
+    return DataLoader(dataset, batch_size=batch_size, sampler=SubsetRandomSampler(ids) if shuffle else ids, **kwargs)
@@ -1,4 +1,15 @@
 import os
+import gzip
+import bz2
+import heapq
+import operator
+import pickle
+import shutil
+import tempfile
+import uuid
+from collections import deque
+from functools import partial
+from multiprocessing import Pool
 
 import pandas as pd
 import numpy as np
@@ -10,23 +21,316 @@ import nltk
 from lxml import etree
 
 
-def nltk_tokenize(input) -> list[list[str]]:
-    tokens = [nltk.tokenize.word_tokenize(record.lower()) if pd.notna(record) else [] for record in input]
+def __tokenize_chunk__(tokenizer, records):
+    return tokenize_records(records, tokenizer)
+
+def tokenize_records(input, tokenizer=None, workers=1, chunk_size=1000) -> list[list[str]]:
+    # `tokenizer` is one of `src.utils.tokenizers`; nltk's `word_tokenize` is used if it is None. With more than one
+    # worker, chunks of records are tokenized in a process pool; `imap` keeps the input order
+    if workers > 1 and len(input) > chunk_size:
+        input = list(input)
+        chunks = (input[i:i+chunk_size] for i in range(0, len(input), chunk_size))
+        with Pool(workers) as pool:
+            return [tokens for chunk in pool.imap(partial(__tokenize_chunk__, tokenizer), chunks) for tokens in chunk]
+    tokenize = nltk.tokenize.word_tokenize if tokenizer is None else tokenizer.tokenize
+    tokens = [tokenize(record.lower()) if pd.notna(record) else [] for record in input]
     return tokens
 
+def nltk_tokenize(input, workers=1, chunk_size=1000) -> list[list[str]]:
+    return tokenize_records(input, None, workers, chunk_size)
+
+def split_groups(records, lengths):
+    # inverse of flattening a list of groups with the given lengths
+    offsets = np.cumsum([0, *lengths])
+    return [records[offsets[i]:offsets[i+1]] for i in range(len(lengths))]
+
+def file_signature(path):
+    # changes whenever the file is rewritten; "none" if there is no file
+    if path is None:
+        return "none"
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
 def force_open(path, *args, **kwargs):
     os.makedirs(os.path.dirname(path), exist_ok=True)
 
     return open(path, *args, **kwargs)
 
-def pan12_xml2csv(xmlfile, predatorsfile):
+PAN12_COLUMNS = ["conv_id", "msg_line", "author_id", "time", "msg_char_count", "msg_word_count", "conv_size", "nauthor", "text", "tagged_predator", "predatory_conv"]
+
+# canonical compact dtypes of message and conversation frames; ids are dictionary encoded and `text` stays as object
+MESSAGE_SCHEMA = {"conv_id": "category", "msg_line": "int32", "author_id": "category", "time": "float32",
+                  "msg_char_count": "int32", "msg_word_count": "int32", "conv_size": "int32", "nauthor": "int32",
+                  "tagged_predator": "float32", "predatory_conv": "float32"}
+CONVERSATION_SCHEMA = {"conv_id": "category", "predatory_conv": "float32", "number_of_messages": "int32",
+                       "number_of_authors": "int32"}
+DATASET_SCHEMA = {**MESSAGE_SCHEMA, **CONVERSATION_SCHEMA}
+
+def apply_schema(df, schema=DATASET_SCHEMA):
+    return df.astype({c: t for c, t in schema.items() if c in df.columns and df[c].dtype != t})
+
+def drop_unused_categories(df):
+    # after filtering, categorical columns keep the categories of the dropped rows
+    categories = df.select_dtypes("category").columns
+    return df.assign(**{c: df[c].cat.remove_unused_categories() for c in categories}) if len(categories) else df
+
+def memory_report(df, schema=DATASET_SCHEMA):
+    typed = apply_schema(df, schema)
+    report = pd.DataFrame({
+        "dtype": df.dtypes.astype(str),
+        "bytes": df.memory_usage(index=False, deep=True),
+        "compact_dtype": typed.dtypes.astype(str),
+        "compact_bytes": typed.memory_usage(index=False, deep=True),
+    })
+    report.loc["total"] = ["", report["bytes"].sum(), "", report["compact_bytes"].sum()]
+    report["saving"] = 1 - report["compact_bytes"] / report["bytes"]
+    return report
+
+def open_compressed(path, mode="rb"):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode)
+    if path.endswith(".bz2"):
+        return bz2.open(path, mode)
+    return open(path, mode)
+
+def load_predators(predatorsfile):
     with open(predatorsfile, "r") as f:
         predators = set(l.strip() for l in f.readlines())
         if len(predators) == 0:
             raise Exception(f"No predator was specified at '{predatorsfile}'")
+    return predators
+
+def pan12_conversation_rows(conv, predators):
+    # single pass over the messages of one <conversation> element; produces the same rows as `pan12_xml2csv`
+    conv_id = conv.get("id")
+    conv_size = len(conv)
+    messages = []
+    conversation_authors = set()
+    for msg in conv:
+        author = msg.findtext("author") or ""
+        if author:
+            conversation_authors.add(author)
+        messages.append((msg.get("line"), author, msg.findtext("time") or "", msg.findtext("text") or ""))
+    
+    nauthor = len(conversation_authors)
+    predatory_conversation = 1.0 if len(conversation_authors & predators) > 0 else 0.0
+    return [[conv_id, int(line), author, float(time.replace(":", ".")), len(body), len(body.split()), conv_size, nauthor, body,
+             1.0 if author in predators else 0.0, predatory_conversation] for line, author, time, body in messages]
+
+def iter_pan12_conversations(xmlfile):
+    with open_compressed(xmlfile) as f:
+        for _, conv in etree.iterparse(f, events=("end",), tag="conversation"):
+            yield conv
+            # dropping the processed element and its already processed siblings keeps the tree from growing
+            conv.clear()
+            while conv.getprevious() is not None:
+                del conv.getparent()[0]
+
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+FILTER_OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+def is_parquet(path):
+    return path.endswith(PARQUET_EXTENSIONS)
+
+def with_format(path, file_format):
+    # replaces the extension of `path` with the one of `file_format`, e.g. ("data/train.csv", "parquet") -> "data/train.parquet"
+    return os.path.splitext(path)[0] + "." + file_format
+
+def filter_dataframe(df, filters):
+    # filters are (column, operator, value) triples which are all applied, the same format as pyarrow's filters
+    mask = np.ones(len(df), dtype=bool)
+    for column, op, value in filters:
+        mask &= FILTER_OPERATORS[op](df[column], value).to_numpy()
+    return df[mask]
+
+def describe_filters(filters):
+    return " & ".join(f"{column} {op} {value}" for column, op, value in filters)
+
+def read_dataframe(path, columns=None, filters=None, schema=None, **kwargs):
+    """
+    reads a csv or parquet file based on its extension. For parquet files only `columns` are read from disk and
+    `filters` are pushed down to the scan. For csv files `columns` is used to skip the other columns while parsing
+    and `filters` are applied after reading. Columns that do not exist in the file are ignored. If a `schema` is
+    given, the columns it names are read with its dtypes.
+    """
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        if columns is not None:
+            existing = set(pq.read_schema(path).names)
+            columns = [c for c in columns if c in existing]
+        df = pd.read_parquet(path, columns=columns, filters=list(filters) if filters else None, **kwargs)
+        if schema is not None:
+            df = drop_unused_categories(apply_schema(df, schema))
+        return df
+    
+    if columns is not None:
+        columns = set(columns)
+        kwargs["usecols"] = lambda c: c in columns
+    if schema is not None:
+        kwargs["dtype"] = {**schema, **kwargs.get("dtype", dict())}
+    df = pd.read_csv(path, **kwargs)
+    if filters:
+        df = filter_dataframe(df, filters)
+        if schema is not None:
+            df = drop_unused_categories(df)
+    return df
+
+def arrow_table(df, schema=None):
+    """
+    `df` as a pyarrow table for parquet files. Dictionary encoded columns get int32 indices whatever their number of
+    categories, so a frame written at once and in chunks has the same schema. With `schema`, the table is cast to it.
+    """
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if schema is None:
+        schema = pa.schema([pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type)) if pa.types.is_dictionary(f.type) else f
+                            for f in table.schema], metadata=table.schema.metadata)
+    return table.cast(schema)
+
+def save_dataframe(df, path):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        pq.write_table(arrow_table(df), path)
+    else:
+        df.to_csv(path)
+
+
+class ChunkedDataFrameWriter:
+    """
+    appends dataframes to a single csv or parquet file, chosen by the extension of `path`. For csv files the index keeps
+    counting across chunks, so the result is the same as writing the concatenation of all chunks at once.
+    `append_at` continues an existing csv file whose last index is `append_at - 1` instead of overwriting it. With a
+    `schema`, e.g. `MESSAGE_SCHEMA`, each chunk is cast to its dtypes, so the file is typed as if it was written at once.
+    """
+    def __init__(self, path, columns, append_at=None, schema=None):
+        self.path = path
+        self.columns = columns
+        self.schema = schema
+        self.append = append_at is not None
+        self.rows_written = append_at or 0
+        self.parquet = is_parquet(path)
+        self.__file__ = None
+        self.__schema__ = None
+        if self.append and self.parquet:
+            raise ValueError(f"cannot append to the parquet file at '{path}'")
+
+    def write_rows(self, rows):
+        self.write(pd.DataFrame(rows, columns=self.columns))
+
+    def write(self, df):
+        df = df.set_axis(range(self.rows_written, self.rows_written + len(df)), axis=0)
+        if self.schema is not None:
+            df = apply_schema(df, self.schema)
+        if self.parquet:
+            self.__write_parquet__(df)
+        elif self.__file__ is None:
+            header = not self.append or not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self.__file__ = open(self.path, "a" if self.append else "w", newline="")
+            df.to_csv(self.__file__, header=header)
+        elif len(df) > 0:
+            df.to_csv(self.__file__, header=False)
+        self.rows_written += len(df)
+
+    def __write_parquet__(self, df):
+        import pyarrow.parquet as pq
+        if len(df) == 0:
+            return
+        # the schema of the first chunk is enforced on the rest, e.g. a chunk of only empty texts should still be strings
+        table = arrow_table(df, self.__schema__)
+        if self.__file__ is None:
+            self.__schema__ = table.schema
+            self.__file__ = pq.ParquetWriter(self.path, self.__schema__)
+        self.__file__.write_table(table)
+
+    def close(self):
+        if self.__file__ is None:
+            if self.parquet:
+                empty = pd.DataFrame([], columns=self.columns)
+                save_dataframe(empty if self.schema is None else apply_schema(empty, self.schema), self.path)
+                return
+            self.write_rows([])
+        self.__file__.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def pan12_xml2csv_streaming(xmlfile, predatorsfile, output, chunk_size=10000):
+    predators = load_predators(predatorsfile)
+
+    rows_list = []
+    with ChunkedDataFrameWriter(output, PAN12_COLUMNS, schema=MESSAGE_SCHEMA) as writer:
+        for counter, conv in enumerate(iter_pan12_conversations(xmlfile)):
+            if counter % 500 == 0:
+                print(counter)
+            rows_list.extend(pan12_conversation_rows(conv, predators))
+            if len(rows_list) >= chunk_size:
+                writer.write_rows(rows_list)
+                rows_list = []
+        writer.write_rows(rows_list)
+    return writer.rows_written
+
+__shard_predators__ = None
+
+def __init_shard_worker__(predators):
+    global __shard_predators__
+    __shard_predators__ = predators
+
+def __convert_shard__(shard):
+    rows_list = []
+    for conv in shard:
+        rows_list.extend(pan12_conversation_rows(etree.fromstring(conv), __shard_predators__))
+    return rows_list
+
+def iter_pan12_shards(xmlfile, shard_size):
+    shard = []
+    for conv in iter_pan12_conversations(xmlfile):
+        shard.append(etree.tostring(conv))
+        if len(shard) == shard_size:
+            yield shard
+            shard = []
+    if len(shard) > 0:
+        yield shard
+
+def pan12_xml2csv_parallel(xmlfile, predatorsfile, output, workers, shard_size=256):
+    # the corpus is cut at conversation boundaries into shards of serialized conversations which are converted in a process pool.
+    #   results are collected in submission order, so the csv rows have the same order as `pan12_xml2csv`
+    predators = load_predators(predatorsfile)
+    max_pending_shards = 2 * workers
+
+    with Pool(workers, initializer=__init_shard_worker__, initargs=(predators,)) as pool, \
+            ChunkedDataFrameWriter(output, PAN12_COLUMNS, schema=MESSAGE_SCHEMA) as writer:
+        pending = deque()
+        for counter, shard in enumerate(iter_pan12_shards(xmlfile, shard_size)):
+            if counter % 10 == 0:
+                print(counter * shard_size)
+            pending.append(pool.apply_async(__convert_shard__, (shard,)))
+            if len(pending) >= max_pending_shards:
+                writer.write_rows(pending.popleft().get())
+        while len(pending) > 0:
+            writer.write_rows(pending.popleft().get())
+    return writer.rows_written
+
+def pan12_xml2csv(xmlfile, predatorsfile):
+    predators = load_predators(predatorsfile)
     
     rows_list = []
-    root = etree.parse(xmlfile).getroot()
+    with open_compressed(xmlfile) as f:
+        root = etree.parse(f).getroot()
     for counter, conv in enumerate(root.getchildren()):
         if counter % 500 == 0:
             print(counter)
@@ -47,54 +351,238 @@ def pan12_xml2csv(xmlfile, predatorsfile):
                    len(body) if body is not None else 0, len(body.split()) if body is not None else 0,
                    len(conv.getchildren()), nauthor, '' if body is None else body, 1.0 if author in predators else 0.0, predatory_conversation]
             rows_list.append(row)
-    return pd.DataFrame(rows_list, columns=["conv_id", "msg_line", "author_id", "time", "msg_char_count", "msg_word_count", "conv_size", "nauthor", "text", "tagged_predator", "predatory_conv"])
+    return apply_schema(pd.DataFrame(rows_list, columns=PAN12_COLUMNS), MESSAGE_SCHEMA)
+
+CONVERSATION_COLUMNS = ["conv_id", "predatory_conv", "text", "number_of_messages", "number_of_authors"]
 
 def message_csv2conversation_csv(df):
-    groups = df.sort_values(by=["conv_id", "msg_line"]).groupby("conv_id")
-    conversations = []
-    for _, group in groups:
-        conversations.append((group["conv_id"].iloc[0], group["predatory_conv"].iloc[0], ". ".join(group["text"].fillna('')), group.shape[0], len(set(group["author_id"]))))
+    df = df.sort_values(by=["conv_id", "msg_line"])
+    groups = df.groupby("conv_id", sort=True, observed=True)
+    conversations = pd.DataFrame({
+        "predatory_conv": groups["predatory_conv"].first(),
+        "text": df["text"].fillna('').groupby(df["conv_id"], sort=True, observed=True).agg(". ".join),
+        "number_of_messages": groups.size(),
+        "number_of_authors": df.drop_duplicates(["conv_id", "author_id"]).groupby("conv_id", sort=True, observed=True).size(),
+    })
+    
+    return conversations.rename_axis("conv_id").reset_index()[CONVERSATION_COLUMNS]
+
+def iter_dataframe_chunks(path, chunk_size, columns=None, **kwargs):
+    # kwargs are passed to `pd.read_csv` for csv files
+    # the index of the chunks continues from one chunk to the next, so it is the row number in the file
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        offset = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield chunk
+        return
     
-    return pd.DataFrame(conversations, columns=["conv_id", "predatory_conv", "text", "number_of_messages", "number_of_authors"])
+    if columns is not None:
+        columns = set(columns)
+    yield from pd.read_csv(path, chunksize=chunk_size, usecols=None if columns is None else (lambda c: c in columns), **kwargs)
+
+def iter_conversation_chunks(path, chunk_size, columns=None, **kwargs):
+    # like `iter_dataframe_chunks` but a conversation is never split between two chunks. The messages of each
+    # conversation should be contiguous in the input, as `xml2csv` writes them
+    carry = None
+    for chunk in iter_dataframe_chunks(path, chunk_size, columns=columns, **kwargs):
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], axis=0)
+        # the last conversation of a chunk may continue in the next one
+        last_conversation = chunk["conv_id"] == chunk["conv_id"].iloc[-1]
+        carry = chunk[last_conversation]
+        if not last_conversation.all():
+            yield chunk[~last_conversation]
+    if carry is not None:
+        yield carry
+
+def __iter_conversation_run__(path, chunk_size):
+    # rows of a run of conversations written by `message_csv2conversation_csv_chunked`, read `chunk_size` at a time
+    for chunk in iter_dataframe_chunks(path, chunk_size, index_col=0, dtype={"conv_id": str, "text": str}):
+        yield from chunk.assign(text=chunk["text"].fillna(""))[CONVERSATION_COLUMNS].itertuples(index=False, name=None)
+
+def message_csv2conversation_csv_chunked(path, output, chunk_size=100000):
+    """
+    out-of-core version of `message_csv2conversation_csv` with the same output, i.e. conversations sorted by conv_id.
+    The messages of each conversation should be contiguous in the input, as `xml2csv` writes them, but conversations
+    can be in any order: the conversations of each chunk are written sorted to a temporary run and the runs are merged
+    by conv_id, reading at most `chunk_size` rows at once.
+    """
+    runs_path = tempfile.mkdtemp(prefix=".conversation-runs-", dir=os.path.dirname(output) or ".")
+    try:
+        runs = []
+        # ids are read as strings, as a chunk of only numeric ids or texts would otherwise be parsed as numbers
+        for chunk in iter_conversation_chunks(path, chunk_size, columns=("conv_id", "msg_line", "author_id", "text", "predatory_conv"),
+                                              dtype={"conv_id": str, "text": str}):
+            runs.append(os.path.join(runs_path, f"{len(runs)}.csv"))
+            save_dataframe(message_csv2conversation_csv(chunk), runs[-1])
+        
+        run_chunk_size = max(1, chunk_size // max(len(runs), 1))
+        rows = heapq.merge(*[__iter_conversation_run__(run, run_chunk_size) for run in runs], key=lambda row: row[0])
+        with ChunkedDataFrameWriter(output, CONVERSATION_COLUMNS) as writer:
+            rows_list = []
+            for row in rows:
+                rows_list.append(row)
+                if len(rows_list) >= chunk_size:
+                    writer.write_rows(rows_list)
+                    rows_list = []
+            writer.write_rows(rows_list)
+    finally:
+        shutil.rmtree(runs_path, ignore_errors=True)
+    return writer.rows_written
+
+def __load_ingestion_index__(index_path, messages_path, conversations_path, chunk_size):
+    if os.path.exists(index_path):
+        with open(index_path, "rb") as f:
+            return pickle.load(f)
+    
+    # bootstrapping the index from the datasets created before incremental ingestion. Ids are read as strings, the
+    # way the xml dumps have them, as numeric looking ones would otherwise be parsed as numbers and never match
+    index = {"conversations": set(), "messages": 0, "conversation_records": 0}
+    if os.path.exists(messages_path):
+        for chunk in iter_dataframe_chunks(messages_path, chunk_size, columns=("conv_id",), dtype={"conv_id": str}):
+            index["conversations"].update(chunk["conv_id"])
+            index["messages"] += len(chunk)
+    if os.path.exists(conversations_path):
+        for chunk in iter_dataframe_chunks(conversations_path, chunk_size, columns=("conv_id",), dtype={"conv_id": str}):
+            index["conversation_records"] += len(chunk)
+    return index
+
+def __copy_for_append__(path, temp_path, conv_ids, columns, chunk_size, rows):
+    # copies the file to `temp_path` without the given conversations and returns the number of rows of the copy
+    if len(conv_ids) == 0:
+        if os.path.exists(path):
+            shutil.copyfile(path, temp_path)
+        return rows
+    with ChunkedDataFrameWriter(temp_path, columns) as writer:
+        for chunk in iter_dataframe_chunks(path, chunk_size, dtype={"conv_id": str, "author_id": str, "text": str}):
+            writer.write(chunk.loc[~chunk["conv_id"].isin(conv_ids), columns])
+    return writer.rows_written
+
+def pan12_ingest(xmlfiles, predatorsfile, messages_path, conversations_path, index_path, update=False, chunk_size=100000):
+    """
+    appends the conversations of new xml dumps to existing message and conversation csv files. The ids of ingested
+    conversations are kept at `index_path`, so only the new files are parsed. Conversations that are already ingested
+    are skipped, or replaced when `update` is True, which requires rewriting the existing files once.
+    The files are written aside and moved in place at the end, the index last, so a failed ingestion changes nothing.
+    """
+    for path in (messages_path, conversations_path):
+        if is_parquet(path):
+            raise ValueError(f"cannot ingest into the parquet file at '{path}', only csv files can be appended to")
+    predators = load_predators(predatorsfile)
+    index = __load_ingestion_index__(index_path, messages_path, conversations_path, chunk_size)
 
-def create_toy_dataset(df, fraction=0.1, keep_distribution=True):
+    rows_list = []
+    new_conversations = dict()
+    skipped = 0
+    for xmlfile in xmlfiles:
+        for conv in iter_pan12_conversations(xmlfile):
+            conv_id = conv.get("id")
+            if (conv_id in index["conversations"] or conv_id in new_conversations) and not update:
+                skipped += 1
+                continue
+            # when updating, the last occurrence of a conversation wins
+            new_conversations[conv_id] = pan12_conversation_rows(conv, predators)
+    for rows in new_conversations.values():
+        rows_list.extend(rows)
+    
+    updated = index["conversations"] & new_conversations.keys()
+    temp_paths = {path: f"{path}.{uuid.uuid4().hex}.tmp" for path in (messages_path, conversations_path, index_path)}
+    try:
+        index["messages"] = __copy_for_append__(messages_path, temp_paths[messages_path], updated, PAN12_COLUMNS, chunk_size,
+                                                index["messages"])
+        index["conversation_records"] = __copy_for_append__(conversations_path, temp_paths[conversations_path], updated,
+                                                            CONVERSATION_COLUMNS, chunk_size, index["conversation_records"])
+
+        messages = pd.DataFrame(rows_list, columns=PAN12_COLUMNS)
+        with ChunkedDataFrameWriter(temp_paths[messages_path], PAN12_COLUMNS, append_at=index["messages"], schema=MESSAGE_SCHEMA) as writer:
+            writer.write(messages)
+        index["messages"] = writer.rows_written
+        with ChunkedDataFrameWriter(temp_paths[conversations_path], CONVERSATION_COLUMNS, append_at=index["conversation_records"]) as writer:
+            writer.write(message_csv2conversation_csv(messages))
+        index["conversation_records"] = writer.rows_written
+
+        index["conversations"].update(new_conversations.keys())
+        with open(temp_paths[index_path], "wb") as f:
+            pickle.dump(index, f)
+        # the index is moved last, so it never counts rows the files do not have yet
+        for path in (messages_path, conversations_path, index_path):
+            os.replace(temp_paths[path], path)
+    finally:
+        for temp_path in temp_paths.values():
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    return {"new": len(new_conversations) - len(updated), "updated": len(updated), "skipped": skipped, "messages": len(messages)}
+
+def create_toy_dataset(df, fraction=0.1, keep_distribution=True, seed=None):
+    rng = np.random.default_rng(seed)
     if keep_distribution:
-        predatories = df[df["predatory_conv"] > 0.5].sample(frac=fraction)
-        nonpredators = df[df["predatory_conv"] <= 0.5].sample(frac=fraction)
+        predatories = df[df["predatory_conv"] > 0.5].sample(frac=fraction, random_state=rng)
+        nonpredators = df[df["predatory_conv"] <= 0.5].sample(frac=fraction, random_state=rng)
         new_df = pd.concat([predatories, nonpredators], axis=0)
         return new_df
     
-    return df.sample(frac=fraction)
+    return df.sample(frac=fraction, random_state=rng)
 
 # ratio: predatory/(predatory+non-predatory)
-def balance_dataset(dataset, ratio=0.5):
+def balance_dataset(dataset, ratio=0.5, seed=None):
+    rng = np.random.default_rng(seed)
     predators_indices = dataset["predatory_conv"] == 1
     predators = dataset[predators_indices]
-    non_predators = dataset[~predators_indices].sample(n=int(predators.shape[0] * (1-ratio)/ratio))
-
-    return pd.concat([predators, non_predators], axis=0).sample(frac=1.0)
-
-def get_stats_v2(data):
-    predators_count = len(set(data[data["tagged_predator"] > 0.0]["author_id"]))
-    chatters_count  = len(set(data["author_id"]))
-    conversations = data.groupby("conv_id")
-    predatory_conversations = data[data["predatory_conv"] > 0.0].groupby("conv_id")
-    non_predatory_conversations = data[data["predatory_conv"] == 0.0].groupby("conv_id")
+    non_predators = dataset[~predators_indices].sample(n=int(predators.shape[0] * (1-ratio)/ratio), random_state=rng)
+
+    return pd.concat([predators, non_predators], axis=0).sample(frac=1.0, random_state=rng)
+
+def __stats_v2_aggregates__(data):
+    # per conversation message counts and the distinct (conversation, author, labels) rows; every stat of
+    # `get_stats_v2` is derived from these two frames, and both can be merged across chunks
+    predatory = (data["predatory_conv"] > 0.0).to_numpy()
+    non_predatory = (data["predatory_conv"] == 0.0).to_numpy()
+    counts = pd.DataFrame({
+        "messages": np.ones(len(data), dtype=np.int64),
+        "predatory_messages": predatory.astype(np.int64),
+        "non_predatory_messages": non_predatory.astype(np.int64),
+    }).groupby(data["conv_id"].to_numpy(), sort=True).sum()
+    authors = data[["conv_id", "author_id", "predatory_conv", "tagged_predator"]].drop_duplicates()
+    return counts, authors
+
+def __merge_stats_aggregates__(aggregates):
+    counts, authors = zip(*aggregates)
+    counts = pd.concat(counts).groupby(level=0).sum()
+    # keeping the first occurrence keeps the file order of authors within a conversation
+    authors = pd.concat(authors, ignore_index=True).drop_duplicates(keep="first")
+    return counts, authors
+
+def __authors_count__(authors, index, mask=None):
+    authors = authors if mask is None else authors[mask]
+    count = authors.drop_duplicates(["conv_id", "author_id"]).groupby("conv_id", observed=True).size()
+    return count.reindex(index, fill_value=0)
+
+def __stats_v2_from_aggregates__(counts, authors):
+    # a missing author counts as one chatter, as it did when the authors were counted as a set
+    predators_count = authors.loc[authors["tagged_predator"] > 0.0, "author_id"].nunique(dropna=False)
+    chatters_count = authors["author_id"].nunique(dropna=False)
+
+    conversations_messages_count = counts["messages"]
+    conversations_authors_count = __authors_count__(authors, counts.index)
+
+    predatory_conversations_messages_count = counts.loc[counts["predatory_messages"] > 0, "predatory_messages"]
+    non_predatory_conversations_messages_count = counts.loc[counts["non_predatory_messages"] > 0, "non_predatory_messages"]
+    predatory_conversations_authors_count = __authors_count__(authors, predatory_conversations_messages_count.index,
+                                                              authors["predatory_conv"] > 0.0)
+    non_predatory_conversations_authors_count = __authors_count__(authors, non_predatory_conversations_messages_count.index,
+                                                                  authors["predatory_conv"] == 0.0)
+    number_of_predatory_conversations = len(predatory_conversations_messages_count)
 
-    conversations_authors_count = conversations.apply(lambda x: len(set(x["author_id"])))
-    conversations_messages_count = conversations.apply(lambda x: x.shape[0])
-
-    predatory_conversations_authors_count = predatory_conversations.apply(lambda x: len(set(x["author_id"])))
-    non_predatory_conversations_authors_count = non_predatory_conversations.apply(lambda x: len(set(x["author_id"])))
-    predatory_conversations_messages_count = predatory_conversations.apply(lambda x: x.shape[0])
-    non_predatory_conversations_messages_count = non_predatory_conversations.apply(lambda x: x.shape[0])
-
-    
     stats = {
         "number_of_chatters": chatters_count,
         "number_of_predatory_chatters": predators_count,
-        "number_of_conversations": len(conversations),
-        "number_of_messages": data.shape[0],
+        "number_of_conversations": len(counts),
+        "number_of_messages": conversations_messages_count.sum(),
         "number_of_conversations_with_m_messages": {
             "m<=1": (conversations_messages_count <= 1).sum(),
             "m==2": (conversations_messages_count == 2).sum(),
@@ -121,7 +609,7 @@ def get_stats_v2(data):
             'all': conversations_messages_count.mean(),
         },
         
-        "number_of_predatory_conversations": len(predatory_conversations),
+        "number_of_predatory_conversations": number_of_predatory_conversations,
         "number_of_predatory_conversations_per_n_author": {
             "n==1":(predatory_conversations_authors_count == 1).sum(),
             "n==2": (predatory_conversations_authors_count == 2).sum(),
@@ -141,12 +629,70 @@ def get_stats_v2(data):
             'all': non_predatory_conversations_messages_count.mean()
         },
 
-        "average_conversations_per_predator": len(predatory_conversations) / predators_count,
+        "average_conversations_per_predator": number_of_predatory_conversations / predators_count,
 
     }
     
     return stats
 
+def get_stats_v2(data):
+    return __stats_v2_from_aggregates__(*__stats_v2_aggregates__(data))
+
+def get_stats_v2_chunked(path, chunk_size=100000):
+    chunks = iter_dataframe_chunks(path, chunk_size, columns=["conv_id", "author_id", "predatory_conv", "tagged_predator"],
+                                   dtype={"conv_id": str, "author_id": str})
+    return __stats_v2_from_aggregates__(*__merge_stats_aggregates__(__stats_v2_aggregates__(chunk) for chunk in chunks))
+
+def __stats_aggregates__(data):
+    binary = (data["nauthor"] == 2).to_numpy()
+    n_ary = (data["nauthor"] > 2).to_numpy()
+    tagged = (data["tagged_conv"] == 1).to_numpy()
+    predator = (data["tagged_predator"] == 1).to_numpy()
+    counts = pd.DataFrame({
+        "messages": np.ones(len(data), dtype=np.int64),
+        "binary_messages": binary.astype(np.int64),
+        "n_ary_messages": n_ary.astype(np.int64),
+        "tagged_messages": tagged.astype(np.int64),
+        "tagged_binary_messages": (binary & tagged).astype(np.int64),
+        "tagged_n_ary_messages": (n_ary & tagged).astype(np.int64),
+        "predator_messages": predator.astype(np.int64),
+        "normal_predator_messages": ((data["tagged_conv"] == 0).to_numpy() & predator).astype(np.int64),
+    }).groupby(data["conv_id"].to_numpy(), sort=True).sum()
+    # an author is counted as a predator of a conversation by its first message there
+    authors = data[["conv_id", "author_id", "tagged_predator"]].drop_duplicates(["conv_id", "author_id"])
+    return counts, authors
+
+def __stats_from_aggregates__(counts, authors):
+    def convs(column):
+        return int((counts[column] > 0).sum())
+
+    def messages(column):
+        return int(counts[column].sum())
+
+    authors = authors.drop_duplicates(["conv_id", "author_id"])
+    predators_per_conversation = authors[authors["tagged_predator"] == 1].groupby("conv_id", observed=True).size()
+
+    stats = {'n_convs': len(counts),
+             'n_msgs': messages("messages"),
+             'avg_n_msgs_convs': round(messages("messages") / len(counts), 2),
+             'n_binconv': convs("binary_messages"),
+             'n_n-aryconv': convs("n_ary_messages"),
+             'avg_n_msgs_binconvs': round(messages("binary_messages") / convs("binary_messages"), 2),
+             'avg_n_msgs_nonbinconvs': round(messages("n_ary_messages") / convs("n_ary_messages"), 2),
+
+             'n_tagged_binconvs': convs("tagged_binary_messages"),
+             # needs relabeling: 1) any convs with at least one tagged_msg, 2) any convs with at least one predator
+             'n_tagged_nonbinconvs': convs("tagged_n_ary_messages"),
+             # needs relabeling
+             'avg_n_msgs_tagged_convs': round(messages("tagged_messages") / convs("tagged_messages"), 2),
+
+             'n_convs_mult_predators': int((predators_per_conversation > 1).sum()),
+             'avg_n_msgs_convs_for_predator': round(messages("predator_messages") / convs("predator_messages"), 2),
+             'avg_n_normalconvs_for_predator': messages("normal_predator_messages"),
+             }
+
+    return stats
+
 def get_stats(data):
     """_summary_
 
@@ -156,41 +702,12 @@ def get_stats(data):
     Returns:
         _type_: _description_
     """
+    return __stats_from_aggregates__(*__stats_aggregates__(data))
 
-    stats = {'n_convs': len(data.groupby('conv_id')),
-             'n_msgs': len(data),
-             'avg_n_msgs_convs': round(len(data) / len(data.conv_id.unique()), 2),
-             'n_binconv': len(data[data['nauthor'] == 2].groupby('conv_id')),
-             'n_n-aryconv': len(data[data['nauthor'] > 2].groupby('conv_id')),
-             'avg_n_msgs_binconvs': round(
-                 len(data[data['nauthor'] == 2]) / len(data[data['nauthor'] == 2].groupby('conv_id')), 2),
-             'avg_n_msgs_nonbinconvs': round(
-                 len(data[data['nauthor'] > 2]) / len(data[data['nauthor'] > 2].groupby('conv_id')), 2),
-
-             'n_tagged_binconvs': len(data[(data['nauthor'] == 2) & (data['tagged_conv'] == 1)].groupby('conv_id')),
-             # needs relabeling: 1) any convs with at least one tagged_msg, 2) any convs with at least one predator
-             'n_tagged_nonbinconvs': len(data[(data['nauthor'] > 2) & (data['tagged_conv'] == 1)].groupby('conv_id')),
-             # needs relabeling
-             'avg_n_msgs_tagged_convs': round(
-                 len(data[data['tagged_conv'] == 1]) / len(data[data['tagged_conv'] == 1].groupby('conv_id')), 2),
-
-             'n_convs_mult_predators': 0,
-             'avg_n_msgs_convs_for_predator': round(len(data[(data['tagged_predator'] == 1)]) / len(
-                 data[(data['tagged_predator'] == 1)].groupby('conv_id')), 2),
-             'avg_n_normalconvs_for_predator': len(data[(data['tagged_conv'] == 0) & (data['tagged_predator'] == 1)]),
-             }
-
-    n_convs_mult_predators = 0
-    for id, gp in data.groupby('conv_id'):
-        num = 0
-        for id1, authors in gp.groupby('author_id'):
-            if authors.iloc[0].tagged_predator == 1:
-                num = num + 1
-        if num > 1:
-            n_convs_mult_predators = n_convs_mult_predators + 1
-    stats['n_convs_mult_predators'] = n_convs_mult_predators
-
-    return stats
+def get_stats_chunked(path, chunk_size=100000):
+    chunks = iter_dataframe_chunks(path, chunk_size, columns=["conv_id", "author_id", "nauthor", "tagged_conv", "tagged_predator"],
+                                   dtype={"conv_id": str, "author_id": str})
+    return __stats_from_aggregates__(*__merge_stats_aggregates__(__stats_aggregates__(chunk) for chunk in chunks))
 
 def confusion_matrix(prediction, target, threshold=0.5):
     tp = ((prediction > threshold) & (target > threshold)).sum()
@@ -0,0 +1,24 @@
+import numpy as np
+
+
+def time_of_day(time):
+    # `time` is hh.mm; the share of the day passed at that time
+    hours = np.floor(time)
+    return (hours*60 + (time - hours)*100)/1440
+
+def author_share(nauthor):
+    return nauthor/4.0
+
+def standardizer(mean, std):
+    def standardize(values):
+        return (values - mean)/std
+    return standardize
+
+def context_matrix(df, features):
+    """
+    context features of the rows of `df`, one column per `(column, transform)` pair of `features`. Each transform is
+    applied once to the whole column as float64, instead of row by row.
+    """
+    if len(features) == 0:
+        return np.zeros((len(df), 0))
+    return np.column_stack([transform(df[column].to_numpy(dtype=np.float64)) for column, transform in features])
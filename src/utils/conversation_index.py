@@ -0,0 +1,87 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.utils.artifact_store import fingerprint, class_hash
+
+logger = logging.getLogger()
+
+
+class ConversationIndex:
+    """
+    messages of a frame grouped by conversation without grouping them again. `order` holds the row positions sorted
+    by (`conv_id`, `msg_line`), so the messages of conversation `i` are the rows `order[offsets[i]:offsets[i+1]]`, and
+    `labels[i]` is its `predatory_conv`. Conversations are in the order `df.groupby("conv_id")` has them, and messages
+    with the same `msg_line` keep the order of the frame. Indexes are cached as artifacts of the `conversation-index`
+    stage of an `ArtifactStore`.
+    """
+    STAGE = "conversation-index"
+
+    def __init__(self, order, offsets, labels):
+        self.order = order
+        self.offsets = offsets
+        self.labels = labels
+
+    @classmethod
+    def build(cls, df):
+        codes, _ = pd.factorize(df["conv_id"], sort=True)
+        # messages without a conversation are left out, as `groupby` does
+        rows = np.flatnonzero(codes >= 0)
+        order = rows[np.lexsort((df["msg_line"].to_numpy()[rows], codes[rows]))]
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(codes[order], minlength=codes.max() + 1 if len(order) else 0), dtype=np.int64)))
+        labels = df["predatory_conv"].to_numpy(dtype=np.float32)[order[offsets[:-1]]]
+        return cls(order.astype(np.int64), offsets, labels)
+
+    @classmethod
+    def key(cls, artifacts, data_path, filters=None, exclusion_path=None):
+        # the index holds row positions of the frame as it is after filtering, so it depends on the filters too
+        return fingerprint(cls.STAGE, class_hash(cls), artifacts.file_hash(data_path), repr(tuple(filters)) if filters else "",
+                           artifacts.file_hash(exclusion_path))
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ("order", "offsets", "labels"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mmap_mode = "r" if mmap else None
+        return cls(*[np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ("order", "offsets", "labels")])
+
+    @classmethod
+    def cached(cls, artifacts, key, df, persist=True):
+        """
+        the index stored in `artifacts` under `key`, or a new one built from `df` and stored there if `persist`. A
+        stored index that does not fit the rows of `df` is not used.
+        """
+        path = artifacts.artifact_path(cls.STAGE, key)
+        if artifacts.is_complete(cls.STAGE, key):
+            index = cls.load(path)
+            if len(index.order) == df["conv_id"].notna().sum():
+                logger.info(f"loading conversation index from {path}")
+                return index
+            logger.info(f"conversation index at {path} does not fit the records, building it again")
+        logger.info("building conversation index")
+        index = cls.build(df)
+        if persist:
+            artifacts.put(cls.STAGE, key, index.save)
+        return index
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def rows(self, i):
+        return self.order[self.offsets[i]:self.offsets[i+1]]
+
+    def sorted(self, values):
+        # values of the rows in the order of the index, e.g. all texts conversation after conversation
+        return np.asarray(values)[self.order]
+
+    def split(self, values):
+        # one view of `sorted(values)` per conversation
+        return np.split(self.sorted(values), self.offsets[1:-1]) if len(self) else []
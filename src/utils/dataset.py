@@ -1,5 +1,7 @@
 import logging
+import os
 import pickle
+from functools import partial
 
 from tqdm import tqdm
 import pandas as pd
@@ -11,21 +13,65 @@ from transformers import BertTokenizer, AutoTokenizer
 from nltk.tokenize.treebank import TreebankWordDetokenizer
 
 from src.preprocessing.base import BasePreprocessing
+from src.preprocessing.fused import FusedPreprocessing
 from src.utils.one_hot_encoder import OneHotEncoder, SequentialOneHotEncoder, SequentialOneHotEncoderWithContext, OneHotEncoderWithContext
 from src.utils.transformers_encoders import TransformersEmbeddingEncoder, GloveEmbeddingEncoder, SequentialTransformersEmbeddingEncoder, \
         SequentialTransformersEmbeddingEncoderWithContext, TransformersEmbeddingEncoderWithContext, Word2VecEmbeddingEncoder, \
         SequentialWord2VecEmbeddingEncoder, Word2VecEmbeddingEncoderWithContext, SequentialTransformersWord2VecEncoderWithContext
-from src.utils.commons import nltk_tokenize, force_open, RegisterableObject
+from src.utils.commons import (tokenize_records, split_groups, force_open, read_dataframe, iter_dataframe_chunks, is_parquet, filter_dataframe,
+                               describe_filters, apply_schema, drop_unused_categories, DATASET_SCHEMA, RegisterableObject)
+from src.utils.dedup import excluded_conversations
+from src.utils.token_store import TokenStore, ragged_indices
+from src.utils.pipeline import ChunkPipeline
+from src.utils.token_cache import SharedTokenCache
+from src.utils.conversation_index import ConversationIndex
+from src.utils.context_features import context_matrix, time_of_day, author_share, standardizer
+from src.utils.artifact_store import ArtifactStore, ARTIFACT_STAGES, fingerprint, class_hash, source_hash
+from src.utils.vector_store import VECTOR_STORES, CSRVectorStore, RaggedVectorStore, LazyVectors, to_vector_store, load_vector_store
 
 
 logger = logging.getLogger()
 
 
-class BaseDataset(Dataset, RegisterableObject):
+def __preprocess_chunk__(preprocessings, tokens):
+    for preprocessor in preprocessings:
+        tokens = [*preprocessor.opt(tokens)]
+    return tokens
+
+
+def __select_records__(tokens_records, ids):
+    # the records `ids` of a list of records or of a `TokenStore`, which stays encoded
+    if isinstance(tokens_records, TokenStore):
+        return tokens_records.subset(ids)
+    return [tokens_records[i] for i in ids]
+
 
+class BaseDataset(Dataset, RegisterableObject):
+    # columns of the data file used by the dataset; None loads all of them
+    COLUMNS = None
+    # (column, operator, value) triples applied by `filter_records`. They are pushed down to the scan of columnar files
+    RECORD_FILTERS = None
+    # nesting of the records of tokens: number of levels of token lists, and whether records are (context, tokens) pairs
+    TOKENS_DEPTH = 1
+    TOKENS_WITH_CONTEXT = False
+    # whether records are the tokens of the texts of the `text` column as `preprocessed_texts` returns them, so their
+    # tokenization can be pipelined with `pipelined_preprocess`
+    TEXT_TOKENS = False
+    # (column, transform) pairs of the context features of records, computed column by column by `get_context_matrix`
+    CONTEXT_FEATURES = ()
     
     def __init__(self, data_path: str, output_path: str, load_from_pkl: bool, apply_record_filter: bool=True,
-                 preprocessings: list[BasePreprocessing] = [], persist_data=True, parent_dataset=None, device="cpu", vector_size=-1, *args, **kwargs):
+                 preprocessings: list[BasePreprocessing] = [], persist_data=True, parent_dataset=None, device="cpu", vector_size=-1,
+                 exclusion_path=None, tokenize_workers=1, tokenize_chunk_size=1000,
+                 preprocessing_cache_size=2**16, tokenizer=None, pipelined=False, pipeline_chunk_size=10000, pipeline_queue_size=4,
+                 shared_token_cache=True, artifact_store=True, vector_dtype="float32",
+                 lazy=False, lazy_cache_bytes=2**30, lazy_write_back=False, *args, **kwargs):
+        if kwargs.get("message_data_path") is not None:
+            # only conversation bag of words datasets take it, see `ConversationBagOfWords`
+            raise ValueError(f"{type(self).__name__} cannot build its tokens from the messages of `message_data_path`")
+        if pipelined and shared_token_cache:
+            # the cache is keyed by the hash of all texts, which the pipeline only knows once it read the last chunk
+            raise ValueError("the pipelined mode does not use the shared token cache, set `shared_token_cache` to False to use it")
         self.output_path = output_path
         self.parent_dataset = parent_dataset
         self.load_from_pkl = load_from_pkl
@@ -34,9 +80,38 @@ class BaseDataset(Dataset, RegisterableObject):
         self.df_path = data_path
         self.device = device
         self.apply_filter = apply_record_filter
+        # report of the `dedup` command; conversations marked in its `exclude` column are dropped by `filter_records`
+        self.exclusion_path = exclusion_path
+        self.tokenize_workers = tokenize_workers
+        self.tokenize_chunk_size = tokenize_chunk_size
+        self.preprocessing_cache_size = preprocessing_cache_size
+        # one of `src.utils.tokenizers`; nltk's `word_tokenize` if None
+        self.tokenizer = tokenizer
+        # the stages of the pipeline only run in parallel in processes, so it is used with `tokenize_workers` above 1
+        self.pipelined = pipelined
+        self.pipeline_chunk_size = pipeline_chunk_size
+        self.pipeline_queue_size = pipeline_queue_size
+        # tokens of texts are cached in the artifact store for all datasets, also without `artifact_store`; see `SharedTokenCache`
+        self.shared_token_cache = shared_token_cache
+        self.__token_cache__ = None
+        # tokens, encoder and vectors are saved in an `ArtifactStore` shared by the datasets of the same output
+        # directory and reused whenever their fingerprint matches; `load_from_pkl=False` still recomputes them
+        self.artifact_store = artifact_store
+        # dense vectors, i.e. embeddings, are stored as float16 or bfloat16 if set, and read back as float32
+        self.vector_dtype = vector_dtype
+        # a lazy dataset vectorizes records on first access, keeping up to `lazy_cache_bytes` of vectors in memory; with
+        # `lazy_write_back` the vectors are written to the artifact store as well. See `LazyVectors`
+        self.lazy = lazy
+        self.lazy_cache_bytes = lazy_cache_bytes
+        self.lazy_write_back = lazy_write_back
 
         self.__df__ = None
         self.__labels__ = None
+        self.__excluded__ = None
+        self.__contexts__ = None
+        self.__artifacts__ = None
+        self.__fingerprints__ = None
+        self.__artifact_ref__ = None
 
         self.already_prepared = False
         
@@ -46,12 +121,20 @@ class BaseDataset(Dataset, RegisterableObject):
 
         self.vector_size = vector_size
 
+    def read_columns(self):
+        columns = self.COLUMNS
+        if columns is not None and self.apply_filter and self.exclusion_path is not None:
+            columns = (*columns, "conv_id")
+        return columns
+
     @property
     def df(self):
         if self.__df__ is None:
-            self.__df__ = pd.read_csv(self.df_path)
+            self.__df__ = read_dataframe(self.df_path, columns=self.read_columns(), filters=self.RECORD_FILTERS if self.apply_filter else None,
+                                         schema=DATASET_SCHEMA)
             if self.apply_filter:
-                self.__df__ = self.filter_records(self.__df__)
+                self.log_record_filters()
+                self.__df__ = drop_unused_categories(self.filter_records(self.__df__))
 
         return self.__df__
     
@@ -69,7 +152,7 @@ class BaseDataset(Dataset, RegisterableObject):
         try:
             if not self.load_from_pkl:
                 raise FileNotFoundError()
-            with open(self.get_session_path("encoder.pkl"), "rb") as f:
+            with open(self.existing_artifact_path("encoder.pkl"), "rb") as f:
                 encoder = pickle.load(f)
         except FileNotFoundError:
             self.__new_encoder__ = True
@@ -77,13 +160,21 @@ class BaseDataset(Dataset, RegisterableObject):
 
         return encoder
 
+    def __load_vectors__(self):
+        if not self.load_from_pkl:
+            raise FileNotFoundError()
+        vectors_path = self.existing_artifact_path("vectors")
+        vectors = load_vector_store(vectors_path)
+        if vectors is not None:
+            logger.info(f"loading vectors from {type(vectors).__name__} at {vectors_path}")
+            return vectors
+        with open(self.existing_artifact_path("vectors.pkl"), "rb") as f:
+            logger.info("loading vectors from file")
+            return pickle.load(f)
+
     def __vectorize__(self, tokens_records, encoder):
         try:
-            if not self.load_from_pkl:
-                raise FileNotFoundError()
-            with open(self.get_session_path("vectors.pkl"), "rb") as f:
-                logger.info("loading vectors from file")
-                vectors = pickle.load(f)
+            vectors = self.__load_vectors__()
         except FileNotFoundError:
             logger.info("trying to create vectors from scratch")
             self.__new_vectors__ = True
@@ -91,21 +182,195 @@ class BaseDataset(Dataset, RegisterableObject):
         
         return vectors
     
+    def vectorize_records(self, tokens_records, encoder, ids):
+        # the normalized vectors of the records `ids` alone, for lazy datasets
+        return self.normalize_vector(self.vectorize(__select_records__(tokens_records, ids), encoder))
+
+    def __lazy_vectors__(self, tokens_records, encoder):
+        try:
+            return self.__load_vectors__()
+        except FileNotFoundError:
+            pass
+        records_path = self.get_artifact_path("records") if self.lazy_write_back else None
+        logger.info(f"vectorizing records on access, caching up to {self.lazy_cache_bytes / 2**20:.0f} MiB of vectors" +
+                    (f" and writing them to {records_path}" if records_path is not None else ""))
+        return LazyVectors(partial(self.vectorize_records, tokens_records, encoder), len(tokens_records), self.lazy_cache_bytes, records_path)
+
     def normalize_vector(self, vectors):
         return vectors
 
     def __str__(self):
-        return self.short_name() +"/p" + ".".join([pp.short_name() for pp in self.preprocessings]) + "-v" + str(self.get_vector_size()) +("-filtered" if self.apply_filter else "-nofilter")
-    
+        return self.short_name() +"/p" + ".".join([pp.short_name() for pp in self.preprocessings]) + "-v" + str(self.get_vector_size()) +("-filtered" if self.apply_filter else "-nofilter") + \
+            ("-dedup" if self.apply_filter and self.exclusion_path is not None else "") + \
+            ("-t" + self.tokenizer.short_name() if self.tokenizer is not None else "") + \
+            ("-" + self.vector_dtype if self.vector_dtype != "float32" else "")
+    
+    def excluded_conversations(self):
+        if self.__excluded__ is None:
+            self.__excluded__ = excluded_conversations(self.exclusion_path)
+        return self.__excluded__
+
+    def get_context_features(self):
+        return self.CONTEXT_FEATURES
+
+    def get_context_matrix(self):
+        # context features of the rows of `df`, computed once
+        if self.__contexts__ is None:
+            self.__contexts__ = context_matrix(self.df, self.get_context_features())
+        return self.__contexts__
+
+    def log_record_filters(self):
+        if self.exclusion_path is not None:
+            logger.info(f"excluding {len(self.excluded_conversations())} conversations listed in '{self.exclusion_path}'")
+        if not self.RECORD_FILTERS:
+            logger.info(f"no filter is applied to dataset: {self.short_name()}")
+        else:
+            logger.info(f"applying record filtering by '{describe_filters(self.RECORD_FILTERS)}'")
+
     def filter_records(self, df):
-        logger.info(f"no filter is applied to dataset: {self.short_name()}")
-        return df
+        # works row by row, so it can be applied to chunks of the records too
+        if self.exclusion_path is not None:
+            df = df[~df["conv_id"].astype(str).isin(self.excluded_conversations())]
+        if not self.RECORD_FILTERS:
+            return df
+        return filter_dataframe(df, self.RECORD_FILTERS)
 
     def get_session_path(self, filename) -> str:
         return self.output_path + self.__str__() + "/" + filename
+
+    @property
+    def artifacts(self) -> ArtifactStore:
+        # one store per output directory, so train and test datasets written next to each other share it
+        if self.__artifacts__ is None:
+            self.__artifacts__ = ArtifactStore(os.path.join(os.path.dirname(self.output_path), "artifacts"))
+        return self.__artifacts__
+
+    def artifact_inputs(self) -> list:
+        # what the tokens depend on besides the code of the dataset
+        return [self.artifacts.file_hash(self.df_path), self.apply_filter, self.RECORD_FILTERS if self.apply_filter else None,
+                self.artifacts.file_hash(self.exclusion_path if self.apply_filter else None), self.tokenizer_identity(),
+                [f"{preprocessing.short_name()}:{class_hash(type(preprocessing))}" for preprocessing in self.preprocessings]]
+
+    def encoder_identity(self) -> str:
+        # `init_encoder` names the encoder and its settings, e.g. the transformer identifier
+        return f"{self.vector_size}:{source_hash(type(self).init_encoder)}"
+
+    def artifact_fingerprints(self) -> dict:
+        """
+        fingerprints of the tokens, encoder and vectors of the dataset. A stage is recomputed only if its own
+        fingerprint changed, e.g. a new vector size keeps the tokens. They are computed once, before `prepare` can
+        change the vector size.
+        """
+        if self.__fingerprints__ is None:
+            tokens = fingerprint("tokens", type(self).__qualname__, class_hash(type(self)), *self.artifact_inputs())
+            if self.parent_dataset is not None:
+                encoder = self.parent_dataset.artifact_fingerprints()["encoder"]
+            else:
+                encoder = fingerprint("encoder", tokens, self.encoder_identity())
+            self.__fingerprints__ = {"tokens": tokens, "encoder": encoder, "vectors": fingerprint("vectors", tokens, encoder, self.vector_dtype)}
+            # refs are named after the session directory, so datasets that override `get_session_path` share one too
+            self.__artifact_ref__ = os.path.relpath(self.get_session_path(""), os.path.dirname(self.output_path) or ".")
+        return self.__fingerprints__
+
+    def artifact_ref_keys(self) -> dict:
+        # the artifacts of the stages and the cached tokens this dataset used, which `collect_garbage` keeps
+        keys = dict(self.artifact_fingerprints())
+        if self.__token_cache__ is not None and self.__token_cache__.used_keys:
+            keys[SharedTokenCache.STAGE] = sorted(self.__token_cache__.used_keys)
+        else:
+            # tokens loaded from the store keep the cached tokens they were made from
+            previous = self.artifacts.ref(self.__artifact_ref__)
+            if previous.get("tokens") == keys["tokens"] and SharedTokenCache.STAGE in previous:
+                keys[SharedTokenCache.STAGE] = previous[SharedTokenCache.STAGE]
+        return keys
+
+    def get_artifact_path(self, filename) -> str:
+        # where `tokens`, `encoder.pkl` and `vectors.pkl` are saved: in the artifact store, or in the session directory
+        if not self.artifact_store:
+            return self.get_session_path(filename)
+        stage = ARTIFACT_STAGES[filename]
+        return os.path.join(self.artifacts.artifact_path(stage, self.artifact_fingerprints()[stage]), filename)
+
+    def existing_artifact_path(self, filename) -> str:
+        # raises FileNotFoundError if the stage of `filename` is not complete in the artifact store
+        if self.artifact_store:
+            stage = ARTIFACT_STAGES[filename]
+            if not self.artifacts.is_complete(stage, self.artifact_fingerprints()[stage]):
+                raise FileNotFoundError(f"no {stage} artifact matches the inputs of {self}")
+        return self.get_artifact_path(filename)
+
+    def write_artifact(self, filename, write):
+        # `write` saves the artifact at the path it is given; in the store it is marked complete afterwards
+        if self.artifact_store:
+            stage = ARTIFACT_STAGES[filename]
+            self.artifacts.begin(stage, self.artifact_fingerprints()[stage])
+        write(self.get_artifact_path(filename))
+        if self.artifact_store:
+            self.artifacts.complete(stage, self.artifact_fingerprints()[stage], description=self.__artifact_ref__)
     
     def tokenize(self, input) -> list[list[str]]:
         raise NotImplementedError()
+
+    def save_tokens(self, tokens):
+        if not isinstance(tokens, TokenStore):
+            tokens = TokenStore.from_records(tokens, depth=self.TOKENS_DEPTH, with_context=self.TOKENS_WITH_CONTEXT)
+        def write(tokens_path):
+            logger.info(f"saving tokens as a token store at {tokens_path}")
+            tokens.save(tokens_path)
+        self.write_artifact("tokens", write)
+
+    def load_tokens(self):
+        # raises FileNotFoundError if there are no saved tokens. The `tokens.pkl` of older sessions can still be loaded.
+        # a token store is kept memory mapped; encoders working on strings decode its records as they iterate it
+        tokens_path = self.existing_artifact_path("tokens")
+        if TokenStore.exists(tokens_path):
+            logger.info(f"trying to load tokens from token store at {tokens_path}")
+            return TokenStore.load(tokens_path)
+        with open(self.existing_artifact_path("tokens.pkl"), "rb") as f:
+            logger.info("trying to load tokens from file")
+            return pickle.load(f)
+
+    def fused_preprocessings(self) -> list[BasePreprocessing]:
+        # all preprocessings are applied in one pass over the tokens
+        return [FusedPreprocessing(self.preprocessings, cache_size=self.preprocessing_cache_size)] if len(self.preprocessings) > 0 else []
+
+    def tokenize_texts(self, input) -> list[list[str]]:
+        return tokenize_records(input, self.tokenizer, workers=self.tokenize_workers, chunk_size=self.tokenize_chunk_size)
+
+    def tokenizer_identity(self) -> str:
+        return "nltk" if self.tokenizer is None else f"{self.tokenizer.short_name()}:{class_hash(type(self.tokenizer))}"
+
+    @property
+    def token_cache(self) -> SharedTokenCache:
+        if self.__token_cache__ is None:
+            self.__token_cache__ = SharedTokenCache(self.artifacts)
+        return self.__token_cache__
+
+    def preprocessed_store(self, input) -> TokenStore:
+        input = list(input)
+        if self.shared_token_cache:
+            return self.token_cache.preprocessed(input, self.tokenizer_identity(), self.preprocessings, self.tokenize_texts,
+                                                 persist=self.persist_data)
+        return TokenStore.from_records(self.preprocessed_texts(input))
+
+    def preprocessed_texts(self, input) -> list[list[str]]:
+        # tokens of the texts after all preprocessings, from the shared token cache if it is enabled
+        input = list(input)
+        if self.shared_token_cache:
+            return self.preprocessed_store(input).to_records()
+        tokens = self.tokenize_texts(input)
+        logger.info("applying preprocessing modules")
+        for preprocessor in self.fused_preprocessings():
+            logger.info(f"applying {preprocessor.name()}")
+            tokens = [*preprocessor.opt(tokens)]
+            logger.info(f"token cache of {preprocessor.short_name()} preprocessing: {preprocessor.cache_info()}")
+        return tokens
+
+    def tokenize_groups(self, groups, tokenize=None):
+        # tokenizes the texts of all groups, e.g. the messages of each conversation, in one call and splits them back
+        groups = [list(group) for group in groups]
+        tokenize = self.tokenize if tokenize is None else tokenize
+        return split_groups(tokenize([text for group in groups for text in group]), [len(group) for group in groups])
     
     def get_labels(self):
         if not self.already_prepared:
@@ -115,7 +380,7 @@ class BaseDataset(Dataset, RegisterableObject):
             return self.__labels__
         labels = torch.zeros((self.df.shape[0], 1), dtype=torch.float)
         for i in range(len(self.df)):
-            labels[i] = self.df.iloc[i]["predatory_conv"]
+            labels[i] = float(self.df.iloc[i]["predatory_conv"])
         self.__labels__ = labels
         return labels
 
@@ -168,20 +433,56 @@ class BaseDataset(Dataset, RegisterableObject):
         try:
             if not self.load_from_pkl:
                 raise FileNotFoundError()
-            with open(self.get_session_path("tokens.pkl"), "rb") as f:
-                logger.info("trying to load tokens from file")
-                tokens = pickle.load(f)
+            tokens = self.load_tokens()
         except FileNotFoundError:
             logger.info("generating tokens from scratch")
             self.__new_tokens__ = True
+            if self.pipelined and self.TEXT_TOKENS and self.tokenize_workers > 1:
+                return self.pipelined_preprocess()
+            if self.pipelined and self.TEXT_TOKENS:
+                logger.info("tokenizing without the pipeline, as its stages would share one process with `tokenize_workers` of 1")
             tokens = self.tokenize(self.df["text"])
-            logger.info("applying preprocessing modules")
-            for preprocessor in self.preprocessings:
-                logger.info(f"applying {preprocessor.name()}")
-                tokens = [*preprocessor.opt(tokens)]
 
         return tokens
 
+    def iter_record_chunks(self):
+        # chunks of the records as `df` has them. If `df` is not loaded yet, it is read chunk by chunk and put together
+        # from the chunks at the end
+        if self.__df__ is not None:
+            for i in range(0, len(self.__df__), self.pipeline_chunk_size):
+                yield self.__df__.iloc[i:i+self.pipeline_chunk_size]
+            return
+        if self.apply_filter:
+            self.log_record_filters()
+        chunks = []
+        kwargs = dict() if is_parquet(self.df_path) else {"dtype": DATASET_SCHEMA}
+        for chunk in iter_dataframe_chunks(self.df_path, self.pipeline_chunk_size, columns=self.read_columns(), **kwargs):
+            if self.apply_filter:
+                chunk = self.filter_records(chunk)
+            chunks.append(chunk)
+            yield chunk
+        # chunks may have different categories, so the schema is applied again to the whole frame. Filtered rows of
+        # parquet files are numbered from 0, as `read_dataframe` does
+        df = pd.concat(chunks, axis=0)
+        self.__df__ = drop_unused_categories(apply_schema(df.reset_index(drop=True) if is_parquet(self.df_path) else df, DATASET_SCHEMA))
+
+    def pipelined_preprocess(self):
+        """
+        reads, tokenizes and preprocesses chunks of `pipeline_chunk_size` records concurrently, so the time is about the
+        one of the slowest stage instead of the sum of them. Tokenization and preprocessing run in `tokenize_workers`
+        processes each, and at most `pipeline_queue_size` chunks wait between two stages. With one worker the stages
+        would be threads of one process, so `preprocess` only uses the pipeline with more. Vectorization is not a stage
+        of it: the encoder is fitted after the pipeline, as it needs the tokens of all records, and the records are
+        vectorized after that. The tokens are not shared through the token cache, see `__init__`.
+        """
+        logger.info(f"tokenizing and applying preprocessing modules in a pipeline of chunks of {self.pipeline_chunk_size} records")
+        pipeline = ChunkPipeline([
+            (partial(tokenize_records, tokenizer=self.tokenizer), self.tokenize_workers),
+            (partial(__preprocess_chunk__, self.fused_preprocessings()), self.tokenize_workers),
+        ], queue_size=self.pipeline_queue_size)
+        texts = (chunk["text"].tolist() for chunk in self.iter_record_chunks())
+        return [tokens for chunk in pipeline.run(texts) for tokens in chunk]
+
     def get_vector_size(self, vectors=None):
         if self.vector_size < 0:
             raise ValueError("vector size is not defined or calculated yet")
@@ -199,30 +500,47 @@ class BaseDataset(Dataset, RegisterableObject):
         if self.parent_dataset is not None:
            self.parent_dataset.prepare()
 
+        if self.artifact_store and (self.load_from_pkl or self.persist_data):
+            self.artifact_fingerprints()
         tokens = self.preprocess()
 
+        # fitting the encoder needs the tokens of all records, so it waits for the whole pipeline of a pipelined `preprocess`,
+        # and the records are vectorized only then
         self.encoder = self.__init_encoder__(tokens_records=tokens)
 
-        vectors = self.__vectorize__(tokens, self.encoder)
+        if self.lazy:
+            vectors = self.__lazy_vectors__(tokens, self.encoder)
+        else:
+            vectors = self.__vectorize__(tokens, self.encoder)
         if self.__new_vectors__:
             vectors = self.normalize_vector(vectors)
+        if not isinstance(vectors, (*VECTOR_STORES, LazyVectors)):
+            # bag of words and embedding vectors are kept as the rows of one matrix instead of a tensor each, also
+            # the ones of a `vectors.pkl` saved before
+            vectors = to_vector_store(vectors, self.vector_dtype)
         self.update_vector_size(vectors)
         # Persisting changes
         if self.persist_data and self.__new_tokens__:
-            tokens_path = self.get_session_path("tokens.pkl")
-            logger.info(f"saving tokens as pickle at {tokens_path}")
-            with force_open(tokens_path, "wb") as f:
-                pickle.dump(tokens, f)
-        if self.persist_data and self.__new_vectors__:
-            vectors_path = self.get_session_path("vectors.pkl")
-            logger.info(f"saving vectors as pickle at {vectors_path}")
-            with force_open(vectors_path, "wb") as f:
-                pickle.dump(vectors, f)
+            self.save_tokens(tokens)
+        if self.persist_data and self.__new_vectors__ and isinstance(vectors, VECTOR_STORES):
+            def write_vector_store(vectors_path):
+                logger.info(f"saving vectors as {type(vectors).__name__} at {vectors_path}")
+                vectors.save(vectors_path)
+            self.write_artifact("vectors", write_vector_store)
+        elif self.persist_data and self.__new_vectors__:
+            def write_vectors(vectors_path):
+                logger.info(f"saving vectors as pickle at {vectors_path}")
+                with force_open(vectors_path, "wb") as f:
+                    pickle.dump(vectors, f)
+            self.write_artifact("vectors.pkl", write_vectors)
         if self.persist_data and self.__new_encoder__:
-            encoder_path = self.get_session_path("encoder.pkl")
-            logger.info(f"saving encoder as pickle at {encoder_path}")
-            with force_open(encoder_path, "wb") as f:
-                pickle.dump(self.encoder, f)
+            def write_encoder(encoder_path):
+                logger.info(f"saving encoder as pickle at {encoder_path}")
+                with force_open(encoder_path, "wb") as f:
+                    pickle.dump(self.encoder, f)
+            self.write_artifact("encoder.pkl", write_encoder)
+        if self.persist_data and self.artifact_store:
+            self.artifacts.update_ref(self.__artifact_ref__, self.artifact_ref_keys())
         
         self.already_prepared = True
 
@@ -237,8 +555,16 @@ class BaseDataset(Dataset, RegisterableObject):
     def __len__(self):
         return len(self.data)
 
+    @property
+    def packed(self):
+        # whether the vectors are one block, so `self[ids]` gathers a batch at once; see `IndexBatchSampler`
+        return isinstance(self.data, CSRVectorStore) or (isinstance(self.data, RaggedVectorStore) and self.data.flat)
+
     def to(self, device):
         self.labels = self.labels.to(device)
+        if isinstance(self.data, (*VECTOR_STORES, LazyVectors)):
+            self.data = self.data.to(device)
+            return
         for i in range(len(self.data)):
             self.data[i] = self.data[i].to(device)
 
@@ -249,6 +575,7 @@ class BaseDataset(Dataset, RegisterableObject):
 
 # It is only for handling fine-tuning
 class FineTuningDistilrobertaDataset(BaseDataset):
+    COLUMNS = ("text", "predatory_conv")
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -269,11 +596,7 @@ class FineTuningDistilrobertaDataset(BaseDataset):
         except FileNotFoundError:
             logger.info("generating tokens from scratch")
             self.__new_tokens__ = True
-            tokens = nltk_tokenize(self.df["text"])
-            logger.info("applying preprocessing modules")
-            for preprocessor in self.preprocessings:
-                logger.info(f"applying {preprocessor.name()}")
-                tokens = [*preprocessor.opt(tokens)]
+            tokens = self.preprocessed_texts(self.df["text"])
             input_ids, attention_masks = self.tokenize(tokens)
 
         return input_ids, attention_masks
@@ -347,6 +670,8 @@ class FineTuningDistilrobertaDataset(BaseDataset):
 
 
 class BagOfWordsDataset(BaseDataset):
+    COLUMNS = ("text", "predatory_conv")
+    TEXT_TOKENS = True
 
     @classmethod
     def short_name(cls) -> str:
@@ -360,14 +685,23 @@ class BagOfWordsDataset(BaseDataset):
         return func
 
     def tokenize(self, input) -> list[list[str]]:
-        logger.debug("tokenizing using nltk")
-        return nltk_tokenize(input)
+        logger.debug("tokenizing using nltk" if self.tokenizer is None else f"tokenizing using {self.tokenizer.name()}")
+        return self.preprocessed_texts(input)
+
+    def records_store(self, tokens_records) -> TokenStore:
+        if isinstance(tokens_records, TokenStore):
+            return tokens_records
+        return TokenStore.from_records(tokens_records)
 
     def init_encoder(self, tokens_records):
         encoder = OneHotEncoder(vector_size=self.get_vector_size())
         logger.info("started generating bag of words vector encoder")
         data = set()
-        data.update(*tokens_records)
+        if isinstance(tokens_records, TokenStore):
+            # the vocabulary is in order of first occurrence, so the set is built as from the records
+            data.update(tokens_records.vocabulary[i] for i in np.flatnonzero(tokens_records.token_counts()))
+        else:
+            data.update(*tokens_records)
         pattern = lambda x: x
         logger.debug("fitting data into one hot encoder")
         encoder.fit(self.get_data_generator(data=data, pattern=pattern))
@@ -384,19 +718,77 @@ class BagOfWordsDataset(BaseDataset):
 
 
 class ConversationBagOfWords(BagOfWordsDataset):
-    
+    COLUMNS = ("text", "predatory_conv", "number_of_authors", "number_of_messages")
+    RECORD_FILTERS = (("number_of_authors", ">=", 2), ("number_of_messages", ">", 6))
+    # conversation texts are the texts of their messages joined by this, as `message_csv2conversation_csv` does
+    MESSAGE_SEPARATOR = "."
+
+    def __init__(self, *args, message_data_path=None, **kwargs):
+        if message_data_path is not None and not self.TEXT_TOKENS:
+            raise ValueError(f"{type(self).__name__} cannot build its tokens from the messages of `message_data_path`")
+        if message_data_path is not None and kwargs.get("pipelined"):
+            raise ValueError("tokens built from the messages of `message_data_path` are not tokenized, so they cannot be pipelined")
+        super().__init__(*args, **kwargs)
+        # the message file the conversations were created from. If set, the tokens of the conversations are the
+        # tokens of their messages, which are shared with message datasets of the same file through the token cache
+        self.message_data_path = message_data_path
+        self.__tokens_store__ = None
+
     @classmethod
     def short_name(cls) -> str:
         return "conversation-bow"
-    
-    def filter_records(self, df):
-        logger.info("applying record filtering by 'number_of_authors >= 2' & 'number_of_messages > 6'")
-        return df[((df["number_of_authors"] >= 2) & (df["number_of_messages"] > 6))]
+
+    def __str__(self):
+        return super().__str__() + ("-msg" if self.message_data_path is not None else "")
+
+    def artifact_inputs(self) -> list:
+        return [*super().artifact_inputs(), self.artifacts.file_hash(self.message_data_path)]
+
+    def read_columns(self):
+        columns = super().read_columns()
+        if self.message_data_path is not None and columns is not None and "conv_id" not in columns:
+            columns = (*columns, "conv_id")
+        return columns
+
+    def tokenize(self, input) -> list[list[str]]:
+        if self.message_data_path is None:
+            return super().tokenize(input)
+        self.__tokens_store__ = self.conversations_from_messages()
+        return self.__tokens_store__
+
+    def conversations_from_messages(self) -> TokenStore:
+        """
+        joins the tokens of the messages of each conversation of `df`, in the order of their lines and with the
+        separator token between them. It is close to tokenizing the conversation texts, but a message ending in
+        punctuation may be tokenized differently when the separator is attached to it. The count vector of a
+        conversation is the sum of the count vectors of its messages and of its separators, but it is counted in one
+        pass over the joined tokens: summing message vectors counts the same tokens and then merges them once more.
+        """
+        logger.info(f"building conversation tokens from the tokens of the messages of '{self.message_data_path}'")
+        messages = read_dataframe(self.message_data_path, columns=("conv_id", "msg_line", "text"), schema=DATASET_SCHEMA)
+        store = self.preprocessed_store(messages["text"])
+
+        conv_codes, conv_ids = pd.factorize(messages["conv_id"].astype(str))
+        order = np.lexsort((messages["msg_line"].to_numpy(), conv_codes))
+        conv_starts = np.concatenate(([0], np.cumsum(np.bincount(conv_codes, minlength=len(conv_ids)))))
+        positions = pd.Index(conv_ids).get_indexer(self.df["conv_id"].astype(str))
+        if (positions < 0).any():
+            raise ValueError(f"{(positions < 0).sum()} conversations have no messages in '{self.message_data_path}'")
+
+        sizes = conv_starts[positions + 1] - conv_starts[positions]
+        records = order[ragged_indices(conv_starts[positions], sizes)]
+        separator = next(FusedPreprocessing(self.preprocessings, cache_size=0).opt([[self.MESSAGE_SEPARATOR]]))
+        return store.join_records(records, np.concatenate(([0], np.cumsum(sizes))), separator[0] if separator else None)
+
+    def records_store(self, tokens_records) -> TokenStore:
+        if not isinstance(tokens_records, TokenStore) and self.__tokens_store__ is not None and len(self.__tokens_store__) == len(tokens_records):
+            return self.__tokens_store__
+        return super().records_store(tokens_records)
     
     def get_labels(self):
         labels = torch.zeros((self.df.shape[0]), dtype=torch.float)
         for i in range(len(self.df)):
-            labels[i] = self.df.iloc[i]["predatory_conv"]
+            labels[i] = float(self.df.iloc[i]["predatory_conv"])
         return labels
 
     def get_data_generator(self, data, pattern):
@@ -410,18 +802,26 @@ class ConversationBagOfWords(BagOfWordsDataset):
     def init_encoder(self, tokens_records):
         encoder = OneHotEncoder(vector_size=self.get_vector_size(), buffer_cap=64)
         logger.info("started generating bag of words vector encoder")
-        data = tokens_records
-        pattern = lambda x: x
         logger.debug("fitting conversation tokens into one hot encoder")
-        encoder.fit(self.get_data_generator(data=data, pattern=pattern))
+        encoder.fit_store(self.records_store(tokens_records))
         return encoder
 
+    def vectorize(self, tokens_records, encoder):
+        if type(encoder) is not OneHotEncoder or len(encoder.vectors_dimension) != 2:
+            return super().vectorize(tokens_records, encoder)
+        logger.debug("started transforming conversation records into sparse count vectors")
+        return encoder.transform_store(self.records_store(tokens_records))
+
     def normalize_vector(self, vectors):
         return [vector/torch.sparse.sum(vector) for vector in vectors]
 
 
 class NAuthorsConversationBagOfWords(ConversationBagOfWords):
     CONTEXT_LENGTH = 1
+    CONTEXT_FEATURES = (("number_of_authors", author_share),)
+    TOKENS_DEPTH = 2
+    TOKENS_WITH_CONTEXT = True
+    TEXT_TOKENS = False
 
     @classmethod
     def short_name(cls) -> str:
@@ -439,35 +839,42 @@ class NAuthorsConversationBagOfWords(ConversationBagOfWords):
     def init_encoder(self, tokens_records):
         encoder = OneHotEncoderWithContext(context_length=self.CONTEXT_LENGTH, vector_size=self.get_vector_size(), device=self.device)
         logger.info("started generating conversation bag of words vector encoder")
-        pattern = lambda x: x
         logger.debug("fitting data into one hot encoder")
+        if isinstance(tokens_records, TokenStore):
+            encoder.fit_store(tokens_records)
+            return encoder
+        pattern = lambda x: x
         encoder.fit(self.get_data_generator(data=tokens_records, pattern=pattern))
         return encoder
 
     def tokenize(self, df) -> list[list[str]]:
-        conversations = [None] * len(df)
-        for i, (_, row) in enumerate(df.iterrows()):
-            conversations[i] = ((row["number_of_authors"]/4.0,), nltk_tokenize((row["text"],)))
-        return conversations
+        contexts = [tuple(context) for context in self.get_context_matrix().tolist()]
+        return list(zip(contexts, self.tokenize_groups([(text,) for text in df["text"]], tokenize=self.preprocessed_texts)))
 
     def preprocess(self):
         try:
             if not self.load_from_pkl:
                 raise FileNotFoundError()
-            with open(self.get_session_path("tokens.pkl"), "rb") as f:
-                logger.info("trying to load tokens from file")
-                conversations = pickle.load(f)
+            conversations = self.load_tokens()
         except FileNotFoundError:
             logger.info("generating tokens from scratch")
             self.__new_tokens__ = True
             conversations = self.tokenize(self.df)
-            logger.info("applying preprocessing modules")
-            for preprocessor in self.preprocessings:
-                logger.info(f"applying {preprocessor.name()}")
-                conversations = [[context, tuple(preprocessor.opt(text))] for context, text in conversations]
 
         return conversations
 
+    def vectorize(self, tokens_records, encoder):
+        if not isinstance(encoder, OneHotEncoder) or len(encoder.vectors_dimension) != 2:
+            return super().vectorize(tokens_records, encoder)
+        logger.debug("started transforming conversation records and their contexts into sparse count vectors")
+        if isinstance(tokens_records, TokenStore):
+            store, contexts = tokens_records.flatten(), tokens_records.contexts
+        else:
+            store = TokenStore.from_records(tokens for _, (tokens,) in tokens_records)
+            contexts = [context for context, _ in tokens_records]
+        contexts = np.asarray(contexts, dtype=np.float64).reshape(len(tokens_records), -1)
+        return encoder.transform_store(store, contexts)
+
     def normalize_vector(self, vectors):
         logger.info("applying normalization, considering the context/metadata as well")
         if vectors[0].is_sparse:
@@ -477,7 +884,8 @@ class NAuthorsConversationBagOfWords(ConversationBagOfWords):
                 sum_all = torch.sum(vector)
                 if sum_all != 0:
                     vector = vector.coalesce()
-                    contexts = torch.stack([vector[idx] for idx in vector.indices()[0, :self.CONTEXT_LENGTH]])
+                    # the context features are the first columns of the vector
+                    contexts = vector.values()[:self.CONTEXT_LENGTH]
                     sum_all -= contexts.sum()
                     vectors[i] = torch.sparse_coo_tensor(vector.indices(), torch.cat((contexts, vector.values()[self.CONTEXT_LENGTH:]/sum_all)),
                                                         size, device=self.device)
@@ -497,10 +905,6 @@ class ConversationBagOfWordsWithTriple(ConversationBagOfWords):
 
 
 class ConversationBagOfWordsCleaned(ConversationBagOfWords):
-    
-    def filter_records(self, df):
-        logger.info("applying record filtering by 'number_of_authors >= 2' & 'number_of_messages > 6'")
-        return df[((df["number_of_authors"] >= 2) & (df["number_of_messages"] > 6))]
 
     @classmethod
     def short_name(cls) -> str:
@@ -516,10 +920,8 @@ class CNNConversationBagOfWords(ConversationBagOfWords):
     def init_encoder(self, tokens_records):
         logger.info("started generating bag of words vector encoder")
         encoder = OneHotEncoder(vector_size=self.get_vector_size(), buffer_cap=64, vectors_dimensions=3)
-        data = tokens_records
-        pattern = lambda x: x
         logger.debug("fitting conversation tokens into one hot encoder")
-        encoder.fit(self.get_data_generator(data=data, pattern=pattern))
+        encoder.fit_store(self.records_store(tokens_records))
         return encoder
 
     @property
@@ -528,6 +930,9 @@ class CNNConversationBagOfWords(ConversationBagOfWords):
 
 
 class TimeBasedBagOfWordsDataset(BagOfWordsDataset):
+    COLUMNS = ("text", "predatory_conv", "nauthor", "msg_line", "time")
+    # standardized with the mean and deviation of the parent dataset, if there is one
+    CONTEXT_COLUMNS = ("nauthor", "msg_line", "time")
     
     @classmethod
     def short_name(cls) -> str:
@@ -545,28 +950,21 @@ class TimeBasedBagOfWordsDataset(BagOfWordsDataset):
 
         return self.normalization_params
 
-    def vectorize(self, tokens_records, encoder):
-        logger.debug("started transforming message records into sparse vectors")
-        vectors = []
-        context_columns = ("nauthor", "msg_line", "time")
-        self.df[["nauthor", "msg_line", "time"]]
-        normalization_params = self.get_normalization_params(context_columns)
-        for c in context_columns:
-            self.df[f"normalized_{c}"] = (self.df[c] - normalization_params[c][0]) / normalization_params[c][1]
-        context_indices = [list(range(len(context_columns)))]
+    def get_context_features(self):
+        normalization_params = self.get_normalization_params(self.CONTEXT_COLUMNS)
+        return [(c, standardizer(*normalization_params[c])) for c in self.CONTEXT_COLUMNS]
 
-        for i, record in enumerate(tokens_records):
-            onehots = torch.sparse.sum(torch.cat(encoder.transform(record=record)), dim=0)
-            context = torch.sparse_coo_tensor(context_indices,
-                                              [self.df.iloc[i][f"normalized_{c}"] for c in context_columns],
-                                              (len(context_columns),), dtype=torch.float32)
+    def vectorize(self, tokens_records, encoder):
+        logger.debug("started transforming message records and their contexts into sparse vectors")
+        return encoder.transform_store(self.records_store(tokens_records), self.get_context_matrix())
 
-            vectors.append(torch.hstack((context, onehots)))
-        logger.debug("transforming of records into vectors is finished")
-        return vectors
+    def vectorize_records(self, tokens_records, encoder, ids):
+        store = self.records_store(__select_records__(tokens_records, ids))
+        return self.normalize_vector(encoder.transform_store(store, self.get_context_matrix()[ids]))
 
 
 class UncasedBaseBertTokenizedDataset(BaseDataset, RegisterableObject):
+    COLUMNS = ("text", "predatory_conv")
 
     @classmethod
     def short_name(cls) -> str:
@@ -578,7 +976,7 @@ class UncasedBaseBertTokenizedDataset(BaseDataset, RegisterableObject):
         return encoder
 
     def tokenize(self, input):
-        return nltk_tokenize(input)
+        return self.preprocessed_texts(input)
 
     def vectorize(self, tokens_records, encoder):
         vectors = [None] * len(tokens_records)
@@ -606,6 +1004,8 @@ class UncasedBaseBertTokenizedDataset(BaseDataset, RegisterableObject):
         return (self.data[index]["input_ids"], self.data[index]["attention_mask"], self.data[index]["token_type_ids"]), self.labels[index]
 
 class TransformersEmbeddingDataset(BaseDataset, RegisterableObject):
+    COLUMNS = ("text", "predatory_conv", "number_of_authors", "number_of_messages")
+    RECORD_FILTERS = (("number_of_authors", ">=", 2), ("number_of_messages", ">", 6))
 
     @classmethod
     def short_name(cls) -> str:
@@ -617,8 +1017,8 @@ class TransformersEmbeddingDataset(BaseDataset, RegisterableObject):
         return encoder
 
     def tokenize(self, input):
-        logger.debug("tokenizing using nltk")
-        return nltk_tokenize(input)
+        logger.debug("tokenizing using nltk" if self.tokenizer is None else f"tokenizing using {self.tokenizer.name()}")
+        return self.preprocessed_texts(input)
 
     def vectorize(self, tokens_records, encoder):
         vectors = [None] * len(tokens_records)
@@ -629,10 +1029,6 @@ class TransformersEmbeddingDataset(BaseDataset, RegisterableObject):
     def get_vector_size(self, vectors=None):
         return 768
 
-    def filter_records(self, df):
-        logger.info("applying record filtering by 'nauthor >= 2 & conv_size > 6'")
-        return df[(df["number_of_authors"] >= 2) & (df["number_of_messages"] > 6)]
-
 
 class TransformersDistilrobertaFinedtunedDataset(TransformersEmbeddingDataset):
 
@@ -703,12 +1099,6 @@ class NAuthorTransformersEmbeddingDataset(NAuthorsConversationBagOfWords):
     def get_vector_size(self, vectors=None):
         return 768 + self.CONTEXT_LENGTH
 
-    def tokenize(self, df) -> list[list[str]]:
-        conversations = [None] * len(df)
-        for i, (_, row) in enumerate(df.iterrows()):
-            conversations[i] = ((row["number_of_authors"]/4.0,), nltk_tokenize((row["text"],)))
-        return conversations
-
     def vectorize(self, tokens_records, encoder):
         vectors = [None] * len(tokens_records)
         for i, record in enumerate(tokens_records):
@@ -776,6 +1166,7 @@ class NAuthorTransformersBertDataset(NAuthorTransformersEmbeddingDataset):
 
 
 class CaseSensitiveBertEmbeddingDataset(TransformersEmbeddingDataset):
+    SESSION_DIRECTORY = "tranformer/bert-base-cased/"
     
     @classmethod
     def short_name(cls) -> str:
@@ -786,11 +1177,16 @@ class CaseSensitiveBertEmbeddingDataset(TransformersEmbeddingDataset):
 
         return encoder
 
+    def artifact_inputs(self) -> list:
+        # the artifacts in the store are told apart by the session directory as well, as the session files are
+        return [*super().artifact_inputs(), self.SESSION_DIRECTORY]
+
     def get_session_path(self, filename) -> str:
-        return self.output_path + "tranformer/bert-base-cased/" + filename
+        return self.output_path + self.SESSION_DIRECTORY + filename
 
 
 class GloveEmbeddingDataset(BaseDataset, RegisterableObject):
+    COLUMNS = ("text", "predatory_conv")
     
     @classmethod
     def short_name(cls) -> str:
@@ -803,8 +1199,8 @@ class GloveEmbeddingDataset(BaseDataset, RegisterableObject):
         return encoder
 
     def tokenize(self, input):
-        logger.debug("tokenizing using nltk")
-        return nltk_tokenize(input)
+        logger.debug("tokenizing using nltk" if self.tokenizer is None else f"tokenizing using {self.tokenizer.name()}")
+        return self.preprocessed_texts(input)
 
     def vectorize(self, tokens_records, encoder):
         vectors = [None] * len(tokens_records)
@@ -817,20 +1213,49 @@ class SequentialConversationDataset(BaseDataset):
     """
     a dataset where each record is a sorted sequence of any size and each record has one label
     """
+    COLUMNS = ("conv_id", "msg_line", "text", "predatory_conv", "nauthor", "conv_size")
+    RECORD_FILTERS = (("nauthor", ">=", 2), ("conv_size", ">", 6))
+    TOKENS_DEPTH = 2
+
     def __init__(self, data_path: str, output_path: str, load_from_pkl: bool, apply_record_filter: bool = True, preprocessings: list[BasePreprocessing] = [], persist_data=True, parent_dataset=None, device="cpu", *args, **kwargs):
         super().__init__(data_path, output_path, load_from_pkl, apply_record_filter, preprocessings, persist_data, parent_dataset, device, *args, **kwargs)
-        self.__sequence__ = None
-
-    def filter_records(self, df):
-        logger.info("applying record filtering by 'nauthor >= 2 & conv_size > 6'")
-        return df[(df["nauthor"] >= 2) & (df["conv_size"] > 6)]
+        self.__conversation_index__ = None
+        self.__conversation_index_key__ = None
 
     @property
-    def sequence(self):
-        if self.__sequence__ is None:
+    def conversation_index(self):
+        # built once per data file, filters and exclusion list, and shared by all sequential datasets on them
+        if self.__conversation_index__ is None:
             df = self.df
-            self.__sequence__ = df.sort_values("msg_line").groupby("conv_id")
-        return self.__sequence__
+            self.__conversation_index__ = ConversationIndex.cached(self.artifacts, self.conversation_index_key(), df, persist=self.persist_data)
+        return self.__conversation_index__
+
+    def conversation_index_key(self) -> str:
+        if self.__conversation_index_key__ is None:
+            self.__conversation_index_key__ = ConversationIndex.key(self.artifacts, self.df_path, self.RECORD_FILTERS if self.apply_filter else None,
+                                                                    self.exclusion_path if self.apply_filter else None)
+        return self.__conversation_index_key__
+
+    def artifact_ref_keys(self) -> dict:
+        # the conversation index is kept as long as a dataset on it is, even one that loaded its tokens and vectors
+        return {**super().artifact_ref_keys(), ConversationIndex.STAGE: self.conversation_index_key()}
+
+    def tokenize_conversations(self, tokenize=None):
+        # tokens of the messages of each conversation, with all texts tokenized in one call
+        tokenize = self.tokenize if tokenize is None else tokenize
+        index = self.conversation_index
+        return split_groups(tokenize(index.sorted(self.df["text"])), index.lengths())
+
+    def conversation_contexts(self):
+        # per conversation, the values of each context feature for its messages
+        return [tuple(matrix.T.tolist()) for matrix in self.conversation_index.split(self.get_context_matrix())]
+
+    def messages_store(self, tokens_records) -> TokenStore:
+        if isinstance(tokens_records, TokenStore):
+            return tokens_records.without_contexts()
+        if self.TOKENS_WITH_CONTEXT:
+            tokens_records = (tokens for _, tokens in tokens_records)
+        return TokenStore.from_records(tokens_records, depth=2)
 
     def get_data_generator(self, data, pattern):
         def func():
@@ -849,32 +1274,27 @@ class SequentialConversationDataset(BaseDataset):
         try:
             if not self.load_from_pkl:
                 raise FileNotFoundError()
-            with open(self.get_session_path("tokens.pkl"), "rb") as f:
-                logger.info("trying to load tokens from file")
-                messages = pickle.load(f)
+            messages = self.load_tokens()
         except FileNotFoundError:
             logger.info("generating tokens from scratch")
             self.__new_tokens__ = True
-            messages = [self.tokenize(g["text"]) for k, g in self.sequence]
-            logger.info("applying preprocessing modules")
-            for preprocessor in self.preprocessings:
-                logger.info(f"applying {preprocessor.name()}")
-                messages = [[*preprocessor.opt(sequence)] for sequence in messages]
+            messages = self.tokenize_conversations()
         return messages
     
     def tokenize(self, input) -> list[list[str]]:
-        return nltk_tokenize(input)
+        return self.preprocessed_texts(input)
 
     def init_encoder(self, tokens_records):
         encoder = SequentialOneHotEncoder(vector_size=self.get_vector_size())
         logger.info("started generating bag of words vector encoder")
-        pattern = lambda x: x
         logger.debug("fitting data into one hot encoder")
-        encoder.fit(self.get_data_generator(data=tokens_records, pattern=pattern))
+        encoder.fit_store(self.messages_store(tokens_records))
         return encoder
 
     def vectorize(self, tokens_records: list[list[str]], encoder):
         logger.info("vectorizing message records")
+        if isinstance(encoder, OneHotEncoder) and len(encoder.vectors_dimension) == 2:
+            return encoder.transform_store(self.messages_store(tokens_records))
         vectors = []
         for record in tokens_records:
             sequence = encoder.transform(record=record)
@@ -889,10 +1309,7 @@ class SequentialConversationDataset(BaseDataset):
             raise ValueError("the dataset is not prepared. Firt run `prepapre` method.")
         if self.__labels__ is not None:
             return self.__labels__
-        labels = torch.zeros((len(self.sequence), 1), dtype=torch.float)
-
-        for i, (_, group) in enumerate(self.sequence):
-            labels[i] = group.iloc[0]["predatory_conv"]
+        labels = torch.tensor(self.conversation_index.labels, dtype=torch.float).reshape(-1, 1)
         self.__labels__ = labels
         return labels
 
@@ -903,6 +1320,7 @@ class SequentialConversationDataset(BaseDataset):
 
 class BaseContextualSequentialConversationOneHotDataset(SequentialConversationDataset):
     CONTEXT_LENGTH = 0
+    TOKENS_WITH_CONTEXT = True
     @classmethod
     def short_name(cls) -> str:
         return "contextual-onehot-sequential"
@@ -919,33 +1337,29 @@ class BaseContextualSequentialConversationOneHotDataset(SequentialConversationDa
     def init_encoder(self, tokens_records):
         encoder = SequentialOneHotEncoderWithContext(context_length=self.CONTEXT_LENGTH, vector_size=self.get_vector_size(), )
         logger.info("started generating sequential-conversation bag of words vector encoder")
-        pattern = lambda x: x
         logger.debug("fitting data into one hot encoder")
-        encoder.fit(self.get_data_generator(data=tokens_records, pattern=pattern))
+        encoder.fit_store(self.messages_store(tokens_records))
         return encoder
 
-    def tokenize(self, sequence):
-        raise NotImplementedError()
+    def tokenize(self, index):
+        return list(zip(self.conversation_contexts(), self.tokenize_conversations(tokenize=self.preprocessed_texts)))
 
     def preprocess(self):
         try:
             if not self.load_from_pkl:
                 raise FileNotFoundError()
-            with open(self.get_session_path("tokens.pkl"), "rb") as f:
-                logger.info("trying to load tokens from file")
-                messages = pickle.load(f)
+            messages = self.load_tokens()
         except FileNotFoundError:
             logger.info("generating tokens from scratch")
             self.__new_tokens__ = True
-            messages = self.tokenize(self.sequence)
-            logger.info("applying preprocessing modules")
-            for preprocessor in self.preprocessings:
-                logger.info(f"applying {preprocessor.name()}")
-                messages = [(context, tuple(preprocessor.opt(sequence))) for context, sequence in messages]
+            messages = self.tokenize(self.conversation_index)
         return messages
     
     def vectorize(self, tokens_records, encoder):
         logger.debug("started transforming message records into sparse vectors")
+        if isinstance(encoder, OneHotEncoder) and len(encoder.vectors_dimension) == 2:
+            contexts = self.conversation_index.sorted(self.get_context_matrix())
+            return encoder.transform_store(self.messages_store(tokens_records), contexts)
         vectors = []
         
         for i, record in enumerate(tokens_records):
@@ -957,37 +1371,34 @@ class BaseContextualSequentialConversationOneHotDataset(SequentialConversationDa
         logger.debug("transforming of records into vectors is finished")
         return vectors
 
+    def vectorize_records(self, tokens_records, encoder, ids):
+        if not isinstance(encoder, OneHotEncoder) or len(encoder.vectors_dimension) != 2:
+            return super().vectorize_records(tokens_records, encoder, ids)
+        # the contexts are of the rows of the frame, so only the ones of the messages of `ids` are taken
+        contexts = self.get_context_matrix()[np.concatenate([self.conversation_index.rows(i) for i in ids])]
+        return self.normalize_vector(encoder.transform_store(self.messages_store(__select_records__(tokens_records, ids)), contexts))
+
 
 class TemporalSequentialConversationOneHotDataset(BaseContextualSequentialConversationOneHotDataset):
     
     CONTEXT_LENGTH = 1
+    CONTEXT_FEATURES = (("time", time_of_day),)
+    COLUMNS = (*SequentialConversationDataset.COLUMNS, "time")
     
     @classmethod
     def short_name(cls) -> str:
         return "temporal-sequential"
     
-    def tokenize(self, sequence):
-        messages = [None] * len(sequence)
-        for i, (k, g) in enumerate(sequence):
-            temp = np.floor(g["time"].tolist())
-            messages[i] = (((temp*60 + (g["time"].tolist()- temp)*100)/1440,), nltk_tokenize(g["text"]))
-        return messages
-
 class TemporalAuthorsSequentialConversationOneHotDataset(BaseContextualSequentialConversationOneHotDataset):
     
     CONTEXT_LENGTH = 2
+    CONTEXT_FEATURES = (("time", time_of_day), ("nauthor", author_share))
+    COLUMNS = (*SequentialConversationDataset.COLUMNS, "time")
     
     @classmethod
     def short_name(cls) -> str:
         return "time-nauthor-sequential"
 
-    def tokenize(self, sequence):
-        messages = [None] * len(sequence)
-        for i, (k, g) in enumerate(sequence):
-            temp = np.floor(g["time"])
-            messages[i] = ((((temp*60 + (g["time"]- temp)*100)/1440).tolist(), (g["nauthor"]/4.0).tolist(),), nltk_tokenize(g["text"]))
-        return messages
-
 
 class TemporalSequentialConversationOneHotDatasetFiltered(TemporalSequentialConversationOneHotDataset):
     
@@ -995,10 +1406,6 @@ class TemporalSequentialConversationOneHotDatasetFiltered(TemporalSequentialConv
     def short_name(cls) -> str:
         return "time-sequential-bow-convsize"
 
-    def filter_records(self, df):
-        logger.info("applying record filtering by 'nauthor >= 2 & conv_size > 6'")
-        return df[(df["nauthor"] >= 2) & (df["conv_size"] > 6)]
-
 
 class TemporalAuthorsSequentialConversationOneHotDatasetFiltered(TemporalAuthorsSequentialConversationOneHotDataset):
 
@@ -1006,10 +1413,6 @@ class TemporalAuthorsSequentialConversationOneHotDatasetFiltered(TemporalAuthors
     def short_name(cls) -> str:
         return "time-nauthor-sequential-bow-convsize"
 
-    def filter_records(self, df):
-        logger.info("applying record filtering by 'nauthor >= 2 & conv_size > 6'")
-        return df[(df["nauthor"] >= 2) & (df["conv_size"] > 6)]
-
 
 class SequentialConversationDatasetFiltered(SequentialConversationDataset):
 
@@ -1017,16 +1420,8 @@ class SequentialConversationDatasetFiltered(SequentialConversationDataset):
     def short_name(cls) -> str:
         return "sequential-bow-convsize"
 
-    def filter_records(self, df):
-        logger.info("applying record filtering by 'nauthor >= 2 & conv_size > 6'")
-        return df[(df["nauthor"] >= 2) & (df["conv_size"] > 6)]
-
 
 class SequentialConversationEmbeddingDataset(SequentialConversationDataset):
-    
-    def filter_records(self, df):
-        logger.info("applying record filtering by 'nauthor >= 2 & conv_size > 6'")
-        return df[(df["nauthor"] >= 2) & (df["conv_size"] > 6)]
 
     @classmethod
     def short_name(cls) -> str:
@@ -1120,6 +1515,7 @@ class SequentialConversationUniversalSentenceEncoderDataset(SequentialConversati
 
 class BaseContextualSequentialConversationEmbeddingDataset(SequentialConversationEmbeddingDataset):
     CONTEXT_LENGTH = 0
+    TOKENS_WITH_CONTEXT = True
 
     @classmethod
     def short_name(cls) -> str:
@@ -1129,22 +1525,19 @@ class BaseContextualSequentialConversationEmbeddingDataset(SequentialConversatio
         logger.debug("initializing sequential transformer embedding encoder with context: all-distilroberta-v1")
         encoder = SequentialTransformersEmbeddingEncoderWithContext(context_length=self.CONTEXT_LENGTH, transformer_identifier="all-distilroberta-v1", device=self.device)
         return encoder
+
+    def tokenize(self, index):
+        return list(zip(self.conversation_contexts(), self.tokenize_conversations(tokenize=self.preprocessed_texts)))
     
     def preprocess(self):
         try:
             if not self.load_from_pkl:
                 raise FileNotFoundError()
-            with open(self.get_session_path("tokens.pkl"), "rb") as f:
-                logger.info("trying to load tokens from file")
-                messages = pickle.load(f)
+            messages = self.load_tokens()
         except FileNotFoundError:
             logger.info("generating tokens from scratch")
             self.__new_tokens__ = True
-            messages = self.tokenize(self.sequence)
-            logger.info("applying preprocessing modules")
-            for preprocessor in self.preprocessings:
-                logger.info(f"applying {preprocessor.name()}")
-                messages = [[context, tuple(preprocessor.opt(sequence))] for context, sequence in messages]
+            messages = self.tokenize(self.conversation_index)
         return messages
 
     def vectorize(self, tokens_records, encoder):
@@ -1163,34 +1556,24 @@ class BaseContextualSequentialConversationEmbeddingDataset(SequentialConversatio
 class TemporalSequentialConversationEmbeddingDataset(BaseContextualSequentialConversationEmbeddingDataset):
 
     CONTEXT_LENGTH = 1
+    CONTEXT_FEATURES = (("time", time_of_day),)
+    COLUMNS = (*SequentialConversationDataset.COLUMNS, "time")
 
     @classmethod
     def short_name(cls) -> str:
         return "temporal-sequential-embedding"
     
-    def tokenize(self, sequence):
-        messages = [None] * len(sequence)
-        for i, (k, g) in enumerate(sequence):
-            temp = np.floor(g["time"].tolist())
-            messages[i] = (((temp*60 + (g["time"].tolist()- temp)*100)/1440,), nltk_tokenize(g["text"]))
-        return messages
-
 
 class TemporalAuthorsSequentialConversationEmbeddingDataset(BaseContextualSequentialConversationEmbeddingDataset):
     
     CONTEXT_LENGTH = 2
+    CONTEXT_FEATURES = (("time", time_of_day), ("nauthor", author_share))
+    COLUMNS = (*SequentialConversationDataset.COLUMNS, "time")
     
     @classmethod
     def short_name(cls) -> str:
         return "temporal-nauthor-sequential-embedding"
 
-    def tokenize(self, sequence):
-        messages = [None] * len(sequence)
-        for i, (k, g) in enumerate(sequence):
-            temp = np.floor(g["time"])
-            messages[i] = ((((temp*60 + (g["time"] - temp)*100)/1440).tolist(), (g["nauthor"]/4.0).tolist(),), nltk_tokenize(g["text"]))
-        return messages
-
 
 class TemporalAuthorsSequentialConversationDistilrobertaPretainedDataset(TemporalAuthorsSequentialConversationEmbeddingDataset):
 
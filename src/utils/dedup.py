@@ -0,0 +1,126 @@
+import logging
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from src.utils.commons import message_csv2conversation_csv, read_dataframe
+
+logger = logging.getLogger()
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+DEDUP_REPORT_COLUMNS = ["conv_id", "split", "cluster", "duplicate", "cross_split", "exclude"]
+
+
+def shingles(text, size=3):
+    # hashes of the word n-grams of a text; crc32 keeps them the same across processes
+    words = text.lower().split() if isinstance(text, str) else []
+    # texts shorter than `size` words are a single shingle, texts without words have none
+    return np.array([zlib.crc32(" ".join(words[i:i+size]).encode("utf-8")) for i in range(max(len(words) - size + 1, 1) if words else 0)],
+                    dtype=np.uint64)
+
+
+class MinHashLSH:
+    """
+    MinHash signatures of the shingle sets of texts, and LSH banding of the signatures to find pairs of texts whose
+    estimated jaccard similarity is at least `threshold` without comparing all pairs.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, shingle_size=3, seed=0):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, size=(num_perm, 1), dtype=np.uint64)
+        self.bands, self.rows = self.__bands__(num_perm, threshold)
+
+    @staticmethod
+    def __bands__(num_perm, threshold):
+        # the similarity where the probability of becoming a candidate pair is 0.5 is about (1/bands)^(1/rows). It is
+        # kept below the threshold since candidate pairs are verified by their signatures anyway
+        options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+        midpoint = lambda option: (1 / option[0]) ** (1 / option[1])
+        below = [option for option in options if midpoint(option) <= threshold]
+        return max(below, key=midpoint) if below else min(options, key=midpoint)
+
+    def signature(self, text):
+        # the shingle set must not be empty, see `find_duplicates`
+        hashes = shingles(text, self.shingle_size)
+        with np.errstate(over="ignore"):
+            permuted = ((self.a * hashes + self.b) % MERSENNE_PRIME) & MAX_HASH
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def signatures(self, texts):
+        return np.stack([self.signature(text) for text in texts]) if len(texts) else np.zeros((0, self.num_perm), dtype=np.uint32)
+
+    def candidate_pairs(self, signatures):
+        # every record of a bucket is paired with the first record of that bucket, so the number of pairs stays linear
+        pairs = []
+        for band in range(self.bands):
+            keys = np.ascontiguousarray(signatures[:, band*self.rows:(band+1)*self.rows])
+            keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * self.rows))).ravel()
+            _, first, buckets = np.unique(keys, return_index=True, return_inverse=True)
+            representatives = first[buckets.ravel()]
+            members = np.flatnonzero(representatives != np.arange(len(signatures)))
+            pairs.append(np.stack([representatives[members], members], axis=1))
+        pairs = np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=np.int64)
+        return np.unique(pairs, axis=0)
+
+    def clusters(self, signatures):
+        pairs = self.candidate_pairs(signatures)
+        similarities = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1) if len(pairs) else np.zeros(0)
+        pairs = pairs[similarities >= self.threshold]
+
+        parents = np.arange(len(signatures))
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+        for i, j in pairs:
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parents[max(root_i, root_j)] = min(root_i, root_j)
+        # each record is labeled with the first record of its cluster
+        return np.array([find(i) for i in range(len(signatures))], dtype=np.int64)
+
+
+def find_duplicates(splits, threshold=0.8, num_perm=128, shingle_size=3, seed=0):
+    """
+    `splits` maps a split name, e.g. train or test, to a dataframe of conversations with `conv_id` and `text` columns.
+    The returned report has a row per conversation: its near-duplicate `cluster` (the conv_id of the first conversation
+    of the cluster), whether it is a `duplicate` of an earlier conversation of the same split, and whether its cluster
+    has conversations in other splits (`cross_split`). `exclude` marks the records to drop: duplicates within a split,
+    and the conversations of the first split whose cluster crosses to another one so that the other splits stay intact.
+    """
+    frames = [pd.DataFrame({"conv_id": df["conv_id"].astype(str).to_numpy(), "text": df["text"].to_numpy(), "split": name})
+              for name, df in splits.items()]
+    records = pd.concat(frames, ignore_index=True)
+    lsh = MinHashLSH(threshold=threshold, num_perm=num_perm, shingle_size=shingle_size, seed=seed)
+    # conversations without words have no shingles, so nothing to compare: each one is a cluster of its own instead
+    # of all of them being duplicates of each other
+    texts = records["text"].to_numpy()
+    with_words = np.flatnonzero([isinstance(text, str) and len(text.split()) > 0 for text in texts])
+    logger.info(f"computing minhash signatures of {len(with_words)} conversations with {lsh.bands} bands of {lsh.rows} rows, "
+                f"{len(records) - len(with_words)} have no words")
+    clusters = np.arange(len(records))
+    clusters[with_words] = with_words[lsh.clusters(lsh.signatures(texts[with_words]))]
+
+    report = records[["conv_id", "split"]].assign(cluster=records["conv_id"].to_numpy()[clusters])
+    report["duplicate"] = report.duplicated(["split", "cluster"], keep="first")
+    report["cross_split"] = report.groupby("cluster")["split"].transform("nunique") > 1
+    report["exclude"] = report["duplicate"] | (report["cross_split"] & (report["split"] == next(iter(splits))))
+    logger.info(f"{report['duplicate'].sum()} duplicates within splits, {report['cross_split'].sum()} conversations in clusters crossing splits")
+    return report[DEDUP_REPORT_COLUMNS]
+
+def conversations_of(df):
+    # message files are turned into one text per conversation, the way `create-conversations` does
+    if "msg_line" in df.columns:
+        return message_csv2conversation_csv(df)
+    return df
+
+def excluded_conversations(report_path):
+    report = read_dataframe(report_path, columns=["conv_id", "exclude"], dtype={"conv_id": str})
+    return set(report.loc[report["exclude"].astype(bool), "conv_id"])
@@ -1,3 +1,5 @@
+import numpy as np
+import torch
 from torch import sparse_coo_tensor, float32
 
 from heapq import nlargest
@@ -57,6 +59,68 @@ class OneHotEncoder:
             return (self.get_zero_vector(),)
         return result
 
+    def get_number_of_context_columns(self):
+        # columns kept for context features before the columns of the tokens
+        return 0
+
+    def transform_store(self, store, contexts=None):
+        """
+        count vectors of the records of a `TokenStore`, the same as summing the vectors `transform` gives for each
+        record, computed in one pass over the token ids instead of one sparse vector per token. Records of a store of
+        two levels, e.g. conversations of messages, are matrices with one row of counts per message. `contexts` has
+        one row of features per vector, which fill the first columns: the ones the encoder keeps for them, or new
+        columns before the token columns if it keeps none.
+        """
+        if not self.transform_started:
+            self.generate_sparse_vectors()
+        self.transform_started = True
+        default_index = self.vectors_dimension[1] - 1
+        columns = np.array([self.vectors[token]._indices()[1, 0].item() if token in self.vectors else default_index
+                            for token in store.vocabulary], dtype=np.int64)
+        leaf_offsets = np.asarray(store.offsets[-1])
+        leaves = len(leaf_offsets) - 1
+        rows = np.repeat(np.arange(leaves), np.diff(leaf_offsets))
+        columns = columns[np.asarray(store.ids)]
+        values = np.ones(len(rows), dtype=np.float32)
+        width = self.vectors_dimension[1]
+
+        if contexts is not None and contexts.shape[1] > 0:
+            context_length = contexts.shape[1]
+            reserved = self.get_number_of_context_columns()
+            if reserved not in (0, context_length):
+                raise ValueError(f"the encoder keeps {reserved} context columns but {context_length} context features are given")
+            if reserved == 0:
+                columns = columns + context_length
+                width += context_length
+            # encoders with context columns give records without tokens the zero vector, without their context
+            with_context = np.arange(leaves) if reserved == 0 else np.flatnonzero(np.diff(leaf_offsets) > 0)
+            rows = np.concatenate((np.repeat(with_context, context_length), rows))
+            columns = np.concatenate((np.tile(np.arange(context_length), len(with_context)), columns))
+            values = np.concatenate((np.asarray(contexts, dtype=np.float32)[with_context].ravel(), values))
+
+        counts = sparse_coo_tensor(torch.from_numpy(np.stack([rows, columns])), torch.from_numpy(values),
+                                   size=(leaves, width), device=self.device).coalesce()
+        indices, values = counts.indices(), counts.values()
+        bounds = np.searchsorted(indices[0].cpu().numpy(), np.arange(leaves + 1))
+        if store.depth == 1:
+            return [sparse_coo_tensor(indices[1:, bounds[i]:bounds[i+1]], values[bounds[i]:bounds[i+1]], size=(width,),
+                                      dtype=float32, device=self.device, is_coalesced=True) for i in range(leaves)]
+
+        record_offsets = np.asarray(store.offsets[-2])
+        vectors = [None] * (len(record_offsets) - 1)
+        for i in range(len(vectors)):
+            first, last = record_offsets[i], record_offsets[i+1]
+            # a record without messages is a single zero row, as the sequential encoders give
+            if first == last:
+                vectors[i] = sparse_coo_tensor(torch.zeros((2, 0), dtype=torch.int64), [], size=(1, width), dtype=float32, device=self.device)
+                continue
+            start, end = bounds[first], bounds[last]
+            message_indices = indices[:, start:end].clone()
+            message_indices[0] -= first
+            vectors[i] = sparse_coo_tensor(message_indices, values[start:end], size=(last - first, width), dtype=float32,
+                                           device=self.device, is_coalesced=True)
+        return vectors
+
     def flush_buffer(self, buffer):
         for record in buffer:
             count = self.records.get(record, 0)
@@ -73,7 +137,18 @@ class OneHotEncoder:
                 buffer = []
         
         self.flush_buffer(buffer)
-        
+        self.__select_records()
+
+    def fit_store(self, store):
+        # same as `fit` on the tokens of a `TokenStore`, counting token ids instead of strings
+        if self.transform_started:
+            raise Exception("cannot fit the encoder as this encoder has already transformed some records.")
+        for token, count in zip(store.vocabulary, store.token_counts().tolist()):
+            if count > 0:
+                self.records[token] = self.records.get(token, 0) + count
+        self.__select_records()
+
+    def __select_records(self):
         if self.vector_size > 0:
             all_tokens_count = [(k, v) for k,v in self.records.items()]
             mostfrequent = nlargest(self.vector_size - self.get_number_of_predefined_vectors(), all_tokens_count, key=lambda x:x[1])
@@ -92,6 +167,9 @@ class OneHotEncoderWithContext(OneHotEncoder):
     
     def get_number_of_predefined_vectors(self):
         return super().get_number_of_predefined_vectors() + self.context_length
+
+    def get_number_of_context_columns(self):
+        return self.context_length
     
     def generate_sparse_vectors(self):
         for i, (k, _) in enumerate(self.records.items(), start=self.context_length): # we force the context features to be at the first of the feature vector
@@ -128,6 +206,9 @@ class SequentialOneHotEncoderWithContext(OneHotEncoder):
         
     def get_number_of_predefined_vectors(self):
         return super().get_number_of_predefined_vectors() + self.context_length
+
+    def get_number_of_context_columns(self):
+        return self.context_length
     
     def generate_sparse_vectors(self):
         for i, (k, _) in enumerate(self.records.items(), start=self.context_length): # we force the context features to be at the first of the feature vector
@@ -0,0 +1,100 @@
+import logging
+import queue
+import threading
+from collections import deque
+from multiprocessing import Pool
+
+logger = logging.getLogger()
+
+__END__ = object()
+# the function of the stage a worker process belongs to; set once per process by `__init_worker__`
+__stage_function__ = None
+
+
+def __init_worker__(function):
+    global __stage_function__
+    __stage_function__ = function
+
+def __run_worker__(chunk):
+    return __stage_function__(chunk)
+
+
+class ChunkPipeline:
+    """
+    runs chunks through `stages` concurrently and yields the results in the input order. A stage is a `(function,
+    workers)` pair: with more than one worker, chunks are mapped by a pool of processes which get `function` once,
+    so it keeps its state, e.g. caches, between chunks; otherwise the function runs in the thread of the stage.
+    Stages are connected by queues of `queue_size` chunks and a pool stage has at most `queue_size` chunks in flight,
+    so a slow stage blocks the ones before it and the number of chunks in memory stays bounded.
+    """
+
+    def __init__(self, stages, queue_size=4):
+        self.stages = list(stages)
+        self.queue_size = max(queue_size, 1)
+        self.__stop__ = threading.Event()
+        self.__error__ = None
+
+    def __put_chunk__(self, q, item):
+        # gives up if another stage failed, so the threads of the stages before it do not block forever
+        while not self.__stop__.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __get_chunk__(self, q):
+        while not self.__stop__.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return __END__
+
+    def __iter_queue__(self, q):
+        while (item := self.__get_chunk__(q)) is not __END__:
+            yield item
+
+    def __run_stage__(self, function, pool, inputs, output):
+        try:
+            if pool is None:
+                for chunk in inputs:
+                    if not self.__put_chunk__(output, function(chunk)):
+                        return
+            else:
+                pending = deque()
+                for chunk in inputs:
+                    pending.append(pool.apply_async(__run_worker__, (chunk,)))
+                    if len(pending) >= self.queue_size and not self.__put_chunk__(output, pending.popleft().get()):
+                        return
+                while pending:
+                    if not self.__put_chunk__(output, pending.popleft().get()):
+                        return
+            self.__put_chunk__(output, __END__)
+        except BaseException as e:
+            self.__error__ = e
+            self.__stop__.set()
+
+    def run(self, source):
+        # the pools are created before any thread is started, as forking a process with running threads is unsafe
+        pools = [Pool(workers, initializer=__init_worker__, initargs=(function,)) if workers > 1 else None
+                 for function, workers in self.stages]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self.__run_stage__, args=(lambda chunk: chunk, None, source, queues[0]), daemon=True)]
+        for i, ((function, _), pool) in enumerate(zip(self.stages, pools)):
+            threads.append(threading.Thread(target=self.__run_stage__, args=(function, pool, self.__iter_queue__(queues[i]), queues[i+1]),
+                                            daemon=True))
+        try:
+            for thread in threads:
+                thread.start()
+            yield from self.__iter_queue__(queues[-1])
+        finally:
+            self.__stop__.set()
+            for thread in threads:
+                thread.join()
+            for pool in pools:
+                if pool is not None:
+                    pool.terminate()
+        if self.__error__ is not None:
+            raise self.__error__
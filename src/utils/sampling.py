@@ -0,0 +1,127 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from src.utils.commons import iter_dataframe_chunks, iter_conversation_chunks
+
+logger = logging.getLogger()
+
+# ids and texts are read as strings so every chunk gets the same dtypes
+STREAMING_DTYPES = {"conv_id": str, "author_id": str, "text": str}
+
+
+class StratifiedReservoir:
+    """
+    keeps a uniform random sample of at most `sizes[label]` items of every label while chunks of records are streamed
+    through `add` (algorithm R, vectorized over each chunk). An item is either a record or, if `items` are given, all
+    the records of a chunk that share an item key, e.g. the messages of a conversation.
+    """
+
+    def __init__(self, sizes, seed=0):
+        self.sizes = dict(sizes)
+        self.rng = np.random.default_rng(seed)
+        self.seen = {label: 0 for label in self.sizes}
+        self.parts = {label: [] for label in self.sizes}
+        self.kept = {label: 0 for label in self.sizes}
+
+    def add(self, chunk, labels, items=None):
+        item_codes = np.arange(len(chunk)) if items is None else pd.factorize(items)[0]
+        # the label of an item is the label of its first record
+        _, first_records = np.unique(item_codes, return_index=True)
+        item_labels = np.asarray(labels)[first_records]
+
+        for label, size in self.sizes.items():
+            label_items = np.flatnonzero(item_labels == label)
+            if len(label_items) == 0:
+                continue
+            ordinals = self.seen[label] + np.arange(len(label_items))
+            self.seen[label] += len(label_items)
+            if size <= 0:
+                continue
+            slots = np.where(ordinals < size, ordinals, self.rng.integers(0, ordinals + 1))
+            selected = slots < size
+            if not selected.any():
+                continue
+
+            item_slot = np.full(len(first_records), -1)
+            item_slot[label_items[selected]] = slots[selected]
+            item_ordinal = np.full(len(first_records), -1)
+            item_ordinal[label_items[selected]] = ordinals[selected]
+            records = item_slot[item_codes] >= 0
+            part = chunk[records].assign(__slot__=item_slot[item_codes][records], __ordinal__=item_ordinal[item_codes][records])
+            self.parts[label].append(part)
+            self.kept[label] += int(selected.sum())
+            if self.kept[label] > 2 * size + len(chunk):
+                self.__compact__(label)
+
+    def __compact__(self, label):
+        if len(self.parts[label]) == 0:
+            return
+        reservoir = pd.concat(self.parts[label], axis=0)
+        # a slot belongs to the last item that was put in it
+        latest = reservoir.groupby("__slot__")["__ordinal__"].transform("max")
+        reservoir = reservoir[reservoir["__ordinal__"] == latest]
+        self.parts[label] = [reservoir]
+        self.kept[label] = reservoir["__slot__"].nunique()
+
+    def sample(self):
+        for label in self.sizes:
+            self.__compact__(label)
+        parts = [part for label in self.sizes for part in self.parts[label]]
+        if len(parts) == 0:
+            return pd.DataFrame()
+        return pd.concat(parts, axis=0).drop(columns=["__slot__", "__ordinal__"]).sort_index()
+
+
+def __iter_chunks__(path, chunk_size, by_conversation, columns=None):
+    if by_conversation:
+        return iter_conversation_chunks(path, chunk_size, columns=columns, dtype=STREAMING_DTYPES)
+    return iter_dataframe_chunks(path, chunk_size, columns=columns, dtype=STREAMING_DTYPES)
+
+def count_labels(path, stratify, chunk_size=100000, by_conversation=False):
+    # cheap first pass which only reads the label column (and conversation ids when sampling conversations)
+    counts = dict()
+    columns = ["predatory_conv", "conv_id"] if by_conversation else ["predatory_conv"]
+    for chunk in __iter_chunks__(path, chunk_size, by_conversation, columns=columns):
+        if by_conversation:
+            chunk = chunk.drop_duplicates("conv_id")
+        for label, count in pd.Series(np.asarray(stratify(chunk))).value_counts().items():
+            counts[label] = counts.get(label, 0) + int(count)
+    return counts
+
+def reservoir_sample(path, sizes, stratify, chunk_size=100000, seed=0, by_conversation=False):
+    reservoir = StratifiedReservoir(sizes, seed=seed)
+    for chunk in __iter_chunks__(path, chunk_size, by_conversation):
+        reservoir.add(chunk, stratify(chunk), chunk["conv_id"] if by_conversation else None)
+    return reservoir.sample()
+
+def create_toy_dataset_streaming(path, fraction=0.1, keep_distribution=True, seed=0, chunk_size=100000, by_conversation=False):
+    """
+    streaming version of `create_toy_dataset`. Records, or whole conversations if `by_conversation`, are sampled in
+    one pass with a reservoir per label, after a pass that counts the labels. The result keeps the file order.
+    """
+    if keep_distribution:
+        stratify = lambda df: (df["predatory_conv"] > 0.5).to_numpy()
+    else:
+        stratify = lambda df: np.ones(len(df), dtype=bool)
+    counts = count_labels(path, stratify, chunk_size, by_conversation)
+    sizes = {label: int(round(count * fraction)) for label, count in counts.items()}
+    logger.info(f"sampling {sizes} of {counts} {'conversations' if by_conversation else 'records'} from {path}")
+    return reservoir_sample(path, sizes, stratify, chunk_size, seed, by_conversation)
+
+def balance_dataset_streaming(path, ratio=0.5, seed=0, chunk_size=100000, by_conversation=False):
+    """
+    streaming version of `balance_dataset`. All predatory records (or conversations) are kept and the non-predatory
+    ones are sampled in one pass so that the ratio of predatory ones is `ratio`. Records are shuffled as in
+    `balance_dataset`, conversations keep the file order so their messages stay contiguous.
+    """
+    stratify = lambda df: (df["predatory_conv"] == 1).to_numpy()
+    counts = count_labels(path, stratify, chunk_size, by_conversation)
+    predators = counts.get(True, 0)
+    sizes = {True: predators, False: int(predators * (1-ratio)/ratio)}
+    logger.info(f"sampling {sizes} of {counts} {'conversations' if by_conversation else 'records'} from {path}")
+    df = reservoir_sample(path, sizes, stratify, chunk_size, seed, by_conversation)
+    if by_conversation:
+        return df
+    return df.sample(frac=1.0, random_state=np.random.default_rng(seed))
@@ -0,0 +1,83 @@
+import hashlib
+import logging
+import os
+
+import pandas as pd
+
+from src.preprocessing.fused import FusedPreprocessing
+from src.utils.artifact_store import class_hash
+from src.utils.token_store import TokenStore
+
+logger = logging.getLogger()
+
+
+def content_hash(texts):
+    # missing texts hash differently from empty ones
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(b"\x01" if pd.isna(text) else text.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SharedTokenCache:
+    """
+    token stores of lists of texts shared by all datasets of an `ArtifactStore`, as artifacts of its `token-cache`
+    stage. A store is keyed by the content hash of the texts, the tokenizer and a prefix of the preprocessing chain,
+    each with the hash of its code, so datasets that tokenize the same column reuse each other's tokens, and a chain
+    reuses the longest prefix of it that is cached: `pr.sw.rr` starts from the tokens of `pr.sw` and only applies `rr`.
+    The keys a cache used are in `used_keys`, for the refs of the datasets that keep them from `collect_garbage`.
+    """
+    STAGE = "token-cache"
+
+    def __init__(self, artifacts):
+        self.artifacts = artifacts
+        self.used_keys = set()
+
+    @staticmethod
+    def key(texts_hash, tokenizer_identity, preprocessing_identities):
+        return hashlib.sha1("|".join([texts_hash, tokenizer_identity, *preprocessing_identities]).encode("utf-8")).hexdigest()
+
+    def store_path(self, key):
+        return os.path.join(self.artifacts.artifact_path(self.STAGE, key), "tokens")
+
+    def get(self, key):
+        if not self.artifacts.is_complete(self.STAGE, key):
+            return None
+        return TokenStore.load(self.store_path(key), mmap=False)
+
+    def put(self, key, store):
+        # another session may have stored the same tokens first, which are kept
+        self.artifacts.put(self.STAGE, key, lambda path: store.save(os.path.join(path, "tokens")))
+
+    def preprocessed(self, texts, tokenizer_identity, preprocessings, tokenize, persist=True):
+        """
+        token store of `texts` after `preprocessings`. `tokenize` maps the list of texts to lists of tokens and is only
+        called if no prefix of the chain is cached. The stores of the prefixes computed here are cached if `persist`.
+        """
+        texts_hash = content_hash(texts)
+        names = [preprocessing.short_name() for preprocessing in preprocessings]
+        identities = [f"{preprocessing.short_name()}:{class_hash(type(preprocessing))}" for preprocessing in preprocessings]
+        keys = [self.key(texts_hash, tokenizer_identity, identities[:i]) for i in range(len(names) + 1)]
+
+        store, cached = None, len(names)
+        while cached >= 0 and (store := self.get(keys[cached])) is None:
+            cached -= 1
+        if store is None:
+            logger.info(f"no cached tokens for {len(texts)} texts, tokenizing with {tokenizer_identity.split(':')[0]}")
+            cached = 0
+            store = TokenStore.from_records(tokenize(texts))
+            if persist:
+                self.put(keys[0], store)
+                self.used_keys.add(keys[0])
+        else:
+            self.used_keys.add(keys[cached])
+            logger.info(f"reusing cached tokens of preprocessings `{'.'.join(names[:cached])}` from {self.store_path(keys[cached])}")
+
+        for i in range(cached, len(names)):
+            logger.info(f"applying {preprocessings[i].name()} to the cached tokens")
+            store = FusedPreprocessing([preprocessings[i]], cache_size=0).opt_store(store)
+            if persist:
+                self.put(keys[i+1], store)
+                self.used_keys.add(keys[i+1])
+        return store
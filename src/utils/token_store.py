@@ -0,0 +1,199 @@
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+
+def ragged_indices(starts, lengths):
+    # concatenation of the ranges `starts[i]:starts[i]+lengths[i]` without a loop over them
+    lengths = np.asarray(lengths, dtype=np.int64)
+    ends = np.cumsum(lengths)
+    return np.repeat(np.asarray(starts, dtype=np.int64) - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+
+
+class TokenStore:
+    """
+    integer storage of tokenized records. Tokens are replaced by their index in `vocabulary` (in order of first
+    occurrence) and concatenated in one int32 array. `offsets[level]` holds the boundaries of the nodes of each nesting
+    level: for records of messages `offsets[0]` splits records into messages and `offsets[1]` splits messages into
+    tokens. If records come with a context, e.g. `(context, tokens)` pairs, contexts are kept aside as they are.
+    """
+
+    def __init__(self, vocabulary, ids, offsets, contexts=None):
+        self.vocabulary = vocabulary
+        self.ids = ids
+        self.offsets = offsets
+        self.contexts = contexts
+        self.__strings__ = None
+
+    @property
+    def depth(self):
+        return len(self.offsets)
+
+    @classmethod
+    def from_records(cls, records, depth=1, with_context=False):
+        vocabulary = dict()
+        ids = []
+        lengths = [[] for _ in range(depth)]
+        contexts = [] if with_context else None
+
+        def add(node, level):
+            lengths[level].append(len(node))
+            if level == depth - 1:
+                ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in node)
+            else:
+                for child in node:
+                    add(child, level + 1)
+
+        for record in records:
+            if with_context:
+                context, record = record
+                contexts.append(context)
+            add(record, 0)
+
+        offsets = [np.concatenate(([0], np.cumsum(level_lengths, dtype=np.int64))) for level_lengths in lengths]
+        return cls(list(vocabulary), np.asarray(ids, dtype=np.int32), offsets, contexts)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        encoded = [token.encode("utf-8") for token in self.vocabulary]
+        np.save(os.path.join(path, "vocabulary.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        np.save(os.path.join(path, "vocabulary_offsets.npy"), np.concatenate(([0], np.cumsum([len(t) for t in encoded], dtype=np.int64))))
+        np.save(os.path.join(path, "ids.npy"), self.ids)
+        for level, offsets in enumerate(self.offsets):
+            np.save(os.path.join(path, f"offsets_{level}.npy"), offsets)
+        if self.contexts is not None:
+            with open(os.path.join(path, "contexts.pkl"), "wb") as f:
+                pickle.dump(self.contexts, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mmap_mode = "r" if mmap else None
+        buffer = np.load(os.path.join(path, "vocabulary.npy")).tobytes()
+        vocabulary_offsets = np.load(os.path.join(path, "vocabulary_offsets.npy"))
+        vocabulary = [buffer[vocabulary_offsets[i]:vocabulary_offsets[i+1]].decode("utf-8") for i in range(len(vocabulary_offsets) - 1)]
+        ids = np.load(os.path.join(path, "ids.npy"), mmap_mode=mmap_mode)
+        offsets = []
+        while os.path.exists(os.path.join(path, f"offsets_{len(offsets)}.npy")):
+            offsets.append(np.load(os.path.join(path, f"offsets_{len(offsets)}.npy"), mmap_mode=mmap_mode))
+        contexts = None
+        if os.path.exists(os.path.join(path, "contexts.pkl")):
+            with open(os.path.join(path, "contexts.pkl"), "rb") as f:
+                contexts = pickle.load(f)
+        return cls(vocabulary, ids, offsets, contexts)
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "ids.npy"))
+
+    def __len__(self):
+        return len(self.offsets[0]) - 1
+
+    def __getitem__(self, index):
+        # records are decoded one at a time, so string based encoders can iterate a store like a list of records
+        if isinstance(index, slice):
+            return [self.record(i) for i in range(*index.indices(len(self)))]
+        return self.record(index + len(self) if index < 0 else index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def record_ids(self, index):
+        # views on `ids` without copying; a nested list of views for records of more than one level
+        def node(level, i):
+            start, end = self.offsets[level][i], self.offsets[level][i+1]
+            if level == self.depth - 1:
+                return self.ids[start:end]
+            return [node(level + 1, j) for j in range(start, end)]
+        return node(0, index)
+
+    def record(self, index):
+        if self.__strings__ is None:
+            self.__strings__ = np.asarray(self.vocabulary, dtype=object)
+        def decode(node):
+            return self.__strings__[node].tolist() if isinstance(node, np.ndarray) else [decode(child) for child in node]
+        tokens = decode(self.record_ids(index))
+        if self.contexts is not None:
+            return (self.contexts[index], tuple(tokens))
+        return tokens
+
+    def to_records(self):
+        return [self.record(i) for i in range(len(self))]
+
+    def subset(self, records):
+        # store of the records `records` in their order, gathering ids and offsets level by level without decoding
+        nodes = np.asarray(records, dtype=np.int64)
+        offsets = []
+        for level_offsets in self.offsets:
+            starts = np.asarray(level_offsets[nodes], dtype=np.int64)
+            lengths = level_offsets[nodes + 1] - starts
+            offsets.append(np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))))
+            nodes = ragged_indices(starts, lengths)
+        contexts = None if self.contexts is None else [self.contexts[i] for i in records]
+        return TokenStore(self.vocabulary, np.asarray(self.ids[nodes]), offsets, contexts)
+
+    def without_contexts(self):
+        return TokenStore(self.vocabulary, self.ids, self.offsets)
+
+    def flatten(self):
+        # store with the last two levels merged, e.g. the tokens of each conversation of a store of messages
+        offsets = [np.asarray(level_offsets) for level_offsets in self.offsets[:-2]]
+        return TokenStore(self.vocabulary, self.ids, [*offsets, np.asarray(self.offsets[-1][self.offsets[-2]])], self.contexts)
+
+    def token_counts(self):
+        return np.bincount(self.ids, minlength=len(self.vocabulary))
+
+    def map_vocabulary(self, transform):
+        """
+        applies a per token `transform`, which returns None for tokens to drop, once per vocabulary entry instead of
+        once per occurrence. The result is the same as building a store from the transformed records.
+        """
+        new_vocabulary = dict()
+        mapping = np.full(len(self.vocabulary), -1, dtype=np.int64)
+        for i, token in enumerate(self.vocabulary):
+            token = transform(token)
+            if token is not None:
+                mapping[i] = new_vocabulary.setdefault(token, len(new_vocabulary))
+        mapped = mapping[self.ids]
+        kept = mapped >= 0
+        kept_before = np.concatenate(([0], np.cumsum(kept, dtype=np.int64)))
+        offsets = [np.asarray(offsets) for offsets in self.offsets[:-1]] + [kept_before[self.offsets[-1]]]
+        # the vocabulary is ordered again by first occurrence
+        codes, uniques = pd.factorize(mapped[kept])
+        strings = list(new_vocabulary)
+        return TokenStore([strings[u] for u in uniques], codes.astype(np.int32), offsets,
+                          None if self.contexts is None else list(self.contexts))
+
+    def join_records(self, records, boundaries, separator=None):
+        """
+        store of groups of records of a depth 1 store, e.g. conversations of messages. Group `i` is the concatenation
+        of the records `records[boundaries[i]:boundaries[i+1]]`, with the token `separator` between two records if it
+        is not None.
+        """
+        records = np.asarray(records, dtype=np.int64)
+        boundaries = np.asarray(boundaries, dtype=np.int64)
+        vocabulary = list(self.vocabulary)
+        starts = self.offsets[0][records]
+        lengths = self.offsets[0][records + 1] - starts
+        groups = np.repeat(np.arange(len(boundaries) - 1), np.diff(boundaries))
+
+        separated = np.zeros(len(records), dtype=bool)
+        if separator is not None:
+            # every record but the last one of its group is followed by the separator
+            separated[:] = True
+            separated[boundaries[1:][np.diff(boundaries) > 0] - 1] = False
+        lengths_out = lengths + separated
+        starts_out = np.cumsum(lengths_out) - lengths_out
+
+        ids = np.empty(int(lengths_out.sum()), dtype=np.int32)
+        ids[ragged_indices(starts_out, lengths)] = self.ids[ragged_indices(starts, lengths)]
+        if separator is not None:
+            if separator not in vocabulary:
+                vocabulary.append(separator)
+            ids[(starts_out + lengths)[separated]] = vocabulary.index(separator)
+        group_lengths = np.bincount(groups, weights=lengths_out, minlength=len(boundaries) - 1).astype(np.int64)
+        # the vocabulary is ordered again by first occurrence in the joined records, as `from_records` orders it
+        codes, uniques = pd.factorize(ids)
+        return TokenStore([vocabulary[u] for u in uniques], codes.astype(np.int32), [np.concatenate(([0], np.cumsum(group_lengths)))])
@@ -0,0 +1,116 @@
+import re
+import time
+from collections import Counter
+
+import nltk
+import pandas as pd
+
+from src.utils.commons import RegisterableObject
+
+
+class BaseTokenizer(RegisterableObject):
+
+    def tokenize(self, text) -> list[str]:
+        raise NotImplementedError()
+
+    def name(self) -> str:
+        raise NotImplementedError()
+
+
+class NLTKTokenizer(BaseTokenizer):
+
+    def tokenize(self, text) -> list[str]:
+        return nltk.tokenize.word_tokenize(text)
+
+    def name(self) -> str:
+        return "nltk treebank word tokenizer"
+
+    @classmethod
+    def short_name(cls) -> str:
+        return "nltk"
+
+
+# characters the treebank rules always put in a token of their own
+__SPLIT__ = r"""?!;@#$%&*()\[\]{}<>"`\u2012-\u2015"""
+# double dashes are a token too
+__WORD__ = rf"""(?:[^\s{__SPLIT__},:'.-]|-(?!-))"""
+# a suffix ends a word if it is not followed by another word character
+__END__ = rf"""(?!{__WORD__})"""
+__CONTRACTION__ = rf"""(?:n't|'s|'m|'d|'re|'ve|'ll){__END__}"""
+# words treebank splits in two, as in `gon na`
+__COMPOUND__ = rf"""(?<!{__WORD__})(?:(?:gon|wan)(?=na{__END__})|got(?=ta{__END__})|(?:gim|lem)(?=me{__END__})|can(?=not{__END__}))"""
+
+
+class RegexTokenizer(BaseTokenizer):
+    """
+    approximates the treebank rules of `nltk.tokenize.word_tokenize` with a few precompiled regexes and one `findall`
+    per text, without splitting sentences first. Punctuation, brackets and symbols are split off, commas and colons
+    are kept inside numbers, contractions are split as in treebank, double quotes become `` and '' and a period is
+    split off at the end of a word, since there is no sentence splitting to find the last one. Use the `compare-tokenizers` command to see how far it is from `word_tokenize`.
+    """
+    OPENING_QUOTE = re.compile(r'(^|[\s(\[{<])"')
+    TOKEN = re.compile(rf"""
+        ``|''|\.{{2,}}|--|`+                               # quotes, ellipsis and dashes
+        |{__COMPOUND__}
+        |{__WORD__}+?(?=n't{__END__})                  # the word before n't, as in `do n't`
+        |{__CONTRACTION__}
+        |{__WORD__}+(?:(?:[,:](?=\d)|\.(?={__WORD__})|(?!{__CONTRACTION__})')+{__WORD__}+)*
+        |\S
+    """, re.VERBOSE)
+
+    def tokenize(self, text) -> list[str]:
+        text = self.OPENING_QUOTE.sub(r"\1 `` ", text).replace('"', " '' ")
+        return self.TOKEN.findall(text)
+
+    def name(self) -> str:
+        return "regex treebank approximation"
+
+    @classmethod
+    def short_name(cls) -> str:
+        return "regex"
+
+
+def compare_tokenizers(texts, tokenizer, reference, top=20):
+    """
+    parity of `tokenizer` against `reference` on lowercased texts, as they are tokenized for datasets. Reports the
+    share of texts tokenized exactly the same, the precision and recall of the tokens as multisets, the overlap of
+    the vocabularies and the tokens that diverge the most.
+    """
+    texts = [text.lower() for text in texts if pd.notna(text)]
+    exact, common, produced, expected = 0, 0, 0, 0
+    vocabulary, reference_vocabulary = Counter(), Counter()
+    missing, extra = Counter(), Counter()
+    for text in texts:
+        tokens, reference_tokens = tokenizer.tokenize(text), reference.tokenize(text)
+        exact += tokens == reference_tokens
+        counts, reference_counts = Counter(tokens), Counter(reference_tokens)
+        common += sum((counts & reference_counts).values())
+        produced += len(tokens)
+        expected += len(reference_tokens)
+        vocabulary.update(counts)
+        reference_vocabulary.update(reference_counts)
+        missing.update(reference_counts - counts)
+        extra.update(counts - reference_counts)
+    shared_vocabulary = vocabulary.keys() & reference_vocabulary.keys()
+    return {
+        "texts": len(texts),
+        "exact_match": exact / max(len(texts), 1),
+        "token_precision": common / max(produced, 1),
+        "token_recall": common / max(expected, 1),
+        "vocabulary_size": len(vocabulary),
+        "reference_vocabulary_size": len(reference_vocabulary),
+        "vocabulary_jaccard": len(shared_vocabulary) / max(len(vocabulary.keys() | reference_vocabulary.keys()), 1),
+        "missing_tokens": missing.most_common(top),
+        "extra_tokens": extra.most_common(top),
+    }
+
+def benchmark_tokenizer(tokenizer, texts, repeat=3):
+    # best of `repeat` runs over the lowercased texts, in texts and tokens per second
+    texts = [text.lower() for text in texts if pd.notna(text)]
+    best, tokens = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        tokens = sum(len(tokenizer.tokenize(text)) for text in texts)
+        best = min(best, time.perf_counter() - start)
+    return {"seconds": best, "texts_per_second": len(texts) / best if best > 0 else float("inf"),
+            "tokens_per_second": tokens / best if best > 0 else float("inf")}
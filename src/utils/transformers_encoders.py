@@ -10,6 +10,40 @@ import logging
 logger = logging.getLogger()
 
 
+class EncoderWithContext:
+    """
+    mixin of the encoders of `(context, tokens)` records, which puts the `context_length` context features of a record
+    before its embedding of `EMBEDDING_SIZE`. The contexts of sequential records hold the value of each feature for
+    every message, and are turned into one tensor for all messages instead of one per message.
+    """
+    EMBEDDING_SIZE = 0
+
+    def __init__(self, context_length, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.context_length = context_length
+
+    def get_zero_vector(self):
+        return torch.zeros(self.EMBEDDING_SIZE + self.context_length, device=self.device)
+
+    def contexts_tensor(self, contexts, messages=None):
+        # with `messages`, row `i` holds the contexts of message `i`
+        contexts = np.asarray(contexts, dtype=np.float32)
+        if messages is not None:
+            contexts = contexts.reshape(len(contexts), messages).T
+        return torch.tensor(contexts, device=self.device)
+
+    def transform_with_context(self, record, transform):
+        if len(record[1][0]) == 0:
+            return self.get_zero_vector()
+        return torch.cat((self.contexts_tensor(record[0]), transform(record[1][0])[0]))
+
+    def transform_sequence_with_context(self, record, transform):
+        if len(record[1]) == 0:
+            return ((self.get_zero_vector(),),)
+        contexts = self.contexts_tensor(record[0], len(record[1]))
+        return [torch.cat((contexts[i], transform(tokens)[0])) for i, tokens in enumerate(record[1])]
+
+
 class TransformersEmbeddingEncoder:
 
     def __init__(self, device="cpu", transformer_identifier="sentence-transformers/all-distilroberta-v1", special_token=[], *args, **kwargs):
@@ -97,21 +131,11 @@ class Word2VecEmbeddingEncoder:
         pass
 
 
-class Word2VecEmbeddingEncoderWithContext(Word2VecEmbeddingEncoder):
-    
-    def get_zero_vector(self):
-        return torch.zeros(300+self.context_length, device=self.device)
-    
-    def __init__(self, context_length, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.context_length = context_length
+class Word2VecEmbeddingEncoderWithContext(EncoderWithContext, Word2VecEmbeddingEncoder):
+    EMBEDDING_SIZE = 300
     
     def transform(self, record):
-        if len(record[1][0]) == 0:
-            return self.get_zero_vector()
-        
-        result = torch.cat((torch.tensor(record[0], device=self.device), super().transform(record[1][0])[0]))
-        return result
+        return self.transform_with_context(record, super().transform)
 
 
 class SequentialWord2VecEmbeddingEncoder(Word2VecEmbeddingEncoder):
@@ -123,26 +147,11 @@ class SequentialWord2VecEmbeddingEncoder(Word2VecEmbeddingEncoder):
         return result
 
 
-class SequentialTransformersWord2VecEncoderWithContext(Word2VecEmbeddingEncoder):
-    
-    def __init__(self, context_length, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.context_length = context_length
+class SequentialTransformersWord2VecEncoderWithContext(EncoderWithContext, Word2VecEmbeddingEncoder):
+    EMBEDDING_SIZE = 300
     
     def transform(self, record):
-        try:
-            result = [None]*len(record[-1])
-        except:
-            result = []
-
-        contexts = [context for context in zip(*record[0])]
-        for i, (context, sequence_records) in enumerate(zip(contexts, record[1])):
-            temp = torch.cat((torch.tensor(context, device=self.device), super().transform(sequence_records)[0]))
-            result[i] = temp
-        
-        if len(result) == 0:
-            return ((self.get_zero_vector(),),)
-        return result
+        return self.transform_sequence_with_context(record, super().transform)
 
 
 class SequentialTransformersEmbeddingEncoder(TransformersEmbeddingEncoder):
@@ -155,40 +164,15 @@ class SequentialTransformersEmbeddingEncoder(TransformersEmbeddingEncoder):
         return result
 
 
-class TransformersEmbeddingEncoderWithContext(TransformersEmbeddingEncoder):
-    
-    def get_zero_vector(self):
-        return torch.zeros(768+self.context_length, device=self.device)
-    
-    def __init__(self, context_length, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.context_length = context_length
+class TransformersEmbeddingEncoderWithContext(EncoderWithContext, TransformersEmbeddingEncoder):
+    EMBEDDING_SIZE = 768
     
     def transform(self, record):
-        if len(record[1][0]) == 0:
-            return self.get_zero_vector()
-        
-        result = torch.cat((torch.tensor(record[0], device=self.device), super().transform(record[1][0])[0]))
-        return result
+        return self.transform_with_context(record, super().transform)
 
 
-class SequentialTransformersEmbeddingEncoderWithContext(TransformersEmbeddingEncoder):
-    
-    def __init__(self, context_length, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self.context_length = context_length
+class SequentialTransformersEmbeddingEncoderWithContext(EncoderWithContext, TransformersEmbeddingEncoder):
+    EMBEDDING_SIZE = 768
     
     def transform(self, record):
-        try:
-            result = [None]*len(record[-1])
-        except:
-            result = []
-
-        contexts = [context for context in zip(*record[0])]
-        for i, (context, sequence_records) in enumerate(zip(contexts, record[1])):
-            temp = torch.cat((torch.tensor(context, device=self.device), super().transform(sequence_records)[0]))
-            result[i] = temp
-        
-        if len(result) == 0:
-            return ((self.get_zero_vector(),),)
-        return result
+        return self.transform_sequence_with_context(record, super().transform)
@@ -0,0 +1,292 @@
+import json
+import os
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+from src.utils.token_store import ragged_indices
+
+
+def is_index(index):
+    # a single record, as opposed to a batch of ids
+    return np.isscalar(index) or (isinstance(index, torch.Tensor) and index.dim() == 0)
+
+
+class CSRVectorStore:
+    """
+    1-D sparse vectors of the same size stored as the rows of one CSR matrix: row `i` holds the columns
+    `indices[indptr[i]:indptr[i+1]]` with the values `data[indptr[i]:indptr[i+1]]`. Saved as plain arrays, so they
+    are loaded by memory map without reading the rows that are not used. Indexing gives the sparse tensor of a row, as
+    the list of vectors did, and indexing with a batch of ids, or `rows`, gathers them into one sparse matrix.
+    """
+
+    def __init__(self, indptr, indices, data, width, device="cpu"):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.width = width
+        self.device = device
+
+    @staticmethod
+    def supports(vectors):
+        return len(vectors) > 0 and all(isinstance(v, torch.Tensor) and v.is_sparse and v.dim() == 1 for v in vectors)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        vectors = [vector.coalesce().cpu() for vector in vectors]
+        lengths = [vector._nnz() for vector in vectors]
+        indptr = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        indices = np.concatenate([vector.indices()[0].numpy() for vector in vectors]).astype(np.int32) if len(vectors) else np.zeros(0, np.int32)
+        data = np.concatenate([vector.values().numpy() for vector in vectors]).astype(np.float32) if len(vectors) else np.zeros(0, np.float32)
+        return cls(indptr, indices, data, vectors[0].shape[0] if len(vectors) else 0)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "indptr.npy"), np.asarray(self.indptr))
+        np.save(os.path.join(path, "indices.npy"), np.asarray(self.indices))
+        np.save(os.path.join(path, "data.npy"), np.asarray(self.data))
+        with open(os.path.join(path, "shape.json"), "w") as f:
+            json.dump([len(self), self.width], f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(path, "shape.json"), "r") as f:
+            _, width = json.load(f)
+        return cls(*[np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ("indptr", "indices", "data")], width)
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "shape.json"))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def shape(self):
+        return (len(self), self.width)
+
+    def __getitem__(self, index):
+        if not is_index(index):
+            return self.rows(index)
+        start, end = self.indptr[index], self.indptr[index+1]
+        # rows of a memory map are read only, so they are copied; a row is small
+        indices = torch.from_numpy(np.array(self.indices[start:end], dtype=np.int64)).unsqueeze(0)
+        values = torch.from_numpy(np.array(self.data[start:end]))
+        return torch.sparse_coo_tensor(indices, values, (self.width,), device=self.device, is_coalesced=True)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def rows(self, ids):
+        """
+        the rows `ids` as one sparse `(len(ids), width)` matrix, gathered with a single index over the arrays instead
+        of stacking one tensor per row
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = np.asarray(self.indptr[ids])
+        lengths = np.asarray(self.indptr[ids + 1]) - starts
+        gather = ragged_indices(starts, lengths)
+        indices = np.stack([np.repeat(np.arange(len(ids)), lengths), np.asarray(self.indices[gather], dtype=np.int64)])
+        return torch.sparse_coo_tensor(torch.from_numpy(indices), torch.from_numpy(np.asarray(self.data[gather])),
+                                       (len(ids), self.width), device=self.device, is_coalesced=True)
+
+    def to(self, device):
+        # the arrays stay in memory or on disk; the tensors made from them are put on `device`
+        self.device = device
+        return self
+
+
+class RaggedVectorStore:
+    """
+    dense vectors, such as embeddings, stored as the rows of one matrix: record `i` is `data[offsets[i]:offsets[i+1]]`,
+    i.e. the embeddings of the messages of a conversation, or a single row if records are vectors (`flat`). Rows can
+    be stored as float16 or bfloat16 and are widened to float32 when they are read, so the matrix takes half the disk
+    and memory. Saved as plain arrays and loaded by memory map, so processes reading the same store share its pages.
+    """
+    # numpy has no bfloat16, so its bits are kept as uint16
+    STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "bfloat16": np.uint16}
+
+    def __init__(self, data, offsets, flat, dtype="float32", device="cpu"):
+        self.data = data
+        self.offsets = offsets
+        self.flat = flat
+        self.dtype = dtype
+        self.device = device
+
+    @staticmethod
+    def supports(vectors):
+        if len(vectors) == 0 or not all(isinstance(v, torch.Tensor) and not v.is_sparse and v.is_floating_point() for v in vectors):
+            return False
+        return len({v.dim() for v in vectors}) == 1 and vectors[0].dim() in (1, 2) and len({v.shape[-1] for v in vectors}) == 1
+
+    @classmethod
+    def from_vectors(cls, vectors, dtype="float32"):
+        if dtype not in cls.STORAGE_DTYPES:
+            raise ValueError(f"vectors can not be stored as {dtype}; use one of {', '.join(cls.STORAGE_DTYPES)}")
+        flat = vectors[0].dim() == 1
+        lengths = [1 if flat else vector.shape[0] for vector in vectors]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        data = torch.cat([vector.detach().cpu().reshape(-1, vector.shape[-1]) for vector in vectors])
+        if dtype == "bfloat16":
+            data = data.to(torch.bfloat16).view(torch.int16).numpy().view(np.uint16)
+        else:
+            data = data.numpy().astype(cls.STORAGE_DTYPES[dtype])
+        return cls(data, offsets, flat, dtype)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "data.npy"), np.asarray(self.data))
+        np.save(os.path.join(path, "offsets.npy"), np.asarray(self.offsets))
+        with open(os.path.join(path, "layout.json"), "w") as f:
+            json.dump({"records": len(self), "width": self.width, "flat": self.flat, "dtype": self.dtype}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(path, "layout.json"), "r") as f:
+            layout = json.load(f)
+        return cls(np.load(os.path.join(path, "data.npy"), mmap_mode=mmap_mode), np.load(os.path.join(path, "offsets.npy"), mmap_mode=mmap_mode),
+                   layout["flat"], layout["dtype"])
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "layout.json"))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def width(self):
+        return self.data.shape[1]
+
+    def __widen__(self, rows):
+        if self.dtype == "bfloat16":
+            return (np.asarray(rows).astype(np.uint32) << 16).view(np.float32)
+        return np.asarray(rows, dtype=np.float32)
+
+    def __getitem__(self, index):
+        if not is_index(index):
+            return self.rows(index)
+        start, end = self.offsets[index], self.offsets[index+1]
+        rows = torch.from_numpy(np.array(self.__widen__(self.data[start:end]), copy=self.dtype == "float32")).to(self.device)
+        return rows[0] if self.flat else rows
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def rows(self, ids):
+        """
+        the records `ids` gathered with a single index over the matrix and widened at once: a `(len(ids), width)`
+        matrix if records are vectors, else a list with the `(messages, width)` matrix of each record
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        starts = np.asarray(self.offsets[ids])
+        lengths = np.asarray(self.offsets[ids + 1]) - starts
+        rows = torch.from_numpy(np.asarray(self.__widen__(self.data[ragged_indices(starts, lengths)]))).to(self.device)
+        return rows if self.flat else list(torch.split(rows, lengths.tolist()))
+
+    def to(self, device):
+        self.device = device
+        return self
+
+
+def tensor_bytes(vector):
+    if isinstance(vector, dict):
+        return sum(tensor_bytes(v) for v in vector.values())
+    if vector.is_sparse:
+        return vector._indices().nbytes + vector._values().nbytes
+    return vector.nbytes
+
+
+class LazyVectors:
+    """
+    vectors of records made on first access by `vectorize(ids)`, which returns the vectors of the records `ids`,
+    instead of all of them before training. The most recently used vectors are kept in memory up to `cache_bytes`.
+    With `records_path`, each vector is also written there once made and read back instead of being made again, by
+    this process, the workers of a data loader or later sessions.
+    """
+
+    def __init__(self, vectorize, length, cache_bytes=2**30, records_path=None, device="cpu"):
+        self.vectorize = vectorize
+        self.length = length
+        self.cache_bytes = cache_bytes
+        self.records_path = records_path
+        self.device = device
+        self.__cache__ = OrderedDict()
+        self.__cached_bytes__ = 0
+
+    def __len__(self):
+        return self.length
+
+    def record_path(self, index):
+        return os.path.join(self.records_path, str(index // 1000), f"{index}.pt")
+
+    def __keep__(self, index, vector):
+        self.__cache__[index] = vector
+        self.__cached_bytes__ += tensor_bytes(vector)
+        # the least recently used vectors are dropped, but never the one just made
+        while self.__cached_bytes__ > self.cache_bytes and len(self.__cache__) > 1:
+            _, dropped = self.__cache__.popitem(last=False)
+            self.__cached_bytes__ -= tensor_bytes(dropped)
+
+    def __write__(self, index, vector):
+        path = self.record_path(index)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        torch.save(vector, temp_path)
+        os.replace(temp_path, path)
+
+    def records(self, ids):
+        """
+        the vectors of the records `ids`; the ones neither cached nor written are made with a single call of `vectorize`
+        """
+        ids = [int(i) + self.length if int(i) < 0 else int(i) for i in ids]
+        vectors = dict()
+        for i in ids:
+            if i in self.__cache__:
+                self.__cache__.move_to_end(i)
+                vectors[i] = self.__cache__[i]
+            elif self.records_path is not None and os.path.exists(self.record_path(i)):
+                vectors[i] = torch.load(self.record_path(i))
+                self.__keep__(i, vectors[i])
+        missing = list(dict.fromkeys(i for i in ids if i not in vectors))
+        if len(missing):
+            for i, vector in zip(missing, self.vectorize(missing)):
+                vectors[i] = vector
+                self.__keep__(i, vector)
+                if self.records_path is not None:
+                    self.__write__(i, vector)
+        return [vectors[i].to(self.device) for i in ids]
+
+    def __getitem__(self, index):
+        if index >= self.length or index < -self.length:
+            raise IndexError(f"record {index} is out of the {self.length} records")
+        return self.records([index])[0]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to(self, device):
+        self.device = device
+        return self
+
+
+VECTOR_STORES = (CSRVectorStore, RaggedVectorStore)
+
+
+def to_vector_store(vectors, dtype="float32"):
+    # the store that fits `vectors`, or the vectors themselves if none does
+    if CSRVectorStore.supports(vectors):
+        return CSRVectorStore.from_vectors(vectors)
+    if RaggedVectorStore.supports(vectors):
+        return RaggedVectorStore.from_vectors(vectors, dtype)
+    return vectors
+
+def load_vector_store(path):
+    for store in VECTOR_STORES:
+        if store.exists(path):
+            return store.load(path)
+    return None
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the repository is not installed as a package; modules are imported as `src.…` from its root, as runner.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+import torch
+
+from src.utils import transformers_encoders as encoders
+
+
+class FakeKeyedVectors:
+    def get_vector(self, token):
+        if token == "unknown":
+            raise KeyError(token)
+        return np.full(300, len(token), dtype=np.float32)
+
+
+class FakeSentenceTransformer:
+    def encode(self, text, **kwargs):
+        return torch.full((768,), float(len(text)))
+
+
+@pytest.fixture(autouse=True)
+def fake_models(monkeypatch):
+    def word2vec_init(self, embedding_path=None, device="cpu"):
+        self.device = device
+        self.__word2vec__ = FakeKeyedVectors()
+        self.__default_vector__ = torch.zeros(size=(1, 300))
+
+    def transformers_init(self, device="cpu", *args, **kwargs):
+        self.device = device
+        self.encoder = FakeSentenceTransformer()
+    monkeypatch.setattr(encoders.Word2VecEmbeddingEncoder, "__init__", word2vec_init)
+    monkeypatch.setattr(encoders.TransformersEmbeddingEncoder, "__init__", transformers_init)
+
+
+ENCODERS = [(encoders.Word2VecEmbeddingEncoderWithContext, encoders.SequentialTransformersWord2VecEncoderWithContext, 300),
+            (encoders.TransformersEmbeddingEncoderWithContext, encoders.SequentialTransformersEmbeddingEncoderWithContext, 768)]
+
+
+@pytest.mark.parametrize("encoder_class, sequential_class, size", ENCODERS)
+def test_contexts_precede_the_embeddings(encoder_class, sequential_class, size):
+    encoder, sequential = encoder_class(context_length=2), sequential_class(context_length=2)
+    messages = (["hi", "there"], ["hello"], ["unknown", "a"])
+    contexts = ((0.5, 0.25, 0.125), (1.0, 2.0, 3.0))
+
+    vectors = sequential.transform((contexts, messages))
+    assert len(vectors) == 3
+    for i, tokens in enumerate(messages):
+        single = encoder.transform(((contexts[0][i], contexts[1][i]), (tokens,)))
+        assert single.shape == (size + 2,) and single.dtype == torch.float32
+        assert torch.equal(vectors[i], single)
+        assert torch.equal(single[:2], torch.tensor([contexts[0][i], contexts[1][i]]))
+
+
+@pytest.mark.parametrize("encoder_class, sequential_class, size", ENCODERS)
+def test_empty_records_are_zero_vectors(encoder_class, sequential_class, size):
+    assert torch.equal(encoder_class(context_length=1).transform(((0.5,), ([],))), torch.zeros(size + 1))
+    (vector,), = sequential_class(context_length=1).transform(((), ()))
+    assert torch.equal(vector, torch.zeros(size + 1))
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+import torch
+
+from src.preprocessing import PunctuationRemoving
+from src.utils.dataset import BagOfWordsDataset, ConversationBagOfWords, NAuthorsConversationBagOfWords, NAuthorTransformersEmbeddingDataset
+from src.utils.tokenizers import RegexTokenizer
+
+
+@pytest.mark.parametrize("cls", [NAuthorsConversationBagOfWords, NAuthorTransformersEmbeddingDataset, BagOfWordsDataset])
+def test_message_data_path_is_rejected_where_unused(cls, tmp_path):
+    with pytest.raises(ValueError):
+        cls("conversations.csv", str(tmp_path) + "/", False, message_data_path="messages.csv")
+
+
+def test_message_data_path_is_kept():
+    assert ConversationBagOfWords("conversations.csv", "out/", False, message_data_path="messages.csv").message_data_path == "messages.csv"
+
+
+
+def test_pipelined_is_rejected_with_the_token_cache(tmp_path):
+    with pytest.raises(ValueError):
+        BagOfWordsDataset("messages.csv", str(tmp_path) + "/", False, pipelined=True)
+    assert BagOfWordsDataset("messages.csv", str(tmp_path) + "/", False, pipelined=True, shared_token_cache=False).pipelined
+
+
+def test_pipelined_is_rejected_with_message_data_path(tmp_path):
+    with pytest.raises(ValueError):
+        ConversationBagOfWords("conversations.csv", str(tmp_path) + "/", False, pipelined=True, shared_token_cache=False,
+                               message_data_path="messages.csv")
+
+@pytest.mark.parametrize("preprocessings", [[], [PunctuationRemoving()]])
+def test_conversation_vectors_sum_message_vectors(tmp_path, preprocessings):
+    messages = pd.DataFrame({"conv_id": ["a", "b", "a", "c", "a", "b"], "msg_line": [1, 1, 3, 1, 2, 2],
+                             "text": ["hey there!", "hi", "you there?", "hello hello", "...", "asl?"]})
+    messages.to_csv(tmp_path / "messages.csv")
+    conversations = pd.DataFrame({"conv_id": ["c", "a", "b"], "predatory_conv": [0.0, 1.0, 0.0],
+                                  "number_of_messages": [1, 3, 2], "number_of_authors": [2, 2, 2]})
+    conversations["text"] = ""
+    conversations.to_csv(tmp_path / "conversations.csv")
+    dataset = ConversationBagOfWords(str(tmp_path / "conversations.csv"), str(tmp_path / "out") + "/", False, apply_record_filter=False,
+                                     preprocessings=preprocessings, tokenizer=RegexTokenizer(), vector_size=100,
+                                     message_data_path=str(tmp_path / "messages.csv"))
+    tokens = dataset.tokenize(dataset.df["text"])
+    encoder = dataset.init_encoder(tokens)
+    vectors = dataset.vectorize(tokens, encoder)
+
+    message_vectors = encoder.transform_store(dataset.preprocessed_store(messages["text"]))
+    # the separator is preprocessed as a message of its own, so it is not counted if it is removed
+    separator = encoder.transform_store(dataset.preprocessed_store(pd.Series(["."])))[0].to_dense()
+    for vector, conv_id in zip(vectors, conversations["conv_id"]):
+        lines = messages.index[messages["conv_id"] == conv_id]
+        expected = sum(message_vectors[i].to_dense() for i in lines) + (len(lines) - 1) * separator
+        assert torch.equal(vector.to_dense(), expected)
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.artifact_store import ArtifactStore
+from src.utils.conversation_index import ConversationIndex
+
+MESSAGES = pd.DataFrame({"conv_id": ["b", "a", "b", "a", "c"], "msg_line": [2, 1, 1, 2, 1], "predatory_conv": [1.0, 0.0, 1.0, 0.0, 0.0]})
+
+
+def test_index_is_cached_in_the_artifact_store(tmp_path):
+    artifacts = ArtifactStore(str(tmp_path / "artifacts"))
+    (tmp_path / "messages.csv").write_text(MESSAGES.to_csv())
+    key = ConversationIndex.key(artifacts, str(tmp_path / "messages.csv"), filters=(("msg_line", ">", 0),))
+    index = ConversationIndex.cached(artifacts, key, MESSAGES)
+    assert [index.rows(i).tolist() for i in range(len(index))] == [[1, 3], [2, 0], [4]]
+    assert artifacts.artifacts() == [(ConversationIndex.STAGE, key)]
+
+    cached = ConversationIndex.cached(artifacts, key, MESSAGES)
+    assert isinstance(cached.order, np.memmap)
+    assert np.array_equal(cached.offsets, index.offsets) and np.array_equal(cached.labels, index.labels)
+
+    artifacts.update_ref("train", {ConversationIndex.STAGE: key})
+    assert artifacts.collect_garbage() == ([], 0)
+    artifacts.update_ref("train", {})
+    assert artifacts.collect_garbage()[0] == [(ConversationIndex.STAGE, key)]
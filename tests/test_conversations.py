@@ -0,0 +1,36 @@
+import contextlib
+import io
+
+import pandas as pd
+import pytest
+
+from src.utils.commons import (pan12_xml2csv, message_csv2conversation_csv, message_csv2conversation_csv_chunked, read_dataframe,
+                               save_dataframe)
+
+XMLFILE = "data/toy.train/pan12-sexual-predator-identification-training-corpus-2012-05-01.xml"
+PREDATORSFILE = "data/toy.train/pan12-sexual-predator-identification-training-corpus-predators-2012-05-01.txt"
+COLUMNS = ("conv_id", "msg_line", "author_id", "text", "predatory_conv")
+
+
+@pytest.fixture(scope="module")
+def messages():
+    with contextlib.redirect_stdout(io.StringIO()):
+        return pan12_xml2csv(XMLFILE, PREDATORSFILE)
+
+
+@pytest.mark.parametrize("sort", [False, True])
+@pytest.mark.parametrize("chunk_size", [7, 100, 10**6])
+def test_chunked_matches_in_memory(messages, sort, chunk_size, tmp_path):
+    # xml2csv keeps the order of the xml, which is not sorted by conv_id
+    if sort:
+        messages = messages.sort_values(["conv_id", "msg_line"], kind="stable").reset_index(drop=True)
+    save_dataframe(messages, str(tmp_path / "messages.csv"))
+
+    save_dataframe(message_csv2conversation_csv(read_dataframe(str(tmp_path / "messages.csv"), columns=COLUMNS)), str(tmp_path / "in-memory.csv"))
+    rows = message_csv2conversation_csv_chunked(str(tmp_path / "messages.csv"), str(tmp_path / "chunked.csv"), chunk_size=chunk_size)
+
+    assert rows == messages["conv_id"].nunique()
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "chunked.csv"), pd.read_csv(tmp_path / "in-memory.csv"))
+    assert (tmp_path / "chunked.csv").read_bytes() == (tmp_path / "in-memory.csv").read_bytes()
+    # the temporary runs are removed
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["chunked.csv", "in-memory.csv", "messages.csv"]
@@ -0,0 +1,12 @@
+import pandas as pd
+
+from src.utils.dedup import find_duplicates
+
+
+def test_conversations_without_words_are_not_duplicates():
+    train = pd.DataFrame({"conv_id": ["a", "b", "c", "d", "e"],
+                          "text": ["", "   ", None, "hey there how are you", "hey there how are you"]})
+    test = pd.DataFrame({"conv_id": ["f"], "text": [""]})
+    report = find_duplicates({"train": train, "test": test}).set_index("conv_id")
+    assert report["cluster"].to_dict() == {"a": "a", "b": "b", "c": "c", "d": "d", "e": "d", "f": "f"}
+    assert report["exclude"].to_dict() == {"a": False, "b": False, "c": False, "d": False, "e": True, "f": False}
@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from src.preprocessing import PunctuationRemoving
+from src.utils.dataset import FineTuningDistilrobertaDataset
+from src.utils.tokenizers import RegexTokenizer
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    pd.DataFrame({"text": ["hey!", "wat up ?", "you like casual fun?"], "predatory_conv": [1.0, 0.0, 0.0]}).to_csv(tmp_path / "train.csv")
+    return str(tmp_path / "train.csv")
+
+
+@pytest.mark.parametrize("shared_token_cache", [False, True])
+def test_preprocessings_are_applied(data_path, tmp_path, monkeypatch, shared_token_cache):
+    # the transformer tokenizer is left out, its input are the preprocessed tokens
+    monkeypatch.setattr(FineTuningDistilrobertaDataset, "tokenize", lambda self, tokens: (tokens, None))
+
+    def tokens(preprocessings):
+        dataset = FineTuningDistilrobertaDataset(data_path, str(tmp_path / "out") + "/", False, apply_record_filter=False,
+                                                 preprocessings=preprocessings, tokenizer=RegexTokenizer(),
+                                                 shared_token_cache=shared_token_cache)
+        return dataset.preprocess()[0]
+
+    raw = tokens([])
+    assert raw[2] == ["you", "like", "casual", "fun", "?"]
+    assert tokens([PunctuationRemoving()]) == [[token for token in record if token.isalnum()] for record in raw]
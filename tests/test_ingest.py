@@ -0,0 +1,71 @@
+import os
+import pickle
+
+import pytest
+
+from src.utils import commons
+from src.utils.commons import pan12_ingest
+
+TRAIN = ("data/toy.train/pan12-sexual-predator-identification-training-corpus-2012-05-01.xml",
+         "data/toy.train/pan12-sexual-predator-identification-training-corpus-predators-2012-05-01.txt")
+TEST_XML = "data/toy.test/pan12-sexual-predator-identification-test-corpus-2012-05-17.xml"
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return str(tmp_path / "messages.csv"), str(tmp_path / "conversations.csv"), str(tmp_path / "index.pkl")
+
+
+def snapshot(directory):
+    # the index is compared by its contents, as its set of ids is pickled in any order
+    return {name: pickle.loads((directory / name).read_bytes()) if name.endswith(".pkl") else (directory / name).read_bytes()
+            for name in sorted(os.listdir(directory))}
+
+
+def test_failed_ingestion_changes_nothing(paths, tmp_path, monkeypatch):
+    pan12_ingest([TRAIN[0]], TRAIN[1], *paths)
+    before = snapshot(tmp_path)
+
+    def fail(messages):
+        raise RuntimeError("interrupted")
+    monkeypatch.setattr(commons, "message_csv2conversation_csv", fail)
+    for update in (False, True):
+        with pytest.raises(RuntimeError):
+            pan12_ingest([TRAIN[0], TEST_XML], TRAIN[1], *paths, update=update)
+        # neither the files nor the index are touched, and no temporary file is left
+        assert snapshot(tmp_path) == before
+
+
+def test_ingestion_is_repeatable(paths, tmp_path):
+    pan12_ingest([TRAIN[0]], TRAIN[1], *paths)
+    first = snapshot(tmp_path)
+    summary = pan12_ingest([TRAIN[0]], TRAIN[1], *paths, update=True)
+    assert summary["new"] == 0 and summary["updated"] > 0
+    assert snapshot(tmp_path) == first
+
+
+@pytest.mark.parametrize("parquet", [0, 1])
+def test_parquet_is_rejected_before_writing(paths, tmp_path, parquet):
+    paths = list(paths)
+    paths[parquet] = str(tmp_path / "data.parquet")
+    with pytest.raises(ValueError):
+        pan12_ingest([TRAIN[0]], TRAIN[1], *paths)
+    assert os.listdir(tmp_path) == []
+
+
+def test_numeric_looking_ids_match(paths, tmp_path):
+    xml = tmp_path / "dump.xml"
+    xml.write_text("<conversations>" + "".join(
+        f'<conversation id="{conv_id}"><message line="1"><author>007</author><time>20:48</time><text>hey</text></message>'
+        f'<message line="2"><author>8</author><time>20:49</time><text>hi</text></message></conversation>' for conv_id in ("0042", "17"))
+        + "</conversations>")
+    predators = tmp_path / "predators.txt"
+    predators.write_text("007\n")
+    pan12_ingest([str(xml)], str(predators), *paths)
+    first = {path: open(path, "rb").read() for path in paths[:2]}
+    # the index is bootstrapped from the files, whose ids must be read as the xml has them
+    os.remove(paths[2])
+    assert pan12_ingest([str(xml)], str(predators), *paths)["skipped"] == 2
+    summary = pan12_ingest([str(xml)], str(predators), *paths, update=True)
+    assert summary["new"] == 0 and summary["updated"] == 2
+    assert {path: open(path, "rb").read() for path in paths[:2]} == first
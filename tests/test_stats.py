@@ -0,0 +1,12 @@
+import pandas as pd
+
+from src.utils.commons import get_stats_v2, get_stats_v2_chunked
+
+
+def test_missing_authors_are_counted_once(tmp_path):
+    data = pd.DataFrame({"conv_id": ["a", "a", "a", "b", "b"], "author_id": ["x", None, "y", None, "y"],
+                         "predatory_conv": [1.0, 1.0, 1.0, 0.0, 0.0], "tagged_predator": [0.0, 1.0, 1.0, 0.0, 0.0]})
+    data.to_csv(tmp_path / "messages.csv")
+    for stats in (get_stats_v2(data), get_stats_v2_chunked(str(tmp_path / "messages.csv"), chunk_size=2)):
+        assert stats["number_of_chatters"] == 3
+        assert stats["number_of_predatory_chatters"] == 2
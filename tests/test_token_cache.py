@@ -0,0 +1,56 @@
+import pytest
+
+from src.preprocessing import PunctuationRemoving, RepetitionRemoving
+from src.utils import token_cache
+from src.utils.artifact_store import ArtifactStore
+from src.utils.token_cache import SharedTokenCache
+
+TEXTS = ["hi there !", "hi hi , you", "", "the end ."]
+
+
+class Tokenizer:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        return [text.split() for text in texts]
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    return ArtifactStore(str(tmp_path / "artifacts"))
+
+
+def preprocessed(cache, tokenizer, preprocessings):
+    return cache.preprocessed(TEXTS, "split", preprocessings, tokenizer).to_records()
+
+
+def test_cached_prefixes_are_reused(artifacts):
+    tokenizer = Tokenizer()
+    expected = preprocessed(SharedTokenCache(artifacts), tokenizer, [PunctuationRemoving(), RepetitionRemoving()])
+    cache = SharedTokenCache(artifacts)
+    assert preprocessed(cache, tokenizer, [PunctuationRemoving(), RepetitionRemoving()]) == expected
+    assert preprocessed(cache, tokenizer, [PunctuationRemoving()]) == [[t for t in text.split() if t.isalnum()] for text in TEXTS]
+    assert tokenizer.calls == 1
+    assert len(cache.used_keys) == 2
+
+
+def test_changed_preprocessing_code_is_not_reused(artifacts, monkeypatch):
+    tokenizer = Tokenizer()
+    preprocessed(SharedTokenCache(artifacts), tokenizer, [PunctuationRemoving()])
+    monkeypatch.setattr(token_cache, "class_hash", lambda cls: "changed")
+    cache = SharedTokenCache(artifacts)
+    preprocessed(cache, tokenizer, [PunctuationRemoving()])
+    assert tokenizer.calls == 1
+    # the tokens without preprocessing are still reused, only the preprocessed ones are computed again
+    assert len(artifacts.artifacts()) == 3
+
+
+def test_garbage_collection_keeps_referenced_tokens(artifacts):
+    cache = SharedTokenCache(artifacts)
+    preprocessed(cache, Tokenizer(), [PunctuationRemoving(), RepetitionRemoving()])
+    artifacts.update_ref("train", {SharedTokenCache.STAGE: sorted(cache.used_keys)[:1]})
+    removed, _ = artifacts.collect_garbage()
+    assert len(removed) == 2
+    assert artifacts.artifacts() == [(SharedTokenCache.STAGE, sorted(cache.used_keys)[0])]
@@ -0,0 +1,75 @@
+import pytest
+import torch
+
+from src.utils.one_hot_encoder import OneHotEncoder
+from src.utils.token_store import TokenStore
+
+CONVERSATIONS = [
+    [["hi", "there"], ["hello"]],
+    [],
+    [["a", "b", "c"], [], ["hi"]],
+    [["there", "a"]],
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    TokenStore.from_records(CONVERSATIONS, depth=2).save(str(tmp_path / "tokens"))
+    return TokenStore.load(str(tmp_path / "tokens"))
+
+
+def test_records_are_decoded_on_access(store):
+    assert list(store) == CONVERSATIONS
+    assert store[2] == CONVERSATIONS[2]
+    assert store[-1] == CONVERSATIONS[-1]
+    assert store[1:3] == CONVERSATIONS[1:3]
+
+
+@pytest.mark.parametrize("records", [[3, 0, 2], [1], [], [2, 2]])
+def test_subset_matches_the_records(store, records):
+    assert store.subset(records).to_records() == [CONVERSATIONS[i] for i in records]
+
+
+def test_flatten_merges_messages(store):
+    assert store.flatten().to_records() == [[token for message in conversation for token in message] for conversation in CONVERSATIONS]
+
+
+def test_subset_keeps_contexts():
+    records = [((i,), conversation) for i, conversation in enumerate(CONVERSATIONS)]
+    store = TokenStore.from_records(records, depth=2, with_context=True)
+    assert store.subset([2, 0]).to_records() == [(context, tuple(tokens)) for context, tokens in (records[2], records[0])]
+    assert store.subset([2, 0]).without_contexts().to_records() == [CONVERSATIONS[2], CONVERSATIONS[0]]
+
+
+MESSAGES = [["hi", "there"], ["hello", "."], [], ["a", "b", "a"], ["there", "hi"], ["b"]]
+# conversations of the messages, in the order of their lines
+GROUPS = [[3, 0], [1], [5, 2, 4]]
+
+
+def joined_conversations(separator):
+    conversations = []
+    for group in GROUPS:
+        tokens = []
+        for i, message in enumerate(group):
+            tokens.extend(MESSAGES[message] + ([separator] if i < len(group) - 1 else []))
+        conversations.append(tokens)
+    return conversations
+
+
+def test_joined_records_match_the_conversations():
+    store = TokenStore.from_records(MESSAGES).join_records([m for group in GROUPS for m in group], [0, 2, 3, 6], ".")
+    expected = TokenStore.from_records(joined_conversations("."))
+    assert store.to_records() == expected.to_records()
+    assert store.vocabulary == expected.vocabulary
+
+
+@pytest.mark.parametrize("vector_size", [-1, 4])
+def test_fit_store_on_joined_records_matches_fit(vector_size):
+    conversations = joined_conversations(".")
+    store = TokenStore.from_records(MESSAGES).join_records([m for group in GROUPS for m in group], [0, 2, 3, 6], ".")
+    fitted, fitted_store = OneHotEncoder(vector_size=vector_size), OneHotEncoder(vector_size=vector_size)
+    fitted.fit(lambda: (token for tokens in conversations for token in tokens))
+    fitted_store.fit_store(store)
+    assert list(fitted_store.records.items()) == list(fitted.records.items())
+    for vector, expected in zip(fitted_store.transform_store(store), fitted.transform_store(TokenStore.from_records(conversations))):
+        assert torch.equal(vector.to_dense(), expected.to_dense())
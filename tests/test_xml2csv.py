@@ -0,0 +1,48 @@
+import gzip
+import shutil
+
+import pandas as pd
+import pytest
+
+from src.utils.commons import pan12_xml2csv, pan12_xml2csv_parallel, read_dataframe, save_dataframe, MESSAGE_SCHEMA
+
+TOY_CORPORA = {
+    "toy.train": ("data/toy.train/pan12-sexual-predator-identification-training-corpus-2012-05-01.xml",
+                  "data/toy.train/pan12-sexual-predator-identification-training-corpus-predators-2012-05-01.txt"),
+    "toy.test": ("data/toy.test/pan12-sexual-predator-identification-test-corpus-2012-05-17.xml",
+                 "data/toy.test/pan12-sexual-predator-identification-groundtruth-problem1.txt"),
+}
+
+
+def read_messages(path):
+    return read_dataframe(str(path), schema=MESSAGE_SCHEMA, index_col=0)
+
+
+@pytest.mark.parametrize("corpus", TOY_CORPORA)
+@pytest.mark.parametrize("compressed", [False, True])
+def test_parallel_matches_serial(corpus, compressed, tmp_path):
+    xmlfile, predatorsfile = TOY_CORPORA[corpus]
+    serial = pan12_xml2csv(xmlfile, predatorsfile)
+    save_dataframe(serial, str(tmp_path / "serial.csv"))
+
+    if compressed:
+        with open(xmlfile, "rb") as f, gzip.open(tmp_path / "corpus.xml.gz", "wb") as g:
+            shutil.copyfileobj(f, g)
+        xmlfile = str(tmp_path / "corpus.xml.gz")
+    # small shards, so the conversations are spread over several shards and workers
+    rows = pan12_xml2csv_parallel(xmlfile, predatorsfile, str(tmp_path / "parallel.csv"), workers=2, shard_size=3)
+
+    assert rows == len(serial)
+    pd.testing.assert_frame_equal(read_messages(tmp_path / "parallel.csv"), read_messages(tmp_path / "serial.csv"))
+    assert (tmp_path / "parallel.csv").read_bytes() == (tmp_path / "serial.csv").read_bytes()
+
+
+@pytest.mark.parametrize("corpus", TOY_CORPORA)
+def test_parallel_parquet_matches_serial(corpus, tmp_path):
+    xmlfile, predatorsfile = TOY_CORPORA[corpus]
+    save_dataframe(pan12_xml2csv(xmlfile, predatorsfile), str(tmp_path / "serial.parquet"))
+    pan12_xml2csv_parallel(xmlfile, predatorsfile, str(tmp_path / "parallel.parquet"), workers=2, shard_size=3)
+
+    # categories are in the order the chunks met them, the values and dtypes are the same
+    pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "parallel.parquet"), pd.read_parquet(tmp_path / "serial.parquet"),
+                                  check_categorical=False)